@@ -2,11 +2,14 @@ from flask import Flask
 from flask_cors import CORS
 import os
 from routes import register_routes
+from service import http_cache, warmup
 
 app = Flask(__name__)
-CORS(app)
+CORS(app, expose_headers=["ETag", "X-Model-Version"])
+http_cache.InitApp(app)  # orjson responses, gzip/brotli compression
     
 register_routes(app)  # Register all route modules
+warmup.GetWarmer().Start()  # keeps popular /predict prices cached across deploys and month end
 
 if __name__ == '__main__':
     app.run(debug=True, host="0.0.0.0", port=int(os.environ.get("PORT", 8080)))
@@ -0,0 +1,2 @@
+# Benchmark suite for the prediction service.
+# Run from the backend root: python3 -m benchmarks.run
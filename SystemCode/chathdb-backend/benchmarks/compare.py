@@ -0,0 +1,39 @@
+import argparse
+import json
+import sys
+
+def load(path: str) -> dict:
+    with open(path, "r") as openfile:
+        return json.load(openfile)["benchmarks"]
+
+def compare(baseline: dict, candidate: dict, threshold: float) -> list:
+    # a benchmark regresses when p95 latency grows or throughput drops by more than threshold
+    rows = []
+    for name in sorted(set(baseline) & set(candidate)):
+        before, after = baseline[name], candidate[name]
+        p95_change = (after["p95_ms"] - before["p95_ms"]) / before["p95_ms"] if before["p95_ms"] else 0.0
+        throughput_change = (after["throughput_per_s"] - before["throughput_per_s"]) / before["throughput_per_s"] if before["throughput_per_s"] else 0.0
+        regressed = p95_change > threshold or throughput_change < -threshold
+        rows.append((name, before["p95_ms"], after["p95_ms"], p95_change, throughput_change, regressed))
+    return rows
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare two benchmark result files.")
+    parser.add_argument("baseline")
+    parser.add_argument("candidate")
+    parser.add_argument("--threshold", type=float, default=0.10, help="allowed relative slowdown (default 0.10)")
+    args = parser.parse_args()
+
+    rows = compare(load(args.baseline), load(args.candidate), args.threshold)
+    print(f"{'benchmark':<28}{'base p95':>10}{'new p95':>10}{'p95 %':>9}{'ops/s %':>9}")
+    for name, before, after, p95_change, throughput_change, regressed in rows:
+        flag = "  REGRESSION" if regressed else ""
+        print(f"{name:<28}{before:>10.3f}{after:>10.3f}{p95_change:>+9.1%}{throughput_change:>+9.1%}{flag}")
+
+    regressions = [row[0] for row in rows if row[-1]]
+    if regressions:
+        print(f"{len(regressions)} benchmark(s) regressed beyond {args.threshold:.0%}: {', '.join(regressions)}")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
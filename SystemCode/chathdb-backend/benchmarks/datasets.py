@@ -0,0 +1,67 @@
+import os
+import tempfile
+import polars as pl
+from service import schema
+from .harness import measure
+
+DATA_DIR = "static/data"
+# name -> (path, dataset schema, month column, value column averaged by the query)
+DATASETS = {
+    "resale": ("resale_price/parsed/consolidated_resale.parquet", schema.RESALE, "month", "resale_price"),
+    "economic": ("economic_data/parsed/consolidated_economic_data.parquet", schema.ECONOMIC, "month", "cpi"),
+    "gtrends": ("gtrends/parsed/consolidated_gtrends.parquet", schema.GTRENDS, "month", "gtrend_value"),
+    "gnews": ("gnews/parsed/consolidated_gnews.parquet", schema.GNEWS, "month", None),
+    "gnews_scores": ("gnews/parsed/aggregated_gnews_scores.parquet", schema.GNEWS_AGGREGATED, "month", "mean_score"),
+    "rental": ("rental_amount/RentingOutofFlats2025.parquet", schema.RENTAL, "rent_approval_date", "median_monthly_rent"),
+}
+
+def legacy_frame(frame: pl.DataFrame) -> pl.DataFrame:
+    # the layout before service/schema.py: free-form strings and no month_key
+    frame = frame.drop("month_key", strict=False)
+    return frame.with_columns([pl.col(name).cast(pl.Utf8) for name, dtype in frame.schema.items() if isinstance(dtype, (pl.Categorical, pl.Enum))])
+
+def legacy_query(frame: pl.DataFrame, month_column: str, value_column: str, cutoff: str) -> pl.DataFrame:
+    # average by town and year over the last two years, parsing the year out of "YYYY-MM"
+    keys = (["town"] if "town" in frame.columns else []) + ["year"]
+    value = pl.col(value_column).mean() if value_column else pl.len()
+    return frame.filter(pl.col(month_column) >= cutoff).with_columns(
+        pl.col(month_column).str.split("-").list.first().cast(pl.Int32).alias("year")
+    ).group_by(keys).agg(value)
+
+def schema_query(frame: pl.DataFrame, value_column: str, cutoff: int) -> pl.DataFrame:
+    keys = (["town"] if "town" in frame.columns else []) + ["year"]
+    value = pl.col(value_column).mean() if value_column else pl.len()
+    return frame.filter(pl.col("month_key") >= cutoff).with_columns(schema.YearExpr()).group_by(keys).agg(value)
+
+def file_mb(filepath: str) -> float:
+    return round(os.path.getsize(filepath) / (1024 * 1024), 3)
+
+def run_datasets(iterations: int, resale_path: str = None) -> dict:
+    # Parquet size, in-memory size and query time of every dataset before and after the shared
+    # schema; each dataset is written both ways with the same Parquet settings
+    results = {}
+    with tempfile.TemporaryDirectory() as temp_dir:
+        for name, (path, dataset_schema, month_column, value_column) in DATASETS.items():
+            source = resale_path if name == "resale" and resale_path else os.path.join(DATA_DIR, path)
+            if not os.path.exists(source):
+                print(f"Skipping {name}, not found: {source}")
+                continue
+            frame = pl.read_parquet(source)
+            legacy = legacy_frame(frame)
+            compact = schema.Apply(frame.lazy(), dataset_schema, month_column).collect()
+            last_key = int(compact["month_key"].max())
+            cutoff_key = last_key - 23
+            cutoff = schema.MonthFromKey(cutoff_key)
+
+            for layout, data in [("legacy", legacy), ("schema", compact)]:
+                filepath = os.path.join(temp_dir, f"{name}_{layout}.parquet")
+                data.write_parquet(filepath)
+                if layout == "legacy":
+                    query = lambda data=data: legacy_query(data, month_column, value_column, cutoff)
+                else:
+                    query = lambda data=data: schema_query(data, value_column, cutoff_key)
+                stats = measure(query, iterations, warmup=2, items_per_call=len(data))
+                stats.update(file_mb=file_mb(filepath), memory_mb=round(data.estimated_size("mb"), 3), rows=len(data))
+                results[f"{name}_query_{layout}"] = stats
+                results[f"{name}_read_{layout}"] = measure(lambda filepath=filepath: pl.read_parquet(filepath), iterations, warmup=2, items_per_call=len(data))
+    return results
@@ -0,0 +1,45 @@
+import resource
+import sys
+import time
+
+def peak_rss_mb() -> float:
+    # ru_maxrss is reported in kilobytes on Linux and in bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == "darwin":
+        return round(peak / (1024 * 1024), 2)
+    return round(peak / 1024, 2)
+
+def percentile(sorted_samples: list, pct: float) -> float:
+    # nearest-rank percentile on an already sorted list
+    if not sorted_samples:
+        return 0.0
+    rank = max(0, min(len(sorted_samples) - 1, int(round(pct / 100 * len(sorted_samples) + 0.5)) - 1))
+    return sorted_samples[rank]
+
+def summarize(samples: list, wall_seconds: float, items_per_call: int = 1) -> dict:
+    # samples are per-call latencies in seconds
+    ordered = sorted(samples)
+    calls = len(ordered)
+    return {
+        "calls": calls,
+        "items_per_call": items_per_call,
+        "p50_ms": round(percentile(ordered, 50) * 1000, 4),
+        "p95_ms": round(percentile(ordered, 95) * 1000, 4),
+        "p99_ms": round(percentile(ordered, 99) * 1000, 4),
+        "mean_ms": round(sum(ordered) / calls * 1000, 4) if calls else 0.0,
+        "max_ms": round(ordered[-1] * 1000, 4) if calls else 0.0,
+        "throughput_per_s": round(calls * items_per_call / wall_seconds, 2) if wall_seconds > 0 else 0.0,
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+def measure(fn, iterations: int = 200, warmup: int = 10, items_per_call: int = 1) -> dict:
+    # time fn() in a tight loop after a short warm-up
+    for _ in range(warmup):
+        fn()
+    samples = []
+    start = time.perf_counter()
+    for _ in range(iterations):
+        t0 = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - t0)
+    return summarize(samples, time.perf_counter() - start, items_per_call)
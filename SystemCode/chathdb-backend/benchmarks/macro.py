@@ -0,0 +1,92 @@
+import itertools
+import threading
+import time
+import urllib.parse
+import urllib.request
+import pandas as pd
+from werkzeug.serving import make_server
+from service import model
+from .fixtures import sample_inputs
+from .harness import measure, summarize
+
+ENDPOINTS = {
+    "predict": "/api/model/predict",
+    "future_predict": "/api/model/future/predict",
+}
+
+numerical_features = ['floor_area_sqm', 'storey_median', 'flat_age']
+
+def run_test_client(app, iterations: int) -> dict:
+    # in-process requests through the full Flask stack, no sockets
+    client = app.test_client()
+    results = {}
+    for name, path in ENDPOINTS.items():
+        inputs = itertools.cycle(sample_inputs(256))
+
+        def call():
+            response = client.get(path, query_string=next(inputs))
+            if response.status_code != 200:
+                raise RuntimeError(f"{path} returned {response.status_code}: {response.get_data(as_text=True)}")
+
+        results[f"test_client_{name}"] = measure(call, iterations)
+    return results
+
+def run_load(app, concurrency: int, requests_per_worker: int) -> dict:
+    # closed-loop load generator against a local threaded server
+    server = make_server("127.0.0.1", 0, app, threaded=True)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    base_url = f"http://127.0.0.1:{server.server_port}"
+    results = {}
+    try:
+        for name, path in ENDPOINTS.items():
+            samples = []
+            errors = []
+            lock = threading.Lock()
+
+            def worker(seed):
+                local = []
+                for params in sample_inputs(requests_per_worker, seed=seed):
+                    url = f"{base_url}{path}?{urllib.parse.urlencode(params)}"
+                    t0 = time.perf_counter()
+                    try:
+                        with urllib.request.urlopen(url, timeout=30) as response:
+                            response.read()
+                    except Exception as e:
+                        with lock:
+                            errors.append(str(e))
+                        continue
+                    local.append(time.perf_counter() - t0)
+                with lock:
+                    samples.extend(local)
+
+            workers = [threading.Thread(target=worker, args=(seed,)) for seed in range(concurrency)]
+            start = time.perf_counter()
+            for w in workers:
+                w.start()
+            for w in workers:
+                w.join()
+            summary = summarize(samples, time.perf_counter() - start)
+            summary["concurrency"] = concurrency
+            summary["errors"] = len(errors)
+            results[f"load_{name}"] = summary
+    finally:
+        server.shutdown()
+    return results
+
+def run_batch(app, batch_sizes: list, iterations: int) -> dict:
+    # score many encoded rows with one predict call
+    results = {}
+    with app.app_context():
+        scaler = model.ReadScaler()
+        xgb_model = model.ReadModel()
+        for size in batch_sizes:
+            batch = pd.concat([model.EncodeFeatures(**params) for params in sample_inputs(size)], ignore_index=True)
+
+            def score():
+                frame = batch.copy()
+                frame[numerical_features] = scaler.transform(frame[numerical_features])
+                return xgb_model.predict(frame)
+
+            results[f"batch_score_{size}"] = measure(score, iterations, warmup=2, items_per_call=size)
+    return results
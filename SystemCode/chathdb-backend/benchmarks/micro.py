@@ -0,0 +1,37 @@
+import itertools
+import json
+from service import model, future_model
+from .fixtures import sample_inputs
+from .harness import measure
+
+numerical_features = ['floor_area_sqm', 'storey_median', 'flat_age']
+
+def run_micro(app, iterations: int) -> dict:
+    inputs = itertools.cycle(sample_inputs(256))
+    results = {}
+    with app.app_context():
+        results["encode_current"] = measure(lambda: model.EncodeFeatures(**next(inputs)), iterations)
+        results["encode_future"] = measure(lambda: future_model.EncodeFutureFeatures(**next(inputs)), iterations)
+
+        # scaling and inference are timed on an already encoded frame
+        encoded = model.EncodeFeatures(**next(inputs))
+        scaler = model.ReadScaler()
+        results["scale_current"] = measure(lambda: scaler.transform(encoded[numerical_features]), iterations)
+
+        scaled = encoded.copy()
+        scaled[numerical_features] = scaler.transform(encoded[numerical_features])
+        xgb_model = model.ReadModel()
+        results["predict_current"] = measure(lambda: xgb_model.predict(scaled), iterations)
+        results["unpickle_current"] = measure(model.ReadModel, max(10, iterations // 10), warmup=1)
+
+        future_encoded = future_model.EncodeFutureFeatures(**next(inputs))
+        future_scaler = future_model.ReadFutureScaler()
+        future_encoded[numerical_features] = future_scaler.transform(future_encoded[numerical_features])
+        future_xgb_model = future_model.ReadFutureModel()
+        results["predict_future"] = measure(lambda: future_xgb_model.predict(future_encoded), iterations)
+
+        payload = {"price": 512345.678}
+        future_payload = {"05-2025": 512345.678, "06-2025": 515000.123, "07-2025": 518250.5}
+        results["json_current"] = measure(lambda: json.dumps(payload), iterations * 10)
+        results["json_future"] = measure(lambda: json.dumps(future_payload), iterations * 10)
+    return results
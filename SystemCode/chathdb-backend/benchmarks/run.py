@@ -0,0 +1,91 @@
+import argparse
+import datetime
+import json
+import logging
+import os
+import platform
+import subprocess
+from .fixtures import use_models
+from .harness import peak_rss_mb
+
+RESULTS_DIR = os.path.join(os.path.dirname(__file__), "results")
+
+def git_revision() -> str:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True, stderr=subprocess.DEVNULL).strip()
+    except Exception:
+        return "unknown"
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the ChatHDB prediction service benchmarks.")
+    parser.add_argument("--suite", choices=["all", "micro", "macro", "sparse", "datasets"], default="all")
+    parser.add_argument("--iterations", type=int, default=200, help="timed calls per micro/test-client benchmark")
+    parser.add_argument("--concurrency", type=int, default=4, help="load generator worker threads")
+    parser.add_argument("--requests", type=int, default=50, help="requests per load generator worker")
+    parser.add_argument("--batch-sizes", default="100,1000", help="comma separated batch scoring sizes")
+    parser.add_argument("--sparse-sizes", default="10000,100000", help="comma separated row counts for the dense vs CSR comparison")
+    parser.add_argument("--resale", help="resale Parquet for the datasets suite (default: the consolidated resale data)")
+    parser.add_argument("--synthetic", action="store_true", help="use small synthetic models instead of the committed artifacts")
+    parser.add_argument("--prediction-cache", action="store_true", help="keep the prediction LRU on; the load generator cycles a few hundred inputs, so requests then measure cache hits")
+    parser.add_argument("--quick", action="store_true", help="few iterations, for smoke runs")
+    parser.add_argument("--out", help="output JSON path (default: benchmarks/results/<timestamp>.json)")
+    args = parser.parse_args()
+
+    if args.quick:
+        args.iterations, args.requests, args.batch_sizes, args.sparse_sizes = 20, 5, "100", "10000"
+
+    # artifacts and settings must be configured before the app imports the service modules. The
+    # warmer and the prediction log would write into static/data and compete for the CPU being timed
+    os.environ["WARMUP_ENABLED"] = "0"
+    os.environ["PREDICTION_LOG_ENABLED"] = "0"
+    if not args.prediction_cache:
+        os.environ["PREDICTION_CACHE_SIZE"] = "0"
+    sources = use_models(synthetic=args.synthetic)
+    from app import app
+    app.logger.disabled = True
+    logging.getLogger("werkzeug").setLevel(logging.ERROR)
+
+    from . import datasets, macro, micro, sparse
+    benchmarks = {}
+    if args.suite in ("all", "micro"):
+        benchmarks.update(micro.run_micro(app, args.iterations))
+    if args.suite in ("all", "macro"):
+        benchmarks.update(macro.run_test_client(app, args.iterations))
+        benchmarks.update(macro.run_load(app, args.concurrency, args.requests))
+        batch_sizes = [int(size) for size in args.batch_sizes.split(",") if size]
+        benchmarks.update(macro.run_batch(app, batch_sizes, max(3, args.iterations // 20)))
+    if args.suite in ("all", "sparse"):
+        sparse_sizes = [int(size) for size in args.sparse_sizes.split(",") if size]
+        benchmarks.update(sparse.run_sparse(app, sparse_sizes, max(3, args.iterations // 20)))
+    if args.suite in ("all", "datasets"):
+        benchmarks.update(datasets.run_datasets(max(3, args.iterations // 20), args.resale))
+
+    report = {
+        "created_at": datetime.datetime.now().isoformat(timespec="seconds"),
+        "git_revision": git_revision(),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "cpu_count": os.cpu_count(),
+        "models": sources,
+        "prediction_cache": args.prediction_cache,
+        "peak_rss_mb": peak_rss_mb(),
+        "benchmarks": benchmarks,
+    }
+
+    out_path = args.out or os.path.join(RESULTS_DIR, datetime.datetime.now().strftime("%Y%m%d-%H%M%S") + ".json")
+    os.makedirs(os.path.dirname(os.path.abspath(out_path)), exist_ok=True)
+    with open(out_path, "w") as openfile:
+        json.dump(report, openfile, indent=4)
+
+    print(f"{'benchmark':<28}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'ops/s':>12}{'rss MB':>10}")
+    for name, stats in benchmarks.items():
+        print(f"{name:<28}{stats['p50_ms']:>10.3f}{stats['p95_ms']:>10.3f}{stats['p99_ms']:>10.3f}{stats['throughput_per_s']:>12.1f}{stats['peak_rss_mb']:>10.1f}")
+    for name, stats in benchmarks.items():
+        if "matrix_mb" in stats:
+            print(f"{name:<28}matrix {stats['matrix_mb']:>10.2f} MB" + (f" (float64 {stats['float64_mb']:.2f} MB)" if "float64_mb" in stats else ""))
+        if "file_mb" in stats:
+            print(f"{name:<28}parquet {stats['file_mb']:>9.3f} MB, in memory {stats['memory_mb']:>9.3f} MB")
+    print(f"Saved benchmark results to {out_path}")
+
+if __name__ == "__main__":
+    main()
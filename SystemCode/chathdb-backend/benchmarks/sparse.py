@@ -0,0 +1,63 @@
+import numpy as np
+import pandas as pd
+import xgboost as xgb
+from service import model
+from service.features import SPARSE_MISSING, FeatureSchema
+from .harness import measure
+
+COLUMNS_CSV = "static/models/data/model_input_sample.csv"
+
+def matrix_mb(matrix) -> float:
+    if hasattr(matrix, "indptr"):
+        return round((matrix.data.nbytes + matrix.indices.nbytes + matrix.indptr.nbytes) / (1024 * 1024), 2)
+    return round(matrix.nbytes / (1024 * 1024), 2)
+
+def synthetic_frame(schema: FeatureSchema, rows: int, seed: int = 42) -> pd.DataFrame:
+    # PrepareResaleFrame-shaped rows over the production streets and flat types
+    rng = np.random.default_rng(seed)
+    year = rng.integers(2012, 2026, rows)
+    lease = rng.integers(1970, 2020, rows)
+    return pd.DataFrame({
+        "month": rng.integers(1, 13, rows),
+        "year": year,
+        "floor_area_sqm": rng.integers(40, 150, rows).astype(np.float32),
+        "lease_commence_date": lease,
+        "storey_median": rng.integers(1, 4, rows),
+        "flat_age": year - lease,
+        "street_name": rng.choice(list(schema.street_index), rows),
+        "flat_type": rng.choice(list(schema.flat_type_index), rows),
+    })
+
+def run_sparse(app, sizes: list, iterations: int) -> dict:
+    # dense float32 vs CSR encoding of the current model layout: encode time, matrix size,
+    # training matrix construction and inference throughput
+    results = {}
+    with app.app_context():
+        scaler = model.ReadScaler()
+        schema = FeatureSchema.FromCsv(COLUMNS_CSV)
+        # a sparse-trained booster reads both layouts the same way, so one model scores both
+        train_frame = synthetic_frame(schema, 5000, seed=7)
+        target = 400000 + 3000 * train_frame["floor_area_sqm"] - 2000 * train_frame["flat_age"]
+        dtrain = xgb.QuantileDMatrix(schema.EncodeSparse(train_frame, scaler), label=target, missing=SPARSE_MISSING)
+        booster = xgb.train({"tree_method": "hist", "max_depth": 6, "nthread": 1}, dtrain, num_boost_round=100)
+
+        for size in sizes:
+            frame = synthetic_frame(schema, size)
+            dense = schema.Scale(schema.Encode(frame), scaler)
+            csr = schema.EncodeSparse(frame, scaler)
+            if not np.allclose(booster.inplace_predict(dense, missing=SPARSE_MISSING), booster.inplace_predict(csr, missing=SPARSE_MISSING)):
+                raise AssertionError("dense and CSR predictions differ")
+
+            stats = measure(lambda: schema.Scale(schema.Encode(frame), scaler), iterations, warmup=1, items_per_call=size)
+            # the same rows as float64, as pandas builds them
+            stats.update(matrix_mb=matrix_mb(dense), float64_mb=round(size * len(schema) * 8 / (1024 * 1024), 2))
+            results[f"encode_dense_{size}"] = stats
+            stats = measure(lambda: schema.EncodeSparse(frame, scaler), iterations, warmup=1, items_per_call=size)
+            stats.update(matrix_mb=matrix_mb(csr))
+            results[f"encode_csr_{size}"] = stats
+
+            results[f"dmatrix_dense_{size}"] = measure(lambda: xgb.QuantileDMatrix(dense, missing=SPARSE_MISSING, ref=dtrain), iterations, warmup=1, items_per_call=size)
+            results[f"dmatrix_csr_{size}"] = measure(lambda: xgb.QuantileDMatrix(csr, missing=SPARSE_MISSING, ref=dtrain), iterations, warmup=1, items_per_call=size)
+            results[f"predict_dense_{size}"] = measure(lambda: booster.inplace_predict(dense, missing=SPARSE_MISSING), iterations, warmup=1, items_per_call=size)
+            results[f"predict_csr_{size}"] = measure(lambda: booster.inplace_predict(csr, missing=SPARSE_MISSING), iterations, warmup=1, items_per_call=size)
+    return results
@@ -0,0 +1,141 @@
+import argparse
+import os
+import time
+import numpy as np
+import polars as pl
+from service import schema
+from service.http_cache import ArtifactVersion
+from service.features import SPARSE_MISSING, PrepareResaleFrame
+from .backtest import MODELS, LoadModel, LoadNewRows
+
+# Build the affordability cube served by /api/signals/affordability: price-to-income and
+# rent-to-income per (month, town, flat_type). Resale medians and model valuations (each transaction
+# priced by the current model in its own month) are the expensive part and are kept between runs;
+# only new months, the newest stored month (HDB keeps registering its transactions) and months
+# priced by another model version are scored again. Rents and income are small and are joined onto
+# the whole cube on every run, so a new rental or income file shows up without rescoring.
+# Run from the backend root: python3 -m lib.batch.affordability
+script_dir = os.path.dirname(__file__)
+default_resale = script_dir + '/../../static/data/resale_price/parsed/consolidated_resale.parquet'
+default_rental = script_dir + '/../../static/data/rental_amount/RentingOutofFlats2025.parquet'
+default_income = script_dir + '/../../static/data/median_income/parsed/median_income.parquet'
+default_output = script_dir + '/../../static/data/affordability/affordability_cube.parquet'
+
+# gross monthly income including employer CPF, the headline MOM figure
+INCOME_COLUMN = "med_income_incl_empcpf"
+key_columns = ["month_key", "town", "flat_type"]
+price_columns = ["transactions", "median_price", "model_price", "model_version"]
+
+def LoadCube(output_path: str) -> pl.DataFrame:
+    if os.path.exists(output_path):
+        return pl.read_parquet(output_path)
+    return pl.DataFrame(schema=schema.AFFORDABILITY)
+
+def PricedMonths(cube: pl.DataFrame, model_version: str) -> set:
+    # months whose resale medians and valuations can be kept
+    priced = cube.filter((pl.col("model_version") == model_version) & pl.col("transactions").is_not_null())
+    months = set(priced["month"].unique().to_list())
+    if months:
+        months.discard(max(months))
+    return months
+
+def ScoreMonths(rows, config: dict, model_version: str) -> pl.DataFrame:
+    # resale median and median model valuation per month, town and flat type
+    booster, scaler, feature_schema, sparse_input = LoadModel(config)
+    matrix = feature_schema.EncodeScaled(PrepareResaleFrame(rows), scaler, sparse_input)
+    predictions = booster.inplace_predict(matrix, missing=SPARSE_MISSING if sparse_input else np.nan)
+    scored = pl.DataFrame({
+        "month_key": pl.DataFrame({"month": rows["month"].astype(str).to_numpy()}).select(schema.MonthKeyExpr())["month_key"],
+        "town": rows["town"].astype(str).to_numpy(),
+        "flat_type": rows["flat_type"].astype(str).to_numpy(),
+        "resale_price": rows["resale_price"].to_numpy(dtype=np.float64),
+        "model_price": predictions.astype(np.float64),
+    })
+    return scored.group_by(key_columns).agg(
+        pl.len().alias("transactions"),
+        pl.col("resale_price").median().alias("median_price"),
+        pl.col("model_price").median(),
+    ).with_columns(pl.lit(model_version).alias("model_version"))
+
+def RentTable(rental_path: str) -> pl.DataFrame:
+    # median of the per-block median rents approved in each month, town and flat type
+    if not os.path.exists(rental_path):
+        return pl.DataFrame(schema={"month_key": pl.Int32, "town": pl.Utf8, "flat_type": pl.Utf8, "rentals": pl.UInt32, "median_rent": pl.Float64})
+    # files written before the schema carry only rent_approval_date
+    return schema.WithMonthKey(pl.scan_parquet(rental_path), "rent_approval_date").group_by(
+        "month_key", pl.col("town").cast(pl.Utf8), pl.col("flat_type").cast(pl.Utf8)
+    ).agg(
+        pl.len().alias("rentals"),
+        pl.col("median_monthly_rent").cast(pl.Float64).median().alias("median_rent"),
+    ).collect()
+
+def IncomeTable(income_path: str) -> pl.DataFrame:
+    if not os.path.exists(income_path):
+        return pl.DataFrame(schema={"year": pl.Int32, "income_year": pl.Int32, "monthly_income": pl.Float64})
+    return pl.read_parquet(income_path).select(
+        pl.col("year").cast(pl.Int32), pl.col("year").cast(pl.Int32).alias("income_year"), pl.col(INCOME_COLUMN).cast(pl.Float64).alias("monthly_income"),
+    ).drop_nulls("monthly_income").sort("year")
+
+def Assemble(prices: pl.DataFrame, rents: pl.DataFrame, income: pl.DataFrame) -> pl.DataFrame:
+    cube = prices.join(rents, on=key_columns, how="full", coalesce=True)
+    # each year uses the latest income published up to it, so 2005 and the years after the last
+    # survey carry the previous figure, with income_year saying which
+    cube = cube.with_columns(schema.YearExpr().cast(pl.Int32)).sort("year").join_asof(income, on="year", strategy="backward")
+    cube = cube.with_columns(
+        pl.format("{}-{}", pl.col("month_key") // 12, (pl.col("month_key") % 12 + 1).cast(pl.Utf8).str.zfill(2)).alias("month"),
+        (pl.col("median_price") / (pl.col("monthly_income") * 12)).alias("price_to_income"),
+        (pl.col("model_price") / (pl.col("monthly_income") * 12)).alias("model_price_to_income"),
+        (pl.col("median_rent") / pl.col("monthly_income")).alias("rent_to_income"),
+    )
+    return schema.Apply(cube, schema.AFFORDABILITY).sort(["town", "flat_type", "month_key"])
+
+def Build(resale_path: str, rental_path: str, income_path: str, output_path: str, start_month: str = None, rebuild: bool = False) -> pl.DataFrame:
+    wall_start, cpu_start = time.perf_counter(), time.process_time()
+    config = MODELS["current"]
+    model_version = ArtifactVersion([config["model"], config["scaler"], config["columns"]])
+    cube = pl.DataFrame(schema=schema.AFFORDABILITY) if rebuild else LoadCube(output_path)
+    skip_months = PricedMonths(cube, model_version)
+    kept = cube.filter(pl.col("month").is_in(sorted(skip_months)) & pl.col("transactions").is_not_null()).select(
+        "month_key", pl.col("town").cast(pl.Utf8), pl.col("flat_type").cast(pl.Utf8), *price_columns,
+    )
+
+    rows = LoadNewRows(resale_path, skip_months, start_month) if os.path.exists(resale_path) else None
+    if rows is None or rows.empty:
+        print("No new resale months to score")
+        prices = kept
+    else:
+        if not os.path.exists(config["model"]):
+            raise FileNotFoundError(f"Model artifact not found: {config['model']}")
+        prices = pl.concat([kept, ScoreMonths(rows, config, model_version)], how="vertical_relaxed")
+        months = sorted(rows["month"].astype(str).unique())
+        print(f"Scored {len(rows):,} transactions over {len(months)} month(s) ({months[0]} to {months[-1]})")
+
+    cube = Assemble(prices, RentTable(rental_path), IncomeTable(income_path))
+    os.makedirs(os.path.dirname(os.path.abspath(output_path)), exist_ok=True)
+    # replaced in one step, the service may be reading the previous file
+    temporary_path = output_path + ".tmp"
+    cube.write_parquet(temporary_path)
+    os.replace(temporary_path, output_path)
+    print(f"Saved {len(cube):,} cells to {output_path} in {time.perf_counter() - wall_start:.2f}s wall, {time.process_time() - cpu_start:.2f}s CPU")
+    return cube
+
+def main():
+    parser = argparse.ArgumentParser(description="Incrementally build the price-to-income and rent-to-income cube.")
+    parser.add_argument("--resale", default=default_resale)
+    parser.add_argument("--rental", default=default_rental)
+    parser.add_argument("--income", default=default_income)
+    parser.add_argument("--output", default=default_output)
+    parser.add_argument("--start-month", default=None, help="ignore transactions before this YYYY-MM")
+    parser.add_argument("--rebuild", action="store_true", help="score every month again")
+    args = parser.parse_args()
+
+    cube = Build(args.resale, args.rental, args.income, args.output, args.start_month, args.rebuild)
+    latest = cube.filter(pl.col("transactions").is_not_null())
+    if not latest.is_empty():
+        latest = latest.filter(pl.col("month_key") == latest["month_key"].max())
+        print(latest.group_by("flat_type").agg(
+            pl.col("price_to_income").median(), pl.col("rent_to_income").median(),
+        ).sort("flat_type"))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,175 @@
+import argparse
+import hashlib
+import os
+import pickle
+import time
+import numpy as np
+import pandas as pd
+import polars as pl
+from service.schema import ReadColumns
+from service.features import SPARSE_MISSING, FeatureSchema, PrepareResaleFrame, UsesSparseInput
+
+# Measure model accuracy on resale transactions, one month at a time. Error sums are stored per
+# (model, horizon, month, town, flat_type) so each run only scores months it has not seen with the
+# same model files, plus the newest stored month (HDB keeps registering its transactions), and
+# MAE/MAPE can be rolled up to any grouping without rescoring.
+# Run from the backend root: python3 -m lib.batch.backtest
+script_dir = os.path.dirname(__file__)
+default_resale = script_dir + '/../../static/data/resale_price/parsed/consolidated_resale.parquet'
+default_results = script_dir + '/../../static/data/backtest/backtest_results.parquet'
+
+MODELS = {
+    # horizon 0 prices a transaction in its own month
+    "current": {
+        "model": script_dir + '/../../static/models/final_model.pkl',
+        "scaler": script_dir + '/../../static/models/final_scaler.pkl',
+        "columns": script_dir + '/../../static/models/data/model_input_sample.csv',
+        "horizons": [0],
+    },
+    # PredictFuturePrice forecasts months 1-3 ahead using the year it is called in
+    "future": {
+        "model": script_dir + '/../../static/models/final_model_future.pkl',
+        "scaler": script_dir + '/../../static/models/scaler_future.pkl',
+        "columns": script_dir + '/../../static/models/X_single_test_data_future.csv',
+        "horizons": [1, 2, 3],
+    },
+}
+
+input_columns = ["month", "town", "street_name", "flat_type", "floor_area_sqm", "storey_range", "lease_commence_date", "resale_price"]
+group_columns = ["model", "horizon", "month", "town", "flat_type"]
+
+def LoadResults(results_path: str) -> pd.DataFrame:
+    if os.path.exists(results_path):
+        results = pd.read_parquet(results_path)
+        # results stored before model versions were recorded are scored again
+        if "model_version" not in results.columns:
+            results["model_version"] = None
+        return results
+    return pd.DataFrame(columns=group_columns + ["n", "abs_error_sum", "abs_pct_error_sum", "model_version"])
+
+def ModelVersion(config: dict) -> str:
+    # changes whenever the model, scaler or column file is replaced; a stat per file, no reads
+    digest = hashlib.sha256()
+    for key in ["model", "scaler", "columns"]:
+        stat = os.stat(config[key])
+        digest.update(f"{os.path.basename(config[key])}:{stat.st_mtime_ns}:{stat.st_size};".encode())
+    return digest.hexdigest()[:16]
+
+def ScoredMonths(results: pd.DataFrame, model_name: str, model_version: str) -> set:
+    # months whose results can be kept: scored by the same model files, except the newest one
+    rows = results[results["model"] == model_name]
+    months = set(rows.loc[rows["model_version"] == model_version, "month"].unique())
+    if len(rows):
+        months.discard(rows["month"].max())
+    return months
+
+def LoadNewRows(resale_path: str, skip_months: set, start_month: str = None, end_month: str = None) -> pd.DataFrame:
+    # push the month filter into the Parquet reader so scored months are never loaded
+    filters = []
+    if skip_months:
+        filters.append(("month", "not in", sorted(skip_months)))
+    if start_month:
+        filters.append(("month", ">=", start_month))
+    if end_month:
+        filters.append(("month", "<=", end_month))
+    columns = ReadColumns(input_columns, pl.read_parquet_schema(resale_path))
+    return pd.read_parquet(resale_path, columns=columns, filters=filters or None)
+
+def ShiftMonths(months: pd.Series, offset: int) -> pd.Series:
+    # "YYYY-MM" shifted by offset months
+    parts = months.str.split("-", n=1, expand=True).astype(int)
+    ordinal = parts[0] * 12 + parts[1] - 1 + offset
+    return (ordinal // 12).astype(str) + "-" + (ordinal % 12 + 1).astype(str).str.zfill(2)
+
+def LoadModel(config: dict):
+    with open(config["model"], "rb") as openfile:
+        model = pickle.load(openfile)
+    with open(config["scaler"], "rb") as openfile:
+        scaler = pickle.load(openfile)
+    return model.get_booster(), scaler, FeatureSchema.FromCsv(config["columns"]), UsesSparseInput(model)
+
+def Evaluate(rows: pd.DataFrame, model_name: str, booster, scaler, schema: FeatureSchema, horizon: int, sparse_input: bool = False, model_version: str = None) -> pd.DataFrame:
+    frame = PrepareResaleFrame(rows)
+    if horizon > 0:
+        # forecast issued `horizon` months before the transaction: the service passes the
+        # issuing year with the target month
+        if "month_key" in rows.columns:
+            frame["year"] = ((rows["month_key"] - horizon) // 12).astype("int32")
+        else:
+            frame["year"] = ShiftMonths(rows["month"], -horizon).str.slice(0, 4).astype("int32")
+        frame["flat_age"] = (frame["year"] - frame["lease_commence_date"]).astype("float32")
+    matrix = schema.EncodeScaled(frame, scaler, sparse_input)
+    predictions = booster.inplace_predict(matrix, missing=SPARSE_MISSING if sparse_input else np.nan)
+    actual = rows["resale_price"].to_numpy(dtype=np.float64)
+    abs_error = np.abs(predictions - actual)
+    scored = pd.DataFrame({
+        "month": rows["month"].to_numpy(),
+        "town": rows["town"].to_numpy(),
+        "flat_type": rows["flat_type"].to_numpy(),
+        "abs_error": abs_error,
+        "abs_pct_error": abs_error / actual,
+    })
+    grouped = scored.groupby(["month", "town", "flat_type"], sort=False).agg(
+        n=("abs_error", "size"), abs_error_sum=("abs_error", "sum"), abs_pct_error_sum=("abs_pct_error", "sum"),
+    ).reset_index()
+    grouped.insert(0, "horizon", horizon)
+    grouped.insert(0, "model", model_name)
+    grouped["model_version"] = model_version
+    return grouped
+
+def Summarize(results: pd.DataFrame, by: list) -> pd.DataFrame:
+    # roll stored error sums up to MAE/MAPE for any grouping
+    summary = results.groupby(by).agg(n=("n", "sum"), abs_error_sum=("abs_error_sum", "sum"), abs_pct_error_sum=("abs_pct_error_sum", "sum"))
+    summary["mae"] = (summary["abs_error_sum"] / summary["n"]).round(1)
+    summary["mape"] = (summary["abs_pct_error_sum"] / summary["n"] * 100).round(3)
+    return summary[["n", "mae", "mape"]].reset_index()
+
+def RunBacktest(resale_path: str, results_path: str, model_names: list, start_month: str = None, end_month: str = None) -> pd.DataFrame:
+    results = LoadResults(results_path)
+    new_results = []
+    for model_name in model_names:
+        config = MODELS[model_name]
+        if not os.path.exists(config["model"]):
+            print(f"Skipping {model_name} model, artifact not found: {config['model']}")
+            continue
+        wall_start, cpu_start = time.perf_counter(), time.process_time()
+        model_version = ModelVersion(config)
+        rows = LoadNewRows(resale_path, ScoredMonths(results, model_name, model_version), start_month, end_month)
+        if rows.empty:
+            print(f"{model_name}: no new months to score")
+            continue
+        # the months scored now replace whatever this model had stored for them
+        rescored = (results["model"] == model_name) & results["month"].isin(rows["month"].astype(str).unique())
+        results = results[~rescored]
+        booster, scaler, schema, sparse_input = LoadModel(config)
+        for horizon in config["horizons"]:
+            new_results.append(Evaluate(rows, model_name, booster, scaler, schema, horizon, sparse_input, model_version))
+        months = sorted(rows["month"].unique())
+        print(f"{model_name}: scored {len(rows):,} transactions over {len(months)} new month(s) ({months[0]} to {months[-1]}) "
+              f"in {time.perf_counter() - wall_start:.2f}s wall, {time.process_time() - cpu_start:.2f}s CPU")
+
+    if new_results:
+        # results are small (one row per model, horizon, month, town and flat type), rewrite in full
+        results = pd.concat([results] + new_results, ignore_index=True)
+        os.makedirs(os.path.dirname(os.path.abspath(results_path)), exist_ok=True)
+        results.to_parquet(results_path, index=False)
+        print(f"Saved backtest results to {results_path}")
+        print(Summarize(pd.concat(new_results), ["model", "horizon"]).to_string(index=False))
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description="Incrementally backtest the price models on new months of resale data.")
+    parser.add_argument("--resale", default=default_resale)
+    parser.add_argument("--results", default=default_results)
+    parser.add_argument("--models", default="current,future", help="comma separated: current, future")
+    parser.add_argument("--start-month", default=None, help="ignore transactions before this YYYY-MM, e.g. the training cut-off")
+    parser.add_argument("--end-month", default=None)
+    parser.add_argument("--report", choices=["none", "town", "flat_type", "month"], default="none", help="print MAE/MAPE over all stored results by this column")
+    args = parser.parse_args()
+
+    results = RunBacktest(args.resale, args.results, [name for name in args.models.split(",") if name], args.start_month, args.end_month)
+    if args.report != "none" and not results.empty:
+        print(Summarize(results, ["model", "horizon", args.report]).to_string(index=False))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,35 @@
+import argparse
+import json
+import os
+from service import registry
+
+# Manage the model registry in static/models/registry. Running services watch the LIVE pointers,
+# so publishing or activating a version here swaps it in without a restart.
+# Run from the backend root: python3 -m lib.batch.models list
+script_dir = os.path.dirname(__file__)
+default_models_dir = script_dir + '/../../static/models'
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="List, publish and activate model registry versions")
+    parser.add_argument("command", choices=["list", "publish", "activate"])
+    parser.add_argument("--model", choices=list(registry.LEGACY_ARTIFACTS), default="current")
+    parser.add_argument("--models-dir", default=default_models_dir, help="Folder with the deployed artifacts and the registry")
+    parser.add_argument("--version", default=None, help="Version to activate")
+    parser.add_argument("--no-activate", action="store_true", help="Publish without making the version live")
+    parser.add_argument("--keep", type=int, default=5, help="Versions to keep per model, the live one always stays")
+    args = parser.parse_args()
+
+    root = os.path.join(args.models_dir, "registry")
+    if args.command == "list":
+        listing = {name: {"live": registry.LiveVersion(name, root), "versions": registry.Versions(name, root)} for name in registry.LEGACY_ARTIFACTS}
+        print(json.dumps(listing, indent=4))
+    elif args.command == "publish":
+        # the artifacts at the fixed static/models paths, e.g. after copying in a notebook-trained model
+        manifest = registry.Publish(args.model, registry.LegacyArtifacts(args.model, args.models_dir), root=root,
+                                    activate=not args.no_activate, keep=args.keep)
+        print(f"Published {args.model} model version {manifest['version']}{'' if args.no_activate else ' (live)'}")
+    else:
+        if not args.version:
+            parser.error("activate needs --version")
+        registry.Activate(args.model, args.version, root)
+        print(f"{args.model} model version {args.version} is live")
@@ -0,0 +1,132 @@
+import argparse
+import collections
+import os
+import pickle
+import resource
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from service.schema import ReadColumns
+from service.features import SPARSE_MISSING, FeatureSchema, PrepareResaleFrame, UsesSparseInput
+
+# Score every row of a resale history file with the current model, streaming chunk by chunk.
+# Run from the backend root: python3 -m lib.batch.revalue --input ... --output ...
+script_dir = os.path.dirname(__file__)
+default_input = script_dir + '/../../static/data/resale_price/parsed/consolidated_resale.parquet'
+default_output = script_dir + '/../../static/data/resale_price/parsed/revalued_resale.parquet'
+default_model = script_dir + '/../../static/models/final_model.pkl'
+default_scaler = script_dir + '/../../static/models/final_scaler.pkl'
+default_columns = script_dir + '/../../static/models/data/model_input_sample.csv'
+
+input_columns = ["month", "town", "street_name", "flat_type", "floor_area_sqm", "storey_range", "lease_commence_date"]
+
+# per-process state, set once by _InitWorker
+_worker = {}
+
+def _InitWorker(model_path: str, scaler_path: str, columns_path: str):
+    with open(model_path, "rb") as openfile:
+        model = pickle.load(openfile)
+    booster = model.get_booster()
+    # one thread per process, the pool provides the parallelism
+    booster.set_param({"nthread": 1})
+    with open(scaler_path, "rb") as openfile:
+        _worker["scaler"] = pickle.load(openfile)
+    _worker["booster"] = booster
+    # sparse-trained models are scored from CSR chunks
+    _worker["sparse"] = UsesSparseInput(model)
+    _worker["schema"] = FeatureSchema.FromCsv(columns_path)
+
+def _ScoreChunk(frame: pd.DataFrame, as_of: str) -> np.ndarray:
+    schema = _worker["schema"]
+    matrix = schema.EncodeScaled(PrepareResaleFrame(frame, as_of=as_of), _worker["scaler"], _worker["sparse"])
+    return _worker["booster"].inplace_predict(matrix, missing=SPARSE_MISSING if _worker["sparse"] else np.nan)
+
+def ReadChunks(filepath: str, chunk_size: int):
+    # yield pandas chunks from Parquet row groups or CSV without loading the whole file
+    if filepath.endswith(".parquet"):
+        parquet_file = pq.ParquetFile(filepath)
+        for batch in parquet_file.iter_batches(batch_size=chunk_size):
+            yield batch.to_pandas()
+    else:
+        for chunk in pd.read_csv(filepath, chunksize=chunk_size):
+            yield chunk
+
+def PeakRssMb() -> float:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+def Revalue(input_path: str, output_path: str, model_path: str, scaler_path: str, columns_path: str,
+            chunk_size: int = 100_000, workers: int = None, as_of: str = None, prediction_column: str = "model_price") -> dict:
+    workers = os.cpu_count() if workers is None else workers
+    os.makedirs(os.path.dirname(os.path.abspath(output_path)), exist_ok=True)
+    writer = None
+    rows = 0
+    start = time.perf_counter()
+
+    def write(chunk: pd.DataFrame, predictions: np.ndarray):
+        nonlocal writer, rows
+        chunk = chunk.copy()
+        chunk[prediction_column] = predictions.astype(np.float32)
+        table = pa.Table.from_pandas(chunk, preserve_index=False)
+        if writer is None:
+            writer = pq.ParquetWriter(output_path, table.schema)
+        else:
+            table = table.cast(writer.schema)
+        writer.write_table(table)
+        rows += len(chunk)
+        elapsed = time.perf_counter() - start
+        print(f"Scored {rows:,} rows ({rows / elapsed:,.0f} rows/s)", flush=True)
+
+    try:
+        if workers <= 1:
+            _InitWorker(model_path, scaler_path, columns_path)
+            for chunk in ReadChunks(input_path, chunk_size):
+                write(chunk, _ScoreChunk(chunk[ReadColumns(input_columns, chunk.columns)], as_of))
+        else:
+            # at most two chunks per worker are in flight, so memory stays bounded by chunk size
+            with ProcessPoolExecutor(max_workers=workers, initializer=_InitWorker, initargs=(model_path, scaler_path, columns_path)) as pool:
+                pending = collections.deque()
+                for chunk in ReadChunks(input_path, chunk_size):
+                    pending.append((chunk, pool.submit(_ScoreChunk, chunk[ReadColumns(input_columns, chunk.columns)], as_of)))
+                    if len(pending) >= workers * 2:
+                        done_chunk, future = pending.popleft()
+                        write(done_chunk, future.result())
+                while pending:
+                    done_chunk, future = pending.popleft()
+                    write(done_chunk, future.result())
+    finally:
+        if writer is not None:
+            writer.close()
+
+    elapsed = time.perf_counter() - start
+    return {
+        "rows": rows,
+        "seconds": round(elapsed, 3),
+        "rows_per_second": round(rows / elapsed, 1) if elapsed > 0 else 0.0,
+        "peak_rss_mb": round(PeakRssMb(), 1),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Stream a resale history file through the price model.")
+    parser.add_argument("--input", default=default_input, help="Parquet or CSV with month, town, street_name, flat_type, floor_area_sqm, storey_range, lease_commence_date")
+    parser.add_argument("--output", default=default_output, help="Parquet output, input columns plus the prediction")
+    parser.add_argument("--model", default=default_model)
+    parser.add_argument("--scaler", default=default_scaler)
+    parser.add_argument("--columns", default=default_columns, help="CSV whose header is the model column order")
+    parser.add_argument("--chunk-size", type=int, default=100_000)
+    parser.add_argument("--workers", type=int, default=None, help="scoring processes (default: CPU count, 1 scores inline)")
+    parser.add_argument("--as-of", default=None, help="price every row at this YYYY-MM instead of its transaction month")
+    parser.add_argument("--prediction-column", default="model_price")
+    args = parser.parse_args()
+
+    summary = Revalue(args.input, args.output, args.model, args.scaler, args.columns,
+                      chunk_size=args.chunk_size, workers=args.workers, as_of=args.as_of, prediction_column=args.prediction_column)
+    print(f"Revalued {summary['rows']:,} rows in {summary['seconds']}s "
+          f"({summary['rows_per_second']:,.0f} rows/s, peak RSS {summary['peak_rss_mb']} MB), output file: {args.output}")
+
+if __name__ == "__main__":
+    main()
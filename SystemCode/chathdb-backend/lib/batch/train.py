@@ -0,0 +1,390 @@
+import argparse
+import datetime
+import json
+import multiprocessing
+import os
+import pickle
+import resource
+import shutil
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import numpy as np
+import pandas as pd
+import xgboost as xgb
+from scipy import sparse
+from sklearn.metrics import mean_absolute_error, mean_squared_error, r2_score
+from sklearn.preprocessing import StandardScaler
+import polars as pl
+from service import registry
+from service.schema import ReadColumns
+from service.feature_store import FEATURES as STORE_FEATURES
+from service.features import NUMERICAL_FEATURES, SPARSE_MISSING, STREET_PREFIX, FLAT_TYPE_PREFIX, FeatureSchema, PrepareResaleFrame
+
+# Train the current and future price models from the consolidated resale data, following
+# lib/xgboost/HDB_Price_Model_Current.ipynb and HDB_Price_Model_Future.ipynb: same features,
+# one-hot layout and split, with a parallel hyperparameter search using hist and early stopping.
+# Run from the backend root: python3 -m lib.batch.train --model current
+script_dir = os.path.dirname(__file__)
+default_input = script_dir + '/../../static/data/resale_price/parsed/consolidated_resale.parquet'
+default_output = script_dir + '/../../static/models'
+
+# artifact paths are relative to the output directory and match what the service loads
+MODELS = {
+    "current": {
+        "model": "final_model.pkl",
+        "scaler": "final_scaler.pkl",
+        "columns": "data/model_input_sample.csv",
+        "cols_street_name": "data/cols_street_name.json",
+        "cols_flat_type": "data/cols_flat_type.json",
+        "leading_columns": ["month", "floor_area_sqm", "lease_commence_date", "year", "storey_median", "flat_age"],
+        "trailing_columns": [],
+        # random 80/20 split with the notebook's seed
+        "split": "random",
+        "holdout_from": None,
+        # best Optuna trial from the notebook; the round count comes from early stopping
+        "params": {
+            "max_depth": 8, "learning_rate": 0.29816288181757516, "min_child_weight": 8,
+            "subsample": 0.7784837367009123, "colsample_bytree": 0.7366592236791326, "gamma": 0.03016833782462212,
+            "reg_alpha": 0.911873200628761, "reg_lambda": 2.8733206177988944,
+        },
+    },
+    "future": {
+        "model": "final_model_future.pkl",
+        "scaler": "scaler_future.pkl",
+        "columns": "X_single_test_data_future.csv",
+        "cols_street_name": "data/future_cols_street_name.json",
+        "cols_flat_type": "data/future_cols_flat_type.json",
+        "leading_columns": ["floor_area_sqm", "lease_commence_date", "storey_median", "flat_age"],
+        "trailing_columns": ["transaction_year", "transaction_month"],
+        # train on earlier years, hold out everything from this month on
+        "split": "time",
+        "holdout_from": "2023-01",
+        "params": {
+            "max_depth": 10, "learning_rate": 0.292951250437566, "min_child_weight": 10,
+            "subsample": 0.7984707719554766, "colsample_bytree": 0.38561216417663424, "gamma": 0.3194904726766911,
+            "reg_alpha": 0.40018263740984816, "reg_lambda": 2.198242875555133,
+        },
+    },
+}
+
+input_columns = ["month", "town", "street_name", "flat_type", "floor_area_sqm", "storey_range", "lease_commence_date", "resale_price"]
+
+# share of the training rows used for early stopping and trial selection
+validation_fraction = 0.1
+
+# set in the parent before the pool forks, so workers read the matrices without a copy
+_data = {}
+# per-process state, set once by _InitWorker
+_worker = {}
+
+def PeakRssMb(who: int = resource.RUSAGE_SELF) -> float:
+    peak = resource.getrusage(who).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+def MatrixMb(matrix) -> float:
+    if sparse.issparse(matrix):
+        return (matrix.data.nbytes + matrix.indices.nbytes + matrix.indptr.nbytes) / (1024 * 1024)
+    return matrix.nbytes / (1024 * 1024)
+
+def LoadTrainingRows(input_path: str, start_month: str = None, end_month: str = None) -> pd.DataFrame:
+    filters = []
+    if start_month:
+        filters.append(("month", ">=", start_month))
+    if end_month:
+        filters.append(("month", "<=", end_month))
+    if input_path.endswith(".parquet"):
+        columns = ReadColumns(input_columns, pl.read_parquet_schema(input_path))
+        rows = pd.read_parquet(input_path, columns=columns, filters=filters or None)
+        # categorical streets sort by their dictionary order; sort them by name like strings
+        if isinstance(rows["street_name"].dtype, pd.CategoricalDtype):
+            rows["street_name"] = rows["street_name"].cat.set_categories(sorted(rows["street_name"].cat.categories))
+    else:
+        rows = pd.read_csv(input_path, usecols=input_columns)
+        for column, op, value in filters:
+            rows = rows[rows[column] >= value] if op == ">=" else rows[rows[column] <= value]
+    # sort so the time split and the column order do not depend on the file layout
+    return rows.dropna().sort_values(["month", "street_name"], kind="stable").reset_index(drop=True)
+
+def BuildColumns(frame: pd.DataFrame, config: dict, store_features: list = None) -> list:
+    # pd.get_dummies(drop_first=True) over the whole frame: sorted categories, first one dropped
+    streets = sorted(frame["street_name"].unique())[1:]
+    flat_types = sorted(frame["flat_type"].unique())[1:]
+    # feature store columns follow the notebook's numeric columns
+    return (config["leading_columns"] + list(store_features or [])
+            + [STREET_PREFIX + street for street in streets]
+            + [FLAT_TYPE_PREFIX + flat_type for flat_type in flat_types]
+            + config["trailing_columns"])
+
+def ReferenceCategories(frame: pd.DataFrame) -> dict:
+    # the categories drop_first leaves out, encoded as all zeros
+    return {"street_name": min(frame["street_name"].unique()), "flat_type": min(frame["flat_type"].unique())}
+
+def SplitRows(rows: pd.DataFrame, config: dict, holdout_from: str, seed: int):
+    # train / early-stopping validation / holdout row positions
+    if config["split"] == "time":
+        test = np.flatnonzero(rows["month"].to_numpy() >= holdout_from)
+        fit = np.flatnonzero(rows["month"].to_numpy() < holdout_from)
+        # validate on the latest training months, as the holdout comes after them
+        cut = int(len(fit) * (1 - validation_fraction))
+        train, valid = fit[:cut], fit[cut:]
+    else:
+        rng = np.random.RandomState(seed)
+        order = rng.permutation(len(rows))
+        n_test = int(round(len(rows) * 0.2))
+        test, fit = np.sort(order[:n_test]), order[n_test:]
+        n_valid = int(round(len(fit) * validation_fraction))
+        valid, train = np.sort(fit[:n_valid]), np.sort(fit[n_valid:])
+    if len(test) == 0 or len(valid) == 0:
+        raise ValueError(f"Not enough rows to split: {len(train)} train, {len(valid)} validation, {len(test)} holdout")
+    return train, valid, test
+
+def SampleParams(rng: np.random.RandomState) -> dict:
+    # the notebooks' Optuna search space, less n_estimators which early stopping picks
+    def log_uniform(low, high):
+        return float(np.exp(rng.uniform(np.log(low), np.log(high))))
+    return {
+        "max_depth": int(rng.randint(3, 11)),
+        "learning_rate": log_uniform(0.01, 0.3),
+        "min_child_weight": int(rng.randint(1, 11)),
+        "subsample": float(rng.uniform(0.5, 1)),
+        "colsample_bytree": float(rng.uniform(0.3, 1)),
+        "gamma": log_uniform(0.01, 10),
+        "reg_alpha": log_uniform(0.01, 1),
+        "reg_lambda": log_uniform(1, 10),
+    }
+
+def BoosterParams(params: dict, seed: int, threads: int) -> dict:
+    booster_params = dict(params)
+    booster_params.update({
+        "objective": "reg:squarederror", "tree_method": "hist", "eval_metric": "rmse", "seed": seed, "nthread": threads,
+    })
+    return booster_params
+
+def Metrics(actual: np.ndarray, predicted: np.ndarray) -> dict:
+    return {
+        "mae": float(mean_absolute_error(actual, predicted)),
+        "rmse": float(np.sqrt(mean_squared_error(actual, predicted))),
+        "r2": float(r2_score(actual, predicted)),
+        "mape": float(np.mean(np.abs(predicted - actual) / actual)),
+    }
+
+def _InitWorker(threads: int):
+    # bin the training matrix once per worker and reuse it for every trial
+    matrix, target, train, valid, missing = _data["matrix"], _data["target"], _data["train"], _data["valid"], _data["missing"]
+    _worker["threads"] = threads
+    _worker["dtrain"] = xgb.QuantileDMatrix(matrix[train], label=target[train], missing=missing, nthread=threads)
+    _worker["dvalid"] = xgb.QuantileDMatrix(matrix[valid], label=target[valid], missing=missing, ref=_worker["dtrain"], nthread=threads)
+    _worker["valid_target"] = target[valid]
+
+def _RunTrial(trial: int, params: dict, seed: int, max_rounds: int, early_stopping_rounds: int) -> dict:
+    start = time.perf_counter()
+    booster = xgb.train(
+        BoosterParams(params, seed, _worker["threads"]), _worker["dtrain"], num_boost_round=max_rounds,
+        evals=[(_worker["dvalid"], "valid")], early_stopping_rounds=early_stopping_rounds, verbose_eval=False,
+    )
+    predicted = booster.predict(_worker["dvalid"], iteration_range=(0, booster.best_iteration + 1))
+    return {
+        "trial": trial,
+        "params": params,
+        "best_iteration": int(booster.best_iteration),
+        "validation": Metrics(_worker["valid_target"], predicted),
+        "wall_seconds": round(time.perf_counter() - start, 3),
+        "peak_rss_mb": round(PeakRssMb(), 1),
+    }
+
+def Search(config: dict, trials: int, workers: int, threads: int, seed: int, max_rounds: int,
+           early_stopping_rounds: int, time_budget: float = None) -> list:
+    # trial 0 is the notebook's tuned parameters, the rest are drawn from the same search space
+    rng = np.random.RandomState(seed)
+    candidates = [dict(config["params"])] + [SampleParams(rng) for _ in range(trials - 1)]
+    start = time.perf_counter()
+    results = []
+    if workers <= 1:
+        _InitWorker(threads)
+        for trial, params in enumerate(candidates):
+            if time_budget and trial > 0 and time.perf_counter() - start > time_budget:
+                break
+            results.append(_RunTrial(trial, params, seed, max_rounds, early_stopping_rounds))
+            PrintTrial(results[-1])
+        return results
+    # fork so the workers share the parent's matrices instead of pickling them
+    context = multiprocessing.get_context("fork" if "fork" in multiprocessing.get_all_start_methods() else None)
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context, initializer=_InitWorker, initargs=(threads,)) as pool:
+        pending = {}
+        queue = list(enumerate(candidates))
+        while queue or pending:
+            # keep one trial per worker in flight so the time budget can stop the search early
+            while queue and len(pending) < workers:
+                if time_budget and queue[0][0] > 0 and time.perf_counter() - start > time_budget:
+                    queue = []
+                    break
+                trial, params = queue.pop(0)
+                pending[pool.submit(_RunTrial, trial, params, seed, max_rounds, early_stopping_rounds)] = trial
+            for future in as_completed(pending):
+                del pending[future]
+                results.append(future.result())
+                PrintTrial(results[-1])
+                break
+    return sorted(results, key=lambda result: result["trial"])
+
+def PrintTrial(result: dict):
+    print(f"Trial {result['trial']}: rmse {result['validation']['rmse']:,.0f}, mae {result['validation']['mae']:,.0f}, "
+          f"{result['best_iteration'] + 1} rounds, {result['wall_seconds']:.1f}s", flush=True)
+
+def WriteArtifacts(output_dir: str, config: dict, model, scaler, columns: list, sample: pd.DataFrame) -> dict:
+    # Written to a hidden staging folder first and moved into place with one rename per file, so a
+    # service serving these paths (see service/registry.py) never reads a partly written pickle.
+    paths = {key: os.path.join(output_dir, config[key]) for key in ["model", "scaler", "columns", "cols_street_name", "cols_flat_type"]}
+    for filepath in paths.values():
+        os.makedirs(os.path.dirname(os.path.abspath(filepath)), exist_ok=True)
+    staging = tempfile.mkdtemp(prefix=".staging-", dir=output_dir)
+    staged = {key: os.path.join(staging, os.path.basename(filepath)) for key, filepath in paths.items()}
+    try:
+        with open(staged["model"], "wb") as openfile:
+            pickle.dump(model, openfile)
+        with open(staged["scaler"], "wb") as openfile:
+            pickle.dump(scaler, openfile)
+        # the header carries the column order EncodeFeatures and FeatureSchema read back
+        sample.to_csv(staged["columns"], index=False)
+        streets = [column for column in columns if column.startswith(STREET_PREFIX)]
+        flat_types = [column for column in columns if column.startswith(FLAT_TYPE_PREFIX)]
+        with open(staged["cols_street_name"], "w") as openfile:
+            json.dump({name: idx for idx, name in enumerate(streets)}, openfile, indent=4)
+        with open(staged["cols_flat_type"], "w") as openfile:
+            json.dump({name: idx for idx, name in enumerate(flat_types)}, openfile, indent=4)
+        # the model last: the column files it needs are in place before it is
+        for key in ["cols_street_name", "cols_flat_type", "columns", "scaler", "model"]:
+            os.replace(staged[key], paths[key])
+    finally:
+        shutil.rmtree(staging, ignore_errors=True)
+    return paths
+
+def Train(model_name: str, input_path: str, output_dir: str, trials: int = 8, workers: int = None, threads: int = 1,
+          seed: int = 42, max_rounds: int = 1000, early_stopping_rounds: int = 50, holdout_from: str = None,
+          start_month: str = None, end_month: str = None, time_budget: float = None, sparse_input: bool = False,
+          store_features: list = None, publish: bool = False) -> dict:
+    config = MODELS[model_name]
+    workers = max(1, (os.cpu_count() or 1) // threads) if workers is None else workers
+    holdout_from = holdout_from or config["holdout_from"]
+    start = time.perf_counter()
+    cpu_start = time.process_time()
+
+    rows = LoadTrainingRows(input_path, start_month, end_month)
+    frame = PrepareResaleFrame(rows)
+    columns = BuildColumns(frame, config, store_features)
+    schema = FeatureSchema(columns)
+    target = rows["resale_price"].to_numpy(dtype=np.float32)
+    train, valid, test = SplitRows(rows, config, holdout_from, seed)
+
+    # scale with statistics from the training rows only
+    fit_rows = np.sort(np.concatenate([train, valid]))
+    scaler = StandardScaler().fit(frame.iloc[fit_rows][NUMERICAL_FEATURES])
+    sample = pd.DataFrame(schema.Encode(frame.iloc[:5]), columns=columns)
+    # sparse-trained models read zeros as missing, see service/features.py
+    missing = SPARSE_MISSING if sparse_input else np.nan
+    matrix = schema.EncodeSparse(frame, scaler) if sparse_input else schema.Scale(schema.Encode(frame), scaler)
+    print(f"Loaded {len(rows):,} rows, {len(columns)} columns ({'CSR' if sparse_input else 'dense'}, {MatrixMb(matrix):,.0f} MB): "
+          f"{len(train):,} train, {len(valid):,} validation, {len(test):,} holdout ({time.perf_counter() - start:.1f}s)", flush=True)
+
+    _data.update(matrix=matrix, target=target, train=train, valid=valid, missing=missing)
+    search_start = time.perf_counter()
+    try:
+        results = Search(config, trials, workers, threads, seed, max_rounds, early_stopping_rounds, time_budget)
+    finally:
+        _data.clear()
+    search_seconds = time.perf_counter() - search_start
+    best = min(results, key=lambda result: (result["validation"]["rmse"], result["trial"]))
+
+    # refit the best trial on train + validation with its early-stopped round count
+    refit_start = time.perf_counter()
+    params = dict(best["params"], n_estimators=best["best_iteration"] + 1)
+    model = xgb.XGBRegressor(**params, objective="reg:squarederror", tree_method="hist", missing=missing, random_state=seed, n_jobs=os.cpu_count())
+    if sparse_input:
+        model.fit(matrix[fit_rows], target[fit_rows])
+        # name the features so the service's DataFrame rows are checked against them
+        model.get_booster().feature_names = columns
+        holdout = Metrics(target[test], model.predict(matrix[test]))
+    else:
+        model.fit(pd.DataFrame(matrix[fit_rows], columns=columns), target[fit_rows])
+        holdout = Metrics(target[test], model.predict(pd.DataFrame(matrix[test], columns=columns)))
+    refit_seconds = time.perf_counter() - refit_start
+    model.set_params(n_jobs=None)
+
+    paths = WriteArtifacts(output_dir, config, model, scaler, columns, sample)
+    run = {
+        "model": model_name,
+        "started_at": datetime.datetime.now().isoformat(timespec="seconds"),
+        "input": os.path.abspath(input_path),
+        "months": [rows["month"].iloc[0], rows["month"].iloc[-1]],
+        "rows": {"train": int(len(train)), "validation": int(len(valid)), "holdout": int(len(test))},
+        "history_rows": int(len(fit_rows)),
+        "columns": len(columns),
+        "sparse": sparse_input,
+        "store_features": list(store_features or []),
+        "matrix_mb": round(MatrixMb(matrix), 1),
+        "reference": ReferenceCategories(frame),
+        "seed": seed,
+        "xgboost_version": xgb.__version__,
+        "trials": results,
+        "best_trial": best["trial"],
+        "params": params,
+        "holdout": holdout,
+        "search_seconds": round(search_seconds, 3),
+        "refit_seconds": round(refit_seconds, 3),
+        "wall_seconds": round(time.perf_counter() - start, 3),
+        "cpu_seconds": round(time.process_time() - cpu_start, 3),
+        "peak_rss_mb": round(PeakRssMb(), 1),
+        "peak_worker_rss_mb": round(PeakRssMb(resource.RUSAGE_CHILDREN), 1),
+        "artifacts": {key: os.path.abspath(value) for key, value in paths.items()},
+    }
+    run_dir = os.path.join(output_dir, "runs")
+    os.makedirs(run_dir, exist_ok=True)
+    run_path = os.path.join(run_dir, f"{model_name}_{datetime.datetime.now():%Y%m%d_%H%M%S}.json")
+    if publish:
+        # a new registry version, picked up by running services without a restart
+        manifest = registry.Publish(model_name, paths, root=os.path.join(output_dir, "registry"),
+                                    run={"run_log": os.path.abspath(run_path), "holdout": holdout, "params": params})
+        run["published_version"] = manifest["version"]
+    with open(run_path, "w") as openfile:
+        json.dump(run, openfile, indent=4)
+    run["run_log"] = run_path
+    return run
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Train the current or future resale price model")
+    parser.add_argument("--model", choices=list(MODELS), default="current")
+    parser.add_argument("--input", default=default_input, help="Parquet or CSV with month, street_name, flat_type, floor_area_sqm, storey_range, lease_commence_date, resale_price")
+    parser.add_argument("--output-dir", default=default_output, help="Where the model, scaler, column files and run logs are written")
+    parser.add_argument("--trials", type=int, default=8, help="Hyperparameter candidates, including the notebook's tuned parameters")
+    parser.add_argument("--workers", type=int, default=None, help="Trials run in parallel (default: CPUs / threads)")
+    parser.add_argument("--threads", type=int, default=1, help="XGBoost threads per trial")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--max-rounds", type=int, default=1000, help="Boosting round cap before early stopping")
+    parser.add_argument("--early-stopping-rounds", type=int, default=50)
+    parser.add_argument("--holdout-from", default=None, help="YYYY-MM, first holdout month for the future model")
+    parser.add_argument("--start-month", default=None, help="YYYY-MM, first month to train on")
+    parser.add_argument("--end-month", default=None, help="YYYY-MM, last month to train on")
+    parser.add_argument("--time-budget", type=float, default=None, help="Seconds after which no new trials are started")
+    parser.add_argument("--sparse", action="store_true", help="Train on CSR features; the model then reads zeros as missing")
+    parser.add_argument("--store-features", default="", help=f"Comma separated feature store columns to add: {', '.join(STORE_FEATURES)}")
+    parser.add_argument("--publish", action="store_true", help="Also publish the artifacts as a new live model registry version")
+    args = parser.parse_args()
+
+    store_features = [name for name in args.store_features.split(",") if name]
+    unknown = [name for name in store_features if name not in STORE_FEATURES]
+    if unknown:
+        parser.error(f"Unknown feature store columns: {', '.join(unknown)}")
+    run = Train(args.model, args.input, args.output_dir, trials=args.trials, workers=args.workers, threads=args.threads,
+                seed=args.seed, max_rounds=args.max_rounds, early_stopping_rounds=args.early_stopping_rounds,
+                holdout_from=args.holdout_from, start_month=args.start_month, end_month=args.end_month,
+                time_budget=args.time_budget, sparse_input=args.sparse,
+                store_features=store_features, publish=args.publish)
+    holdout = run["holdout"]
+    print(f"Best trial {run['best_trial']} ({run['params']['n_estimators']} rounds): holdout MAE {holdout['mae']:,.0f}, "
+          f"RMSE {holdout['rmse']:,.0f}, R2 {holdout['r2']:.4f}, MAPE {holdout['mape']:.2%}")
+    print(f"Wall {run['wall_seconds']:.1f}s, CPU {run['cpu_seconds']:.1f}s, peak RSS {run['peak_rss_mb']:,.0f} MB "
+          f"(workers {run['peak_worker_rss_mb']:,.0f} MB), run log {run['run_log']}")
+    if "published_version" in run:
+        print(f"Published {args.model} model version {run['published_version']}")
@@ -0,0 +1,262 @@
+import argparse
+import datetime
+import glob
+import json
+import os
+import pickle
+import time
+import warnings
+import numpy as np
+import pandas as pd
+import xgboost as xgb
+from service import registry
+from service.features import SPARSE_MISSING, STREET_PREFIX, FLAT_TYPE_PREFIX, FeatureSchema, PrepareResaleFrame, UsesSparseInput
+from .train import MODELS, default_input, default_output, BoosterParams, LoadTrainingRows, Metrics, PeakRssMb, SplitRows, WriteArtifacts
+
+# Update a deployed model with newly published months instead of retraining on the full history:
+# continue boosting from its booster (or refresh its leaf values) on the new rows only. The updated
+# model is evaluated next to the deployed one on the newest months, which neither has trained on,
+# and replaces it only if accuracy does not regress.
+# Run from the backend root: python3 -m lib.batch.update --model current
+METHODS = ["continue", "refresh"]
+
+def LoadRuns(models_dir: str, model_name: str) -> list:
+    # training and update run logs, oldest first; rejected updates are skipped
+    runs = []
+    for filepath in glob.glob(os.path.join(models_dir, "runs", f"{model_name}_*.json")):
+        with open(filepath, "r") as openfile:
+            run = json.load(openfile)
+        if run.get("model") == model_name and run.get("promoted", True):
+            runs.append(run)
+    return sorted(runs, key=lambda run: run["started_at"])
+
+def NextMonth(month: str) -> str:
+    year, month = (int(part) for part in month.split("-")[:2])
+    return f"{year + month // 12}-{month % 12 + 1:02d}"
+
+def GrowColumns(schema: FeatureSchema, frame: pd.DataFrame, reference: dict = None):
+    # append one-hot columns for unseen streets and flat types after the existing ones, so every
+    # existing column keeps its position and cols_*.json index
+    added = {}
+    for key, prefix, index in [("street_name", STREET_PREFIX, schema.street_index), ("flat_type", FLAT_TYPE_PREFIX, schema.flat_type_index)]:
+        unseen = sorted(set(frame[key].unique()) - set(index))
+        # drop_first left the alphabetically first category out of the schema; without a run log
+        # naming it, an unseen value sorting before every known one is taken to be it
+        dropped = (reference or {}).get(key)
+        if dropped is None and unseen and index and unseen[0] < min(index):
+            dropped = unseen[0]
+        added[key] = [prefix + value for value in unseen if value != dropped]
+    return schema.columns + added["street_name"] + added["flat_type"], added
+
+def WidenBooster(booster: xgb.Booster, columns: list) -> xgb.Booster:
+    # the booster keeps its trees but accepts the appended columns; existing splits only
+    # reference the leading features, so predictions on old rows are unchanged
+    raw = json.loads(booster.save_raw("json"))
+    learner = raw["learner"]
+    width = int(learner["learner_model_param"]["num_feature"])
+    names = learner.get("feature_names") or []
+    if names and names != columns[:width]:
+        raise ValueError("Model feature names do not match the column file")
+    learner["learner_model_param"]["num_feature"] = str(len(columns))
+    for tree in learner["gradient_booster"]["model"]["trees"]:
+        tree["tree_param"]["num_feature"] = str(len(columns))
+    learner["feature_names"] = list(columns)
+    types = learner.get("feature_types") or ["float"] * width
+    learner["feature_types"] = types + ["float"] * (len(columns) - width)
+    widened = xgb.Booster()
+    widened.load_model(bytearray(json.dumps(raw).encode()))
+    return widened
+
+def ContinueBoosting(booster: xgb.Booster, params: dict, matrix: np.ndarray, target: np.ndarray, columns: list,
+                     train: np.ndarray, valid: np.ndarray, rounds: int, early_stopping_rounds: int, missing: float) -> xgb.Booster:
+    dtrain = xgb.QuantileDMatrix(matrix[train], label=target[train], feature_names=columns, missing=missing)
+    dvalid = xgb.QuantileDMatrix(matrix[valid], label=target[valid], feature_names=columns, missing=missing, ref=dtrain)
+    start_rounds = booster.num_boosted_rounds()
+    updated = xgb.train(params, dtrain, num_boost_round=rounds, evals=[(dvalid, "valid")],
+                        early_stopping_rounds=early_stopping_rounds, xgb_model=booster, verbose_eval=False)
+    # keep the new trees up to the best validation score
+    return updated[:max(updated.best_iteration + 1, start_rounds)]
+
+def RefreshLeaves(booster: xgb.Booster, params: dict, matrix: np.ndarray, target: np.ndarray, columns: list, rows: np.ndarray, missing: float) -> xgb.Booster:
+    # same trees, leaf values refit to the new rows
+    params = {key: value for key, value in params.items() if key not in ["tree_method", "eval_metric"]}
+    params.update({"process_type": "update", "updater": "refresh", "refresh_leaf": True})
+    dtrain = xgb.DMatrix(matrix[rows], label=target[rows], feature_names=columns, missing=missing)
+    with warnings.catch_warnings():
+        # xgboost warns whenever updater is set explicitly
+        warnings.simplefilter("ignore", UserWarning)
+        return xgb.train(params, dtrain, num_boost_round=booster.num_boosted_rounds(), xgb_model=booster, verbose_eval=False)
+
+def FullRetrain(input_path: str, end_month: str, holdout_from: str, schema: FeatureSchema, scaler, params: dict, rounds: int, missing: float) -> dict:
+    # train the same column layout from scratch on the full history, for the time comparison
+    start = time.perf_counter()
+    rows = LoadTrainingRows(input_path, end_month=end_month)
+    matrix = schema.EncodeScaled(PrepareResaleFrame(rows), scaler, missing == SPARSE_MISSING)
+    target = rows["resale_price"].to_numpy(dtype=np.float32)
+    fit = rows["month"].to_numpy() < holdout_from
+    dtrain = xgb.QuantileDMatrix(matrix[fit], label=target[fit], feature_names=schema.columns, missing=missing)
+    booster = xgb.train(params, dtrain, num_boost_round=rounds, verbose_eval=False)
+    return {
+        "seconds": round(time.perf_counter() - start, 3),
+        "estimated": False,
+        "holdout": Metrics(target[~fit], booster.inplace_predict(matrix[~fit], missing=missing)),
+    }
+
+def EstimateFullRetrain(runs: list, history_rows: int) -> dict:
+    # scale the refit time of the latest full training run by the rows a retrain would now cover
+    full_runs = [run for run in runs if "refit_seconds" in run]
+    if not full_runs:
+        return None
+    full_run = full_runs[-1]
+    return {
+        "seconds": round(full_run["refit_seconds"] * history_rows / full_run["history_rows"], 3),
+        "estimated": True,
+    }
+
+def Update(model_name: str, input_path: str, models_dir: str, since: str = None, end_month: str = None,
+           method: str = "continue", rounds: int = 100, early_stopping_rounds: int = 20, learning_rate: float = None,
+           holdout_months: int = 1, tolerance: float = 0.0, compare_full: bool = False, threads: int = None,
+           seed: int = 42, dry_run: bool = False, publish: bool = False) -> dict:
+    config = MODELS[model_name]
+    start = time.perf_counter()
+    cpu_start = time.process_time()
+    runs = LoadRuns(models_dir, model_name)
+    previous = runs[-1] if runs else {}
+    if since is None:
+        if not previous:
+            raise ValueError(f"No run log for {model_name} in {models_dir}/runs, pass the first new month with --since")
+        since = NextMonth(previous["months"][1])
+
+    rows = LoadTrainingRows(input_path, start_month=since, end_month=end_month)
+    months = sorted(rows["month"].unique())
+    if len(months) <= holdout_months:
+        raise ValueError(f"Need more than {holdout_months} new month(s) from {since}, found {len(months)}")
+    holdout_from = months[-holdout_months]
+
+    with open(os.path.join(models_dir, config["model"]), "rb") as openfile:
+        deployed = pickle.load(openfile)
+    booster = deployed.get_booster()
+    # keep training the way the model was trained, see service/features.py
+    sparse_input = UsesSparseInput(deployed)
+    missing = SPARSE_MISSING if sparse_input else np.nan
+    with open(os.path.join(models_dir, config["scaler"]), "rb") as openfile:
+        scaler = pickle.load(openfile)
+    schema = FeatureSchema.FromCsv(os.path.join(models_dir, config["columns"]))
+
+    frame = PrepareResaleFrame(rows)
+    columns, added = GrowColumns(schema, frame, previous.get("reference"))
+    grown = FeatureSchema(columns)
+    # keep the deployed scaler: the existing trees split on values scaled with it
+    matrix = grown.EncodeScaled(frame, scaler, sparse_input)
+    target = rows["resale_price"].to_numpy(dtype=np.float32)
+    train, valid, test = SplitRows(rows, {"split": "time"}, holdout_from, seed)
+    print(f"Loaded {len(rows):,} rows from {months[0]} to {months[-1]}: {len(train):,} train, {len(valid):,} validation, "
+          f"{len(test):,} holdout; {len(added['street_name'])} new streets, {len(added['flat_type'])} new flat types", flush=True)
+
+    params = {key: value for key, value in (previous.get("params") or config["params"]).items() if key != "n_estimators"}
+    if learning_rate:
+        params["learning_rate"] = learning_rate
+    params = BoosterParams(params, seed, threads or os.cpu_count())
+    widened = WidenBooster(booster, columns)
+    if method == "refresh":
+        updated = RefreshLeaves(widened, params, matrix, target, columns, np.concatenate([train, valid]), missing)
+    else:
+        updated = ContinueBoosting(widened, params, matrix, target, columns, train, valid, rounds, early_stopping_rounds, missing)
+    update_seconds = time.perf_counter() - start
+
+    # the deployed model scores the holdout on its own columns
+    old_columns = matrix[test][:, :len(schema)]
+    old_columns = old_columns.tocsr() if sparse_input else np.ascontiguousarray(old_columns)
+    baseline = Metrics(target[test], booster.inplace_predict(old_columns, missing=missing))
+    candidate = Metrics(target[test], updated.inplace_predict(matrix[test], missing=missing))
+    promoted = candidate["rmse"] <= baseline["rmse"] * (1 + tolerance)
+
+    history_rows = previous.get("history_rows", 0) + len(train) + len(valid)
+    if compare_full:
+        full = FullRetrain(input_path, months[-1], holdout_from, grown, scaler, params, updated.num_boosted_rounds(), missing)
+    else:
+        full = EstimateFullRetrain(runs, history_rows)
+
+    if promoted and not dry_run:
+        model = xgb.XGBRegressor(missing=missing)
+        model.load_model(bytearray(updated.save_raw("json")))
+        # existing sample rows gain zeros for the appended columns
+        sample = pd.read_csv(os.path.join(models_dir, config["columns"])).reindex(columns=columns, fill_value=0)
+        paths = WriteArtifacts(models_dir, config, model, scaler, columns, sample)
+
+    run = {
+        "model": model_name,
+        "started_at": datetime.datetime.now().isoformat(timespec="seconds"),
+        "method": method,
+        "input": os.path.abspath(input_path),
+        "months": [previous.get("months", [months[0]])[0], months[-1]],
+        "new_months": [months[0], months[-1]],
+        "holdout_from": holdout_from,
+        "rows": {"train": int(len(train)), "validation": int(len(valid)), "holdout": int(len(test))},
+        "history_rows": int(history_rows),
+        "columns": len(columns),
+        "sparse": sparse_input,
+        "added_columns": added["street_name"] + added["flat_type"],
+        "reference": previous.get("reference"),
+        "params": params,
+        "rounds": {"before": booster.num_boosted_rounds(), "after": updated.num_boosted_rounds()},
+        "baseline": baseline,
+        "holdout": candidate,
+        # accepted: passed the holdout check; promoted: the deployed artifacts were replaced
+        "accepted": bool(promoted),
+        "promoted": bool(promoted and not dry_run),
+        "update_seconds": round(update_seconds, 3),
+        "full_retrain": full,
+        "seconds_saved": round(full["seconds"] - update_seconds, 3) if full else None,
+        "wall_seconds": round(time.perf_counter() - start, 3),
+        "cpu_seconds": round(time.process_time() - cpu_start, 3),
+        "peak_rss_mb": round(PeakRssMb(), 1),
+    }
+    run_dir = os.path.join(models_dir, "runs")
+    os.makedirs(run_dir, exist_ok=True)
+    run_path = os.path.join(run_dir, f"{model_name}_update_{datetime.datetime.now():%Y%m%d_%H%M%S}.json")
+    if promoted and not dry_run and publish:
+        manifest = registry.Publish(model_name, paths, root=os.path.join(models_dir, "registry"),
+                                    run={"run_log": os.path.abspath(run_path), "holdout": candidate, "method": method})
+        run["published_version"] = manifest["version"]
+    with open(run_path, "w") as openfile:
+        json.dump(run, openfile, indent=4)
+    run["run_log"] = run_path
+    return run
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Update the current or future model with newly published months")
+    parser.add_argument("--model", choices=list(MODELS), default="current")
+    parser.add_argument("--input", default=default_input, help="Parquet or CSV with month, street_name, flat_type, floor_area_sqm, storey_range, lease_commence_date, resale_price")
+    parser.add_argument("--models-dir", default=default_output, help="Folder with the deployed artifacts and their runs/ logs")
+    parser.add_argument("--since", default=None, help="YYYY-MM, first new month (default: the month after the latest run)")
+    parser.add_argument("--end-month", default=None, help="YYYY-MM, last month to use")
+    parser.add_argument("--method", choices=METHODS, default="continue", help="Add trees (continue) or refit existing leaf values (refresh)")
+    parser.add_argument("--rounds", type=int, default=100, help="Most trees to add when continuing")
+    parser.add_argument("--early-stopping-rounds", type=int, default=20)
+    parser.add_argument("--learning-rate", type=float, default=None, help="Learning rate for the added trees (default: the model's)")
+    parser.add_argument("--holdout-months", type=int, default=1, help="Newest months held out to compare the models")
+    parser.add_argument("--tolerance", type=float, default=0.0, help="Relative holdout RMSE increase still promoted")
+    parser.add_argument("--compare-full", action="store_true", help="Also time a full retrain instead of estimating it")
+    parser.add_argument("--threads", type=int, default=None)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--dry-run", action="store_true", help="Evaluate without replacing the deployed artifacts")
+    parser.add_argument("--publish", action="store_true", help="Also publish a promoted model as a new live model registry version")
+    args = parser.parse_args()
+
+    run = Update(args.model, args.input, args.models_dir, since=args.since, end_month=args.end_month, method=args.method,
+                 rounds=args.rounds, early_stopping_rounds=args.early_stopping_rounds, learning_rate=args.learning_rate,
+                 holdout_months=args.holdout_months, tolerance=args.tolerance, compare_full=args.compare_full,
+                 threads=args.threads, seed=args.seed, dry_run=args.dry_run, publish=args.publish)
+    print(f"Holdout RMSE {run['baseline']['rmse']:,.0f} -> {run['holdout']['rmse']:,.0f}, "
+          f"MAE {run['baseline']['mae']:,.0f} -> {run['holdout']['mae']:,.0f} "
+          f"({run['rounds']['before']} -> {run['rounds']['after']} rounds): {'promoted' if run['promoted'] else 'accepted (dry run)' if run['accepted'] else 'not promoted'}")
+    full = run["full_retrain"]
+    if full:
+        print(f"Update {run['update_seconds']:.1f}s vs full retrain {full['seconds']:.1f}s"
+              f"{' (estimated)' if full['estimated'] else ''}: {run['seconds_saved']:.1f}s saved")
+        if "holdout" in full:
+            print(f"Full retrain holdout RMSE {full['holdout']['rmse']:,.0f}, MAE {full['holdout']['mae']:,.0f}")
+    print(f"Wall {run['wall_seconds']:.1f}s, CPU {run['cpu_seconds']:.1f}s, peak RSS {run['peak_rss_mb']:,.0f} MB, run log {run['run_log']}")
+    if "published_version" in run:
+        print(f"Published {args.model} model version {run['published_version']}")
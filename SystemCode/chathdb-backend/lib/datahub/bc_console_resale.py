@@ -1,14 +1,18 @@
 import polars as pl
 import os
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '../..'))
+from service import schema
 
 script_dir = os.path.dirname(__file__)
 conso_file = script_dir + '/../../static/data/resale_price/parsed/consolidated_resale.parquet'
 
 
-df = pl.scan_parquet(
+df = schema.Scan(
     conso_file,
         ).with_columns(
-            pl.col('month').str.split('-').list.first().alias('year')
+            schema.YearExpr()
             ).group_by(
                 ['year']
                 ).agg(
@@ -0,0 +1,49 @@
+import argparse
+import os
+import sys
+import time
+import polars as pl
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '../..'))
+from service import dimensions, schema
+
+# Write the town, planning area, street and model column dimension tables to static/data/dimensions.
+# Run after the resale data is consolidated; the other stages and the backend read these tables.
+script_dir = os.path.dirname(__file__)
+static_dir = script_dir + '/../../static'
+
+def Build(static_dir: str, resale_path: str) -> dict:
+    start = time.perf_counter()
+    output_dir = os.path.join(static_dir, dimensions.DIMENSIONS_DIR)
+    os.makedirs(output_dir, exist_ok=True)
+    tables = {
+        "towns": dimensions.TownsFrame(),
+        "planning_area_town": dimensions.PlanningAreaTownFrame(os.path.join(static_dir, dimensions.PLANNING_AREA_FILE)),
+        # the only scan of the resale history; later stages look streets up here
+        "street_town": dimensions.StreetTownFrame(schema.Scan(resale_path)),
+        "model_columns": dimensions.ModelColumnsFrame(os.path.join(static_dir, dimensions.MODEL_COLUMNS_DIR)),
+    }
+    for name, table in tables.items():
+        # written and renamed, so readers never see a partial table
+        filepath = os.path.join(output_dir, name + ".parquet")
+        table.write_parquet(filepath + ".tmp")
+        os.replace(filepath + ".tmp", filepath)
+        print(f"{name}: {len(table):,} rows")
+
+    # streets the models know but the resale history does not, which fall back to economic
+    # features only in the feature store lookup
+    known = set(tables["street_town"]["street_name"].to_list())
+    for model in dimensions.MODEL_PREFIXES:
+        streets = tables["model_columns"].filter((pl.col("model") == model) & (pl.col("kind") == "street_name"))["name"].to_list()
+        missing = [street for street in streets if street not in known]
+        print(f"{model} model: {len(streets) - len(missing):,} of {len(streets):,} streets have a town")
+    return {"tables": {name: len(table) for name, table in tables.items()}, "build_seconds": round(time.perf_counter() - start, 3)}
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build the dimension tables")
+    parser.add_argument("--resale", default=os.path.join(static_dir, dimensions.RESALE_FILE))
+    parser.add_argument("--static-dir", default=static_dir)
+    args = parser.parse_args()
+
+    result = Build(args.static_dir, args.resale)
+    print(f"Dimension tables written to {os.path.normpath(os.path.join(args.static_dir, dimensions.DIMENSIONS_DIR))} ({result['build_seconds']:.2f}s)")
@@ -0,0 +1,100 @@
+import argparse
+import datetime
+import json
+import os
+import shutil
+import sys
+import time
+import polars as pl
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '../..'))
+from service import dimensions, schema
+from service.feature_store import FEATURES, MonthFromKey, BuildTownMonthFeatures, JoinFeatures
+
+# Join the economic, Google Trends and news sentiment features onto the resale data in one pass and
+# write a new feature store version:
+#   <store>/<version>/town_month.parquet  point-in-time features per town and month
+#   <store>/<version>/resale/year=YYYY/   resale rows with their features, partitioned by year
+#   <store>/<version>/manifest.json       sources, row counts and month range
+#   <store>/LATEST                         name of the version training and serving read
+script_dir = os.path.dirname(__file__)
+economic_file_name = script_dir + '/../../static/data/economic_data/parsed/consolidated_economic_data.parquet'
+gtrends_file_name = script_dir + '/../../static/data/gtrends/parsed/consolidated_gtrends.parquet'
+gnews_file_name = script_dir + '/../../static/data/gnews/parsed/aggregated_gnews_scores.parquet'
+resale_price_file_name = script_dir + '/../../static/data/resale_price/parsed/consolidated_resale.parquet'
+store_dir = script_dir + '/../../static/data/feature_store'
+static_dir = script_dir + '/../../static'
+
+def Source(filepath: str, rows: int) -> dict:
+    return {"path": os.path.abspath(filepath), "rows": rows, "modified": datetime.datetime.fromtimestamp(os.path.getmtime(filepath)).isoformat(timespec="seconds")}
+
+def Build(resale_path: str, output_dir: str, keep: int = 3) -> dict:
+    start = time.perf_counter()
+    # microseconds keep back-to-back builds apart; written under a hidden name and renamed once
+    # complete, so a failed build is never read
+    version = datetime.datetime.now().strftime("%Y%m%dT%H%M%S%f")
+    version_dir = os.path.join(output_dir, "." + version)
+    os.makedirs(os.path.join(version_dir, "resale"))
+
+    economic = schema.Scan(economic_file_name)
+    gtrends = schema.Scan(gtrends_file_name)
+    gnews = schema.Scan(gnews_file_name)
+    resale = schema.Scan(resale_path)
+
+    # cover every resale month, and the current month so serving can look up today
+    first_key, last_key = resale.select(pl.col("month_key").min(), pl.col("month_key").max().alias("last")).collect().row(0)
+    towns = dimensions.Dimensions.Load(static_dir).towns
+    today = datetime.date.today()
+    last_key = max(last_key, today.year * 12 + today.month - 1)
+
+    town_month = BuildTownMonthFeatures(economic, gtrends, gnews, towns, first_key, last_key)
+    town_month.write_parquet(os.path.join(version_dir, "town_month.parquet"))
+
+    # one join of the features onto the resale rows, written one year per partition
+    joined = JoinFeatures(resale, town_month).with_columns(schema.YearExpr()).collect()
+    resale_rows = len(joined)
+    for (year,), partition in joined.partition_by("year", as_dict=True, include_key=False).items():
+        partition_dir = os.path.join(version_dir, "resale", f"year={year}")
+        os.makedirs(partition_dir, exist_ok=True)
+        partition.sort("month_key").write_parquet(os.path.join(partition_dir, "part-0.parquet"))
+
+    manifest = {
+        "version": version,
+        "created_at": datetime.datetime.now().isoformat(timespec="seconds"),
+        "features": FEATURES,
+        "months": [MonthFromKey(first_key), MonthFromKey(last_key)],
+        "towns": len(towns),
+        "rows": {"town_month": len(town_month), "resale": resale_rows},
+        "sources": {
+            "economic": Source(economic_file_name, economic.select(pl.len()).collect().item()),
+            "gtrends": Source(gtrends_file_name, gtrends.select(pl.len()).collect().item()),
+            "gnews": Source(gnews_file_name, gnews.select(pl.len()).collect().item()),
+            "resale": Source(resale_path, resale_rows),
+        },
+        "build_seconds": round(time.perf_counter() - start, 3),
+    }
+    with open(os.path.join(version_dir, "manifest.json"), "w") as openfile:
+        json.dump(manifest, openfile, indent=4)
+
+    os.rename(version_dir, os.path.join(output_dir, version))
+    # publish by swapping the LATEST pointer, then drop the oldest versions
+    pointer = os.path.join(output_dir, "LATEST")
+    with open(pointer + ".tmp", "w") as openfile:
+        openfile.write(version)
+    os.replace(pointer + ".tmp", pointer)
+    versions = sorted(name for name in os.listdir(output_dir) if os.path.isdir(os.path.join(output_dir, name)) and not name.startswith("."))
+    for name in versions[:-keep] if keep > 0 else []:
+        shutil.rmtree(os.path.join(output_dir, name))
+    return manifest
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build a new feature store version")
+    parser.add_argument("--resale", default=resale_price_file_name)
+    parser.add_argument("--output-dir", default=store_dir)
+    parser.add_argument("--keep", type=int, default=3, help="Versions to keep, including the new one")
+    args = parser.parse_args()
+
+    manifest = Build(args.resale, args.output_dir, args.keep)
+    print(f"Feature store {manifest['version']}: {manifest['rows']['resale']:,} resale rows, "
+          f"{manifest['rows']['town_month']:,} town-months from {manifest['months'][0]} to {manifest['months'][1]} "
+          f"({manifest['build_seconds']:.1f}s)")
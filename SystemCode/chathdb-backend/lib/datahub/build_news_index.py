@@ -0,0 +1,28 @@
+import argparse
+import os
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '../..'))
+from service import news_index
+
+# Add newly scraped headlines to the BM25 news index the /api/signals/search endpoint reads.
+# Only headlines not indexed yet are tokenized; run after clean_gnews.py (and again after
+# lib/sentiment/gnews_analysis.py to attach the sentiment scores).
+script_dir = os.path.dirname(__file__)
+gnews_file_name = script_dir + '/../../static/data/gnews/parsed/consolidated_gnews.parquet'
+scored_gnews_file_name = script_dir + '/../../static/data/gnews/parsed/scored_consolidated_gnews.parquet'
+index_file_name = script_dir + '/../../static/data/gnews/index/news_index.npz'
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Update the news search index")
+    parser.add_argument("--gnews", default=gnews_file_name)
+    parser.add_argument("--scored", default=scored_gnews_file_name)
+    parser.add_argument("--index", default=index_file_name)
+    parser.add_argument("--rebuild", action="store_true", help="Index every headline again from scratch")
+    args = parser.parse_args()
+
+    if args.rebuild and os.path.exists(args.index):
+        os.remove(args.index)
+    stats = news_index.Update(args.index, args.gnews, args.scored)
+    print(f"News index: {stats['added']:,} headlines added, {stats['headlines']:,} in total, {stats['terms']:,} terms, "
+          f"{stats['postings']:,} postings, {stats['scored']:,} with sentiment ({stats['bytes'] / 1024:.0f} KiB)")
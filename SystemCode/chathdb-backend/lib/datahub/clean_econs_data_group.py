@@ -1,7 +1,11 @@
 import os
+import sys
 import pandas as pd
 import polars as pl
 
+sys.path.append(os.path.join(os.path.dirname(__file__), '../..'))
+from service import schema
+
 script_dir = os.path.dirname(__file__)
 cpi_file_name = script_dir + '/../../static/data/economic_data/raw/cpi.csv'
 gdp_file_name = script_dir + '/../../static/data/economic_data/raw/gdp.csv'
@@ -57,7 +61,7 @@ conso_df = cpi_pldf.join(
                 pl.col(['cpi', 'gdp', 'unemployment']).fill_null(strategy="backward")
                 )
 
-conso_df.write_parquet(output_filepath)
+schema.Apply(conso_df, schema.ECONOMIC).write_parquet(output_filepath)
 
 # Verify file content
 outputDf = pl.read_parquet(output_filepath)
@@ -1,56 +1,32 @@
 import os
+import sys
 import polars as pl
 
-town_mapping = {
-    "CENTRAL AREA": [
-        "SINGAPORE RIVER",
-        "ROCHOR",
-        "MUSEUM",
-        "DOWNTOWN CORE",
-        "RIVER VALLEY",
-        "ORCHARD",
-        "NEWTON",
-        "OUTRAM",
-        "MARINA SOUTH",
-    ],
-    "KALLANG/WHAMPOA": [
-        "KALLANG",
-        "WHAMPOA",
-    ],
-}
-
+sys.path.append(os.path.join(os.path.dirname(__file__), '../..'))
+from service import dimensions, schema
 
 script_dir = os.path.dirname(__file__)
 clean_folder_path = script_dir + '/../../static/data/gnews/clean'
 output_folder_path = script_dir + '/../../static/data/gnews/parsed'
 output_filepath = os.path.join(output_folder_path, 'consolidated_gnews.parquet')
 
-resale_file = script_dir + '/../../static/data/resale_price/parsed/consolidated_resale.parquet'
-resale_town_list = pl.scan_parquet(resale_file).select("town").unique().collect()["town"].to_list()
+# planning area -> HDB town, from the dimension tables
+town_dimensions = dimensions.Dimensions.Load(script_dir + '/../../static')
 
 
 error_list = []
 result = []
 
-# Get all town names
-town_id_map = {}
-for key, towns in town_mapping.items():
-    for town in towns:
-        town_id_map[town] = key
-
 # Process all parquet files in the folder
 for filename in os.listdir(clean_folder_path):
     if filename.endswith(f'.parquet'):
         try:
             # Extract town and year from filename
             raw_town = filename.replace('.parquet', '')
-            if raw_town in town_id_map:
-                town = town_id_map[raw_town]
-            else:
-                town = raw_town
+            town = town_dimensions.PlanningAreaToTown(raw_town)
 
-            # Skip if town is not in resale_town_list
-            if town not in resale_town_list:
+            # Skip planning areas without an HDB town
+            if town is None:
                 continue
 
             # Read the parquet file
@@ -77,7 +53,7 @@ if error_list:
     for error in error_list:
         print(error)
 
-gnews_df = pl.concat(result).collect()
+gnews_df = schema.Apply(pl.concat(result), schema.GNEWS).collect()
 gnews_df.write_parquet(output_filepath)
 
 # Verify file content
@@ -1,23 +1,9 @@
 import os
+import sys
 import polars as pl
 
-town_mapping = {
-    "CENTRAL AREA": [
-        "SINGAPORE RIVER",
-        "ROCHOR",
-        "MUSEUM",
-        "DOWNTOWN CORE",
-        "RIVER VALLEY",
-        "ORCHARD",
-        "NEWTON",
-        "OUTRAM",
-        "MARINA SOUTH",
-    ],
-    "KALLANG/WHAMPOA": [
-        "KALLANG",
-        "WHAMPOA",
-    ],
-}
+sys.path.append(os.path.join(os.path.dirname(__file__), '../..'))
+from service import dimensions, schema
 
 script_dir = os.path.dirname(__file__)
 folder_path = script_dir + '/../../static/data/gtrends/'
@@ -25,37 +11,23 @@ clean_folder_path =  os.path.join(folder_path, 'raw_parquet/')
 output_folder_path = os.path.join(folder_path, 'parsed/')
 output_filepath = os.path.join(output_folder_path, 'consolidated_gtrends.parquet')
 
-resale_folder_path = script_dir + '/../../static/data/resale_price'
-resale_files = [os.path.join(resale_folder_path, f) for f in os.listdir(resale_folder_path) if f.endswith('.csv') \
-                and 'based on registration date' in f.lower()]
-
-resale_town_list = pl.concat(
-    [pl.scan_csv(f).select("town") for f in resale_files]
-    ).unique().collect()["town"].to_list()
+# planning area -> HDB town, from the dimension tables
+town_dimensions = dimensions.Dimensions.Load(script_dir + '/../../static')
 
 
 error_list = []
 result = []
 
-# Get all town names
-town_id_map = {}
-for key, towns in town_mapping.items():
-    for town in towns:
-        town_id_map[town] = key
-
 # Process all parquet files in the folder
 for filename in os.listdir(clean_folder_path):
     if filename.endswith('.parquet'):
         try:
             # Extract town from filename
             raw_town = filename.split('.')[0]
-            if raw_town in town_id_map:
-                town = town_id_map[raw_town]
-            else:
-                town = raw_town
+            town = town_dimensions.PlanningAreaToTown(raw_town)
 
-            # Skip if town is not in resale_town_list
-            if town not in resale_town_list:
+            # Skip planning areas without an HDB town
+            if town is None:
                 continue
 
             # Read the parquet file
@@ -83,7 +55,7 @@ if error_list:
     for error in error_list:
         print(error)
 
-gtrend_df = pl.concat(result).collect()
+gtrend_df = schema.Apply(pl.concat(result), schema.GTRENDS).collect()
 
 
 gtrend_df.write_parquet(output_filepath)
@@ -0,0 +1,24 @@
+import os
+import sys
+import polars as pl
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '../..'))
+from service import schema
+
+# Parse the Ministry of Manpower median income series (one row per year, national) for the
+# affordability cube built by lib/batch/affordability.py
+script_dir = os.path.dirname(__file__) # absolute dir the script is in
+file_path = script_dir + '/../../static/data/median_income/raw/MedianGrossMonthlyIncomeFromEmploymentofFullTimeEmployedResidentsTotal.csv'
+output_dir = script_dir + '/../../static/data/median_income/parsed'
+output_filepath = output_dir + '/median_income.parquet'
+
+# the source skips years without a survey (2005), readers carry the previous year forward
+data = pl.scan_csv(
+    file_path, schema_overrides={"year": pl.Int16, "med_income_incl_empcpf": pl.Float32, "med_income_excl_empcpf": pl.Float32}
+    ).drop_nulls("year").unique("year", keep="last").sort("year")
+
+os.makedirs(output_dir, exist_ok=True)
+schema.Apply(data, schema.MEDIAN_INCOME).collect().write_parquet(output_filepath)
+
+outputDf = pl.read_parquet(output_filepath)
+print(outputDf)
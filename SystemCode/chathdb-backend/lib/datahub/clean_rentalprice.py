@@ -1,6 +1,10 @@
 import os
+import sys
 import polars as pl
 
+sys.path.append(os.path.join(os.path.dirname(__file__), '../..'))
+from service import schema
+
 # Read the planning area data
 script_dir = os.path.dirname(__file__) # absolute dir the script is in
 file_path = script_dir + '/../../static/data/rental_amount/raw/RentingOutofFlats2025.csv'
@@ -25,7 +29,7 @@ data = pl.scan_csv(
                 pl.col("monthly_rent").median().alias("median_monthly_rent")
                 )
 
-data.collect().write_parquet(output_filepath)
+schema.Apply(data, schema.RENTAL, month_column="rent_approval_date").collect().write_parquet(output_filepath)
 
 outputDf = pl.read_parquet(output_filepath)
 print(outputDf)
@@ -1,6 +1,10 @@
 import polars as pl
 import glob
 import os
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '../..'))
+from service import schema
 
 # Read and combine all CSV files in the ResaleFlatPrices folder
 assumed_lease_period = 99 # assume all flats have 99 years lease
@@ -31,12 +35,15 @@ for file in all_files:
     ).select(
         list(dtype_dict.keys())
         ).with_columns(
-            [(assumed_lease_period - (pl.col('month').str.split('-').list.first().str.to_integer() - pl.col('lease_commence_date'))).alias('remaining_lease')]
+            schema.MonthKeyExpr()
+        ).with_columns(
+            [(assumed_lease_period - (schema.YearExpr() - pl.col('lease_commence_date'))).alias('remaining_lease')]
         )
     
     df_list.append(df)
 
-conso_df = pl.concat(df_list).collect()
+# strings are read per file and cast once, so categoricals share one dictionary
+conso_df = schema.Apply(pl.concat(df_list), schema.RESALE).collect()
 conso_df.write_parquet(output_file)
 
 if os.path.exists(output_file):
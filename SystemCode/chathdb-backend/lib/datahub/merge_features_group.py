@@ -1,17 +1,21 @@
 import os
+import sys
 import polars as pl
 
+sys.path.append(os.path.join(os.path.dirname(__file__), '../..'))
+from service import schema
+
 script_dir = os.path.dirname(__file__)
 economic_file_name = script_dir + '/../../static/data/economic_data/parsed/consolidated_economic_data.parquet'
 resale_price_file_name = script_dir + '/../../static/data/resale_price/parsed/consolidated_resale.parquet'
 output_filepath = script_dir + '/../../static/data/conso/raw/conso_data.parquet'
 
-economic_df = pl.scan_parquet(economic_file_name)
-resale_df = pl.scan_parquet(resale_price_file_name).sort(by='month', descending=True)
+economic_df = schema.Scan(economic_file_name).drop('month')
+resale_df = schema.Scan(resale_price_file_name).sort(by='month_key', descending=True)
 
 
 conso_df = resale_df.join(
-    economic_df, on='month', how='left', coalesce=True
+    economic_df, on='month_key', how='left', coalesce=True
     ).with_columns(
         pl.col(['cpi', 'gdp', 'unemployment']).fill_null(strategy="backward")
         ).collect()
@@ -3,6 +3,9 @@ import os
 import sys
 import polars as pl
 
+sys.path.append(os.path.join(os.path.dirname(__file__), '../..'))
+from service import schema
+
 sentiment_pipeline = pipeline(
     "sentiment-analysis",
     model="cardiffnlp/twitter-roberta-base-sentiment",
@@ -30,7 +33,7 @@ def analyseIndiv():
             row['label'] = mapping[label]
             row['score'] = score
             indiv_output.append(row)
-        indiv = pl.DataFrame(indiv_output)
+        indiv = schema.Apply(pl.DataFrame(indiv_output), schema.GNEWS_SCORED)
         indiv.write_parquet(indiv_filepath)     
         print(f"Analysed and saved individual sentiment analysis, output file: {indiv_filepath}")
         
@@ -43,7 +46,7 @@ def consolidateScores():
     try:
         df = pl.scan_parquet(indiv_filepath).collect()
         agg_df = df.drop("title").group_by("month", "town").agg((pl.col("score") * pl.col("label")).sum().alias("aggregated_score"), (pl.col("score") * pl.col("label")).mean().alias("mean_score")).sort(["town", "month"], descending=True)
-        agg_df.write_parquet(aggregate_filepath)
+        schema.Apply(agg_df, schema.GNEWS_AGGREGATED).write_parquet(aggregate_filepath)
         print(f"Consolidated and saved aggregated sentiment analysis, output file: {indiv_filepath}")
         
     except Exception as e:
@@ -1,7 +1,19 @@
 from .health_routes import health_bp
 from .model_routes import model_bp
+from .metrics_routes import metrics_bp
+from .street_routes import street_bp
+from .planning_area_routes import planning_area_bp
+from .feature_routes import feature_bp
+from .signal_routes import signal_bp
+from .valuation_routes import valuation_bp
 
 # Register all routers here
 def register_routes(app):
     app.register_blueprint(health_bp)
     app.register_blueprint(model_bp)
+    app.register_blueprint(metrics_bp)
+    app.register_blueprint(street_bp)
+    app.register_blueprint(planning_area_bp)
+    app.register_blueprint(feature_bp)
+    app.register_blueprint(signal_bp)
+    app.register_blueprint(valuation_bp)
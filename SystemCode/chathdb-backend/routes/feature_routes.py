@@ -0,0 +1,27 @@
+import datetime
+from flask import Blueprint, jsonify, request
+from service import feature_store, metrics
+
+# Point-in-time features from the feature store
+feature_bp = Blueprint('features', __name__, url_prefix='/api/features')
+
+@feature_bp.route("/", methods=["GET"], strict_slashes=False)
+@metrics.Instrument("features")
+def get_features():
+    try:
+        today = datetime.date.today()
+        town = request.args.get('town', default="").strip().upper()
+        month = request.args.get('month', default=f"{today.year}-{today.month:02d}")
+        store = feature_store.GetFeatureStore()
+        result = {
+            "town": town or None,
+            "month": feature_store.MonthFromKey(feature_store.MonthKey(month)),
+            "version": store.version,
+            "features": store.Lookup(town, month),
+        }
+        return jsonify(result), 200
+
+    except Exception as e:
+        # Catch any exception and return an appropriate error response
+        metrics.RecordError("features", e)
+        return jsonify({"error": str(e)}), 404
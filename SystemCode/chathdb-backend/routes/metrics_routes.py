@@ -0,0 +1,27 @@
+from flask import Blueprint, Response, jsonify
+from service import admission, metrics, prediction_log, warmup
+
+# Expose service metrics for Prometheus scraping
+metrics_bp = Blueprint('metrics', __name__, url_prefix='/api/metrics')
+
+@metrics_bp.route('/', methods=['GET'], strict_slashes=False)
+def get_metrics():
+    return Response(metrics.RenderPrometheus(), content_type="text/plain; version=0.0.4; charset=utf-8")
+
+
+@metrics_bp.route('/prediction-log', methods=['GET'])
+def get_prediction_log_stats():
+    # queued, written and dropped record counts of the write-behind prediction log
+    if not prediction_log.ENABLED:
+        return jsonify({"enabled": False}), 200
+    return jsonify({"enabled": True, **prediction_log.GetPredictionLogger().Stats()}), 200
+
+@metrics_bp.route('/admission', methods=['GET'])
+def get_admission_stats():
+    # slots in use, queue depth and admitted/shed/timeout counts per endpoint
+    return jsonify(admission.GetController().Stats()), 200
+
+@metrics_bp.route('/warmup', methods=['GET'])
+def get_warmup_stats():
+    # recent prediction cache warm-ups: trigger, keys scored, coverage, duration and throttling
+    return jsonify(warmup.GetWarmer().Status()), 200
@@ -1,9 +1,60 @@
-from flask import Blueprint, jsonify, request
-from service import model, future_model
+import hmac
+import json
+import os
+import time
+from flask import Blueprint, current_app, jsonify, request
+from service import model, future_model, metrics, http_cache, prediction_log, registry, experiments, admission, explain, sweep, heatmap, prediction_cache
 
 # Interact with prediction model
+ADMIN_TOKEN = os.environ.get("MODEL_ADMIN_TOKEN", "")
 model_bp = Blueprint('model', __name__, url_prefix='/api/model')
 
+def LogPrediction(endpoint: str, inputs: dict, result, model_version: str, start: float):
+    # queued for the background writer, the response does not wait for the database
+    prediction_log.Log(
+        endpoint, inputs, result, model_version, (time.perf_counter() - start) * 1000,
+        client_id=request.headers.get("X-Client-Id"), user_agent=request.headers.get("User-Agent"),
+    )
+
+def Versioned(response, bundle):
+    # every prediction response names the model version that served it
+    response.headers["X-Model-Version"] = bundle.version
+    return response
+
+def ExplainInputs(values) -> dict:
+    # request args or one batch row, with the defaults of /predict
+    return model.NormalizeInputs(
+        values.get('street_name', "CLEMENTI AVE 1"),
+        values.get('floor_area', 70),
+        values.get('storey_range', 1),
+        int(values.get('lease_start', 2000)),
+        values.get('flat_type', "2 ROOM"),
+    )
+
+def SweepAxis(name: str):
+    # ?x=floor_area&x_values=60,70,80 or ?x=floor_area&x_from=60&x_to=120&x_steps=13; None when not given
+    variable = request.args.get(name)
+    if not variable:
+        return None
+    values = request.args.get(f"{name}_values")
+    if values:
+        return sweep.Axis(variable, [float(value) for value in values.split(",") if value.strip()])
+    low, high = sweep.VARIABLES.get(variable, (0, 0))
+    return sweep.Axis.FromRange(
+        variable,
+        float(request.args.get(f"{name}_from", default=low)),
+        float(request.args.get(f"{name}_to", default=high)),
+        int(request.args.get(f"{name}_steps", default=20)),
+    )
+
+def ShadowScorer(params: dict):
+    # prediction of a challenger bundle for the same request, run on the shadow pool
+    app = current_app._get_current_object()
+    def score(bundle):
+        with app.app_context():
+            return model.PredictPrice(**params, bundle=bundle)
+    return score
+
 # Create a new user
 @model_bp.route("/", methods=["GET"])
 def get_prediction():
@@ -15,6 +66,8 @@ def get_prediction():
         return jsonify({"error": str(e)}), 404
     
 @model_bp.route("/predict/test", methods=["GET"])
+@metrics.Instrument("predict_test")
+@admission.Admit("predict_test")
 def get_test_prediction():
     try:
         result = {
@@ -24,9 +77,12 @@ def get_test_prediction():
         
     except Exception as e:
         # Catch any exception and return an appropriate error response
+        metrics.RecordError("predict_test", e)
         return jsonify({"error": str(e)}), 404
     
 @model_bp.route("/predict", methods=["GET"])
+@metrics.Instrument("predict")
+@admission.Admit("predict")
 def get_price_prediction():
     try:
         street_name = request.args.get('street_name', default="CLEMENTI AVE 1")
@@ -34,17 +90,50 @@ def get_price_prediction():
         storey_range = request.args.get('storey_range', default=1)
         lease_start = int(request.args.get('lease_start', default=2000))
         flat_type = request.args.get('flat_type', default="2 ROOM")
-        result = {
-            "price": model.PredictPrice(street_name=street_name, floor_area=floor_area, storey_range=storey_range, lease_start=lease_start, flat_type=flat_type),
-        }
-        return jsonify(result), 200
+        inputs = model.NormalizeInputs(street_name, floor_area, storey_range, lease_start, flat_type)
+        params = dict(street_name=street_name, floor_area=floor_area, storey_range=storey_range, lease_start=lease_start, flat_type=flat_type)
+        # every step reads the same model version, even if a new one goes live meanwhile
+        with registry.GetRegistry().Use("current") as live:
+            trials = experiments.GetExperiments("current")
+            # A/B buckets are per client, so a user keeps seeing the same model
+            bucket_key = request.headers.get("X-Client-Id") or json.dumps(inputs, sort_keys=True)
+            # while a challenger takes a share the price depends on the client: no shared caching
+            private = trials.Splitting(live)
+            with trials.Serve(live, bucket_key) as (variant, bundle):
+                # the prediction is fixed for these inputs, this model and this month
+                etag = http_cache.PredictionETag("predict", inputs, model.CacheVersion(bundle))
+                if http_cache.NotModified(etag):
+                    return Versioned(http_cache.NotModifiedResponse(etag, private), bundle)
+                start = time.perf_counter()
+                # popular inputs are scored ahead of deploys and month end by service/warmup.py
+                cache = prediction_cache.GetPredictionCache()
+                cache.Track(inputs)
+                cache_key = cache.Key(model.CacheVersion(bundle), inputs)
+                price = cache.Get(cache_key)
+                if price is None:
+                    price = model.PredictPrice(**params, bundle=bundle)
+                    cache.Put(cache_key, price)
+                    trials.Record(variant, time.perf_counter() - start)
+                result = {
+                    "price": price,
+                }
+                if bundle is live:
+                    trials.Shadow(live, ShadowScorer(params), result["price"], admission.Deadline())
+                LogPrediction("predict", inputs, result, bundle.version, start)
+                return Versioned(http_cache.Cacheable(jsonify(result), etag, private), bundle), 200
         
+    except admission.DeadlineExceeded:
+        # answered by admission.Admit with 503 and Retry-After
+        raise
     except Exception as e:
         # Catch any exception and return an appropriate error response
+        metrics.RecordError("predict", e)
         return jsonify({"error": str(e)}), 404
     
     
 @model_bp.route("/future/predict", methods=["GET"])
+@metrics.Instrument("future_predict")
+@admission.Admit("future_predict")
 def get_future_price_prediction():
     try:
         street_name = request.args.get('street_name', default="CLEMENTI AVE 1")
@@ -52,16 +141,134 @@ def get_future_price_prediction():
         storey_range = request.args.get('storey_range', default=1)
         lease_start = int(request.args.get('lease_start', default=2000))
         flat_type = request.args.get('flat_type', default="2 ROOM")
-        result = future_model.PredictFuturePrice(street_name=street_name, floor_area=floor_area, storey_range=storey_range, lease_start=lease_start, flat_type=flat_type)
-        
-        return jsonify(result), 200
+        with registry.GetRegistry().Use("future") as bundle:
+            inputs = future_model.NormalizeInputs(street_name, floor_area, storey_range, lease_start, flat_type)
+            etag = http_cache.PredictionETag("future_predict", inputs, future_model.CacheVersion(bundle))
+            if http_cache.NotModified(etag):
+                return Versioned(http_cache.NotModifiedResponse(etag), bundle)
+            start = time.perf_counter()
+            result = future_model.PredictFuturePrice(street_name=street_name, floor_area=floor_area, storey_range=storey_range, lease_start=lease_start, flat_type=flat_type, bundle=bundle)
+            LogPrediction("future_predict", inputs, result, bundle.version, start)
+            
+            return Versioned(http_cache.Cacheable(jsonify(result), etag), bundle), 200
         
+    except admission.DeadlineExceeded:
+        # answered by admission.Admit with 503 and Retry-After
+        raise
+    except Exception as e:
+        # Catch any exception and return an appropriate error response
+        metrics.RecordError("future_predict", e)
+        return jsonify({"error": str(e)}), 404
+    
+    
+@model_bp.route("/explain", methods=["GET"])
+@metrics.Instrument("explain")
+@admission.Admit("explain")
+def get_price_explanation():
+    try:
+        inputs = ExplainInputs(request.args)
+        with registry.GetRegistry().Use("current") as bundle:
+            etag = http_cache.PredictionETag("explain", inputs, model.CacheVersion(bundle))
+            if http_cache.NotModified(etag):
+                return Versioned(http_cache.NotModifiedResponse(etag), bundle)
+            result = explain.GetExplainer().Explain(bundle, [inputs], admission.Deadline())[0]
+            return Versioned(http_cache.Cacheable(jsonify(result), etag), bundle), 200
+
+    except admission.DeadlineExceeded:
+        # answered by admission.Admit with 503 and Retry-After
+        raise
     except Exception as e:
         # Catch any exception and return an appropriate error response
+        metrics.RecordError("explain", e)
+        return jsonify({"error": str(e)}), 404
+
+
+@model_bp.route("/explain", methods=["POST"])
+@metrics.Instrument("explain_batch")
+@admission.Admit("explain_batch", admission.BATCH)
+def get_price_explanations():
+    try:
+        rows = (request.get_json(silent=True) or {}).get("rows", [])
+        if not isinstance(rows, list) or not rows:
+            return jsonify({"error": "rows must be a non-empty list"}), 400
+        if len(rows) > explain.EXPLAIN_MAX_ROWS:
+            return jsonify({"error": f"At most {explain.EXPLAIN_MAX_ROWS} rows per request"}), 400
+        inputs = [ExplainInputs(row) for row in rows]
+        with registry.GetRegistry().Use("current") as bundle:
+            result = {
+                "model_version": bundle.version,
+                "explanations": explain.GetExplainer().Explain(bundle, inputs, admission.Deadline()),
+            }
+            return Versioned(jsonify(result), bundle), 200
+
+    except admission.DeadlineExceeded:
+        # answered by admission.Admit with 503 and Retry-After
+        raise
+    except Exception as e:
+        # Catch any exception and return an appropriate error response
+        metrics.RecordError("explain_batch", e)
         return jsonify({"error": str(e)}), 404
     
+
+@model_bp.route("/sweep", methods=["GET"])
+@metrics.Instrument("sweep")
+@admission.Admit("sweep")
+def get_price_sweep():
+    try:
+        base = ExplainInputs(request.args)
+        axes = [axis for axis in (SweepAxis("x"), SweepAxis("y")) if axis is not None]
+        with registry.GetRegistry().Use("current") as bundle:
+            etag = http_cache.PredictionETag("sweep", {"base": base, "axes": [axis.ToDict() for axis in axes]}, model.CacheVersion(bundle))
+            if http_cache.NotModified(etag):
+                return Versioned(http_cache.NotModifiedResponse(etag), bundle)
+            result = sweep.Sweep(bundle, base, axes, admission.Deadline())
+            return Versioned(http_cache.Cacheable(jsonify(result), etag), bundle), 200
+
+    except sweep.SweepError as e:
+        return jsonify({"error": str(e)}), 400
+    except admission.DeadlineExceeded:
+        # answered by admission.Admit with 503 and Retry-After
+        raise
+    except Exception as e:
+        # Catch any exception and return an appropriate error response
+        metrics.RecordError("sweep", e)
+        return jsonify({"error": str(e)}), 404
     
+
+@model_bp.route("/heatmap", methods=["GET"])
+@metrics.Instrument("heatmap")
+@admission.Admit("heatmap", admission.BATCH)
+def get_price_heatmap():
+    try:
+        inputs = model.NormalizeInputs(
+            "",
+            request.args.get('floor_area', default=95),
+            request.args.get('storey_range', default=2),
+            int(request.args.get('lease_start', default=2000)),
+            request.args.get('flat_type', default="4 ROOM"),
+        )
+        spec = {key: value for key, value in inputs.items() if key != "street_name"}
+        apply_multipliers = request.args.get('multipliers', default="0") not in ("0", "false", "")
+        with registry.GetRegistry().Use("current") as bundle:
+            heatmaps = heatmap.GetHeatmapCache()
+            etag = http_cache.PredictionETag("heatmap", {"key": heatmaps.Key(bundle, spec, apply_multipliers)}, bundle.version)
+            if http_cache.NotModified(etag):
+                return Versioned(http_cache.NotModifiedResponse(etag), bundle)
+            result = heatmaps.Get(bundle, spec, apply_multipliers)
+            return Versioned(http_cache.Cacheable(jsonify(result), etag), bundle), 200
+
+    except admission.DeadlineExceeded:
+        # answered by admission.Admit with 503 and Retry-After
+        raise
+    except Exception as e:
+        # Catch any exception and return an appropriate error response
+        metrics.RecordError("heatmap", e)
+        return jsonify({"error": str(e)}), 404
+    
+
 @model_bp.route("/future/predict/test", methods=["GET"])
+@metrics.Instrument("future_predict_test")
+@admission.Admit("future_predict_test")
 def get_test_future_price_prediction():
     try:
         result = future_model.TestPredictFuturePrice()
@@ -69,5 +276,54 @@ def get_test_future_price_prediction():
         
     except Exception as e:
         # Catch any exception and return an appropriate error response
+        metrics.RecordError("future_predict_test", e)
+        return jsonify({"error": str(e)}), 404
+    
+
+@model_bp.route("/versions", methods=["GET"])
+@metrics.Instrument("model_versions")
+def get_model_versions():
+    try:
+        return jsonify(registry.GetRegistry().Status()), 200
+
+    except Exception as e:
+        # Catch any exception and return an appropriate error response
+        metrics.RecordError("model_versions", e)
+        return jsonify({"error": str(e)}), 404
+
+
+@model_bp.route("/experiments", methods=["GET"])
+@metrics.Instrument("model_experiments")
+def get_model_experiments():
+    try:
+        # challengers of the current model with their served and shadow latency and prediction deltas
+        return jsonify(experiments.GetExperiments("current").Summary()), 200
+
+    except Exception as e:
+        # Catch any exception and return an appropriate error response
+        metrics.RecordError("model_experiments", e)
+        return jsonify({"error": str(e)}), 404
+
+
+@model_bp.route("/activate", methods=["POST"])
+@metrics.Instrument("model_activate")
+def activate_model_version():
+    # switch the live version (or roll back) without a restart; disabled unless MODEL_ADMIN_TOKEN is set
+    # compared in constant time, so response timing does not leak the token
+    if not ADMIN_TOKEN or not hmac.compare_digest(request.headers.get("X-Admin-Token", "").encode(), ADMIN_TOKEN.encode()):
+        return jsonify({"error": "Forbidden"}), 403
+    try:
+        body = request.get_json(silent=True) or {}
+        name = body.get("model", request.args.get("model", "current"))
+        version = body.get("version", request.args.get("version"))
+        if version:
+            swapped = registry.GetRegistry().Activate(name, version)
+        else:
+            # no version: pick up whatever LIVE or the legacy artifacts point at now
+            swapped = registry.GetRegistry().Refresh(name)
+        return jsonify({"model": name, "live": registry.GetRegistry().Live(name).version, "swapped": swapped}), 200
+
+    except Exception as e:
+        # Catch any exception and return an appropriate error response
+        metrics.RecordError("model_activate", e)
         return jsonify({"error": str(e)}), 404
-    
\ No newline at end of file
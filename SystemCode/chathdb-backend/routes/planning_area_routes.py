@@ -0,0 +1,52 @@
+from flask import Blueprint, jsonify, request
+from service import admission, metrics
+from service.planning_area import PlanningAreaIndex, PlanningAreaToTown
+
+# Map coordinates to URA planning areas and HDB towns
+planning_area_bp = Blueprint('planning_area', __name__, url_prefix='/api/planning-area')
+
+# Boundaries are parsed once at startup
+planning_area_index = PlanningAreaIndex.FromParquet()
+
+MAX_BULK_POINTS = 100_000
+
+@planning_area_bp.route("/", methods=["GET"], strict_slashes=False)
+@metrics.Instrument("planning_area")
+def get_planning_area():
+    try:
+        lat = float(request.args.get('lat'))
+        lng = float(request.args.get('lng'))
+        planning_area = planning_area_index.Lookup(lat, lng)
+        result = {
+            "planning_area": planning_area,
+            "town": PlanningAreaToTown(planning_area) if planning_area else None,
+        }
+        return jsonify(result), 200
+
+    except Exception as e:
+        # Catch any exception and return an appropriate error response
+        metrics.RecordError("planning_area", e)
+        return jsonify({"error": str(e)}), 404
+
+@planning_area_bp.route("/bulk", methods=["POST"])
+@metrics.Instrument("planning_area_bulk")
+@admission.Admit("planning_area_bulk", admission.BATCH)
+def get_bulk_planning_area():
+    try:
+        # body: {"points": [[lat, lng], ...]}
+        points = request.get_json(force=True).get("points", [])
+        if len(points) > MAX_BULK_POINTS:
+            return jsonify({"error": f"At most {MAX_BULK_POINTS} points per request"}), 400
+        lats = [point[0] for point in points]
+        lngs = [point[1] for point in points]
+        area_ids = planning_area_index.BulkLookup(lats, lngs)
+        result = {
+            "planning_areas": [planning_area_index.names[i] if i >= 0 else None for i in area_ids],
+            "towns": [planning_area_index.towns[i] if i >= 0 else None for i in area_ids],
+        }
+        return jsonify(result), 200
+
+    except Exception as e:
+        # Catch any exception and return an appropriate error response
+        metrics.RecordError("planning_area_bulk", e)
+        return jsonify({"error": str(e)}), 404
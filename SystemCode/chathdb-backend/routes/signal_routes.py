@@ -0,0 +1,98 @@
+from flask import Blueprint, jsonify, request
+from service import market_signals, news_index, affordability, metrics, http_cache, schema
+
+# Town news sentiment and Google Trends series from the local datahub outputs
+signal_bp = Blueprint('signals', __name__, url_prefix='/api/signals')
+
+def SignalsResponse(endpoint: str, signals, params: dict, build):
+    # answered from memory; the ETag changes when the pipeline republishes the files
+    etag = http_cache.PredictionETag(endpoint, params, signals.version)
+    if http_cache.NotModified(etag):
+        return http_cache.NotModifiedResponse(etag)
+    return http_cache.Cacheable(jsonify(build()), etag), 200
+
+@signal_bp.route("/news", methods=["GET"])
+@metrics.Instrument("signals_news")
+def get_town_news():
+    try:
+        signals = market_signals.GetMarketSignals()
+        town = signals.Town(request.args.get('area', default=request.args.get('town', default="")))
+        if town is None:
+            return jsonify({"error": "Unknown town or planning area"}), 404
+        limit = min(int(request.args.get('limit', default=5)), 100)
+        month_from = request.args.get('from', default=None)
+        month_to = request.args.get('to', default=None)
+        params = {"town": town, "limit": limit, "from": month_from, "to": month_to}
+        return SignalsResponse("signals_news", signals, params, lambda: signals.News(town, limit, month_from, month_to))
+
+    except Exception as e:
+        # Catch any exception and return an appropriate error response
+        metrics.RecordError("signals_news", e)
+        return jsonify({"error": str(e)}), 404
+
+@signal_bp.route("/trends", methods=["GET"])
+@metrics.Instrument("signals_trends")
+def get_town_trends():
+    try:
+        signals = market_signals.GetMarketSignals()
+        town = signals.Town(request.args.get('area', default=request.args.get('town', default="")))
+        if town is None:
+            return jsonify({"error": "Unknown town or planning area"}), 404
+        month_from = request.args.get('from', default=None)
+        month_to = request.args.get('to', default=None)
+        params = {"town": town, "from": month_from, "to": month_to}
+        return SignalsResponse("signals_trends", signals, params, lambda: signals.Trends(town, month_from, month_to))
+
+    except Exception as e:
+        # Catch any exception and return an appropriate error response
+        metrics.RecordError("signals_trends", e)
+        return jsonify({"error": str(e)}), 404
+
+@signal_bp.route("/affordability", methods=["GET"])
+@metrics.Instrument("signals_affordability")
+def get_affordability():
+    try:
+        cube = affordability.GetAffordability()
+        # every town when no area is given
+        area = request.args.get('area', default=request.args.get('town', default=""))
+        town = cube.Town(area) if area.strip() else None
+        if area.strip() and town is None:
+            return jsonify({"error": "Unknown town or planning area"}), 404
+        flat_type = request.args.get('flat_type', default="").strip().upper() or None
+        if flat_type is not None and flat_type not in schema.FLAT_TYPES:
+            return jsonify({"error": f"Unknown flat type {flat_type}"}), 404
+        month_from = request.args.get('from', default=None)
+        month_to = request.args.get('to', default=None)
+        params = {"town": town, "flat_type": flat_type, "from": month_from, "to": month_to}
+        return SignalsResponse("signals_affordability", cube, params, lambda: cube.Query(town, flat_type, month_from, month_to))
+
+    except Exception as e:
+        # Catch any exception and return an appropriate error response
+        metrics.RecordError("signals_affordability", e)
+        return jsonify({"error": str(e)}), 404
+
+@signal_bp.route("/search", methods=["GET"])
+@metrics.Instrument("signals_search")
+def search_news():
+    try:
+        query = request.args.get('q', default="")
+        k = min(int(request.args.get('k', default=10)), 100)
+        # comma-separated towns or planning areas; unknown names are ignored
+        signals = market_signals.GetMarketSignals()
+        areas = [area for area in request.args.get('area', default=request.args.get('town', default="")).split(",") if area.strip()]
+        towns = [town for town in (signals.Town(area) for area in areas) if town is not None]
+        if areas and not towns:
+            return jsonify({"error": "Unknown town or planning area"}), 404
+        month_from = request.args.get('from', default=None)
+        month_to = request.args.get('to', default=None)
+        result = news_index.GetNewsIndex().Search(
+            query, k, towns=towns,
+            month_from=schema.MonthKey(month_from) if month_from else None,
+            month_to=schema.MonthKey(month_to) if month_to else None,
+        )
+        return jsonify({"query": query, "towns": towns, **result}), 200
+
+    except Exception as e:
+        # Catch any exception and return an appropriate error response
+        metrics.RecordError("signals_search", e)
+        return jsonify({"error": str(e)}), 404
@@ -0,0 +1,49 @@
+from flask import Blueprint, jsonify, request
+from service import dimensions, metrics, registry
+
+# Street name autocomplete and resolution
+street_bp = Blueprint('streets', __name__, url_prefix='/api/streets')
+
+def StreetResolver():
+    # the live future model knows every street the current model does, plus newer ones
+    return registry.GetRegistry().Live("future").street_resolver
+
+@street_bp.route("/", methods=["GET"], strict_slashes=False)
+@metrics.Instrument("streets")
+def get_streets():
+    try:
+        prefix = request.args.get('prefix', default="")
+        limit = min(int(request.args.get('limit', default=10)), 100)
+        street_resolver = StreetResolver()
+        streets = street_resolver.Complete(prefix, limit=limit)
+        # fall back to fuzzy matches when nothing starts with the prefix
+        if not streets and prefix.strip():
+            streets = [name for name, _ in street_resolver.Fuzzy(prefix, limit=limit)]
+        return jsonify({"streets": streets}), 200
+
+    except Exception as e:
+        # Catch any exception and return an appropriate error response
+        metrics.RecordError("streets", e)
+        return jsonify({"error": str(e)}), 404
+
+@street_bp.route("/resolve", methods=["GET"])
+@metrics.Instrument("streets_resolve")
+def resolve_street():
+    try:
+        street_name = request.args.get('street_name', default="")
+        street_resolver = StreetResolver()
+        resolved, method, score = street_resolver.Resolve(street_name)
+        result = {
+            "street_name": resolved,
+            "method": method,
+            "score": score,
+            "town": dimensions.GetDimensions().StreetTown(resolved),
+        }
+        if resolved is None:
+            result["suggestions"] = [name for name, _ in street_resolver.Fuzzy(street_name)]
+        return jsonify(result), 200
+
+    except Exception as e:
+        # Catch any exception and return an appropriate error response
+        metrics.RecordError("streets_resolve", e)
+        return jsonify({"error": str(e)}), 404
@@ -0,0 +1,30 @@
+from flask import Blueprint, current_app, jsonify, request
+from service import model, metrics, registry, admission, valuation
+
+# Current price, forecast, town adjustment, rent estimate and comparables of one flat in one call
+valuation_bp = Blueprint('valuation', __name__, url_prefix='/api/valuation')
+
+@valuation_bp.route("/", methods=["GET"], strict_slashes=False)
+@metrics.Instrument("valuation")
+@admission.Admit("valuation")
+def get_valuation():
+    try:
+        street_name = request.args.get('street_name', default="CLEMENTI AVE 1")
+        floor_area = request.args.get('floor_area', default=70)
+        storey_range = request.args.get('storey_range', default=1)
+        lease_start = int(request.args.get('lease_start', default=2000))
+        flat_type = request.args.get('flat_type', default="2 ROOM")
+        inputs = model.NormalizeInputs(street_name, floor_area, storey_range, lease_start, flat_type)
+        with registry.GetRegistry().Use("current") as bundle, registry.GetRegistry().Use("future") as future_bundle:
+            result = valuation.Valuate(current_app._get_current_object(), inputs, bundle, future_bundle)
+        response = jsonify(result)
+        response.headers["X-Model-Version"] = bundle.version
+        return response, 200
+
+    except admission.DeadlineExceeded:
+        # answered by admission.Admit with 503 and Retry-After
+        raise
+    except Exception as e:
+        # Catch any exception and return an appropriate error response
+        metrics.RecordError("valuation", e)
+        return jsonify({"error": str(e)}), 404
@@ -0,0 +1,235 @@
+import contextlib
+import functools
+import math
+import os
+import threading
+import time
+from flask import jsonify, request
+from . import metrics
+
+# Admission control for the API. Every admitted request holds one of ADMISSION_MAX_CONCURRENT
+# slots; when none is free it waits in a bounded queue for its priority class. Interactive requests
+# (the prediction endpoints) are always woken first and may use every slot, batch/analytics requests
+# at most ADMISSION_BATCH_MAX_CONCURRENT. The heavier interactive endpoints are also capped on their
+# own (ENDPOINT_LIMITS), so a burst of explain or sweep calls cannot hold the slots /predict needs. A full queue is rejected at once with 429, a request that
+# waited longer than its queue timeout with 503, both with Retry-After. Admitted requests carry a
+# deadline the service layer checks between stages (CheckDeadline), so work nobody waits for stops.
+INTERACTIVE = "interactive"
+BATCH = "batch"
+ENABLED = os.environ.get("ADMISSION_ENABLED", "1") != "0"
+MAX_CONCURRENT = int(os.environ.get("ADMISSION_MAX_CONCURRENT", 8))
+LIMITS = {
+    # priority -> (max concurrent, max queued, queue timeout ms, deadline ms)
+    INTERACTIVE: (
+        MAX_CONCURRENT,
+        int(os.environ.get("ADMISSION_MAX_QUEUE", 32)),
+        float(os.environ.get("ADMISSION_QUEUE_TIMEOUT_MS", 500)),
+        float(os.environ.get("REQUEST_DEADLINE_MS", 2000)),
+    ),
+    BATCH: (
+        int(os.environ.get("ADMISSION_BATCH_MAX_CONCURRENT", 2)),
+        int(os.environ.get("ADMISSION_BATCH_MAX_QUEUE", 4)),
+        float(os.environ.get("ADMISSION_BATCH_QUEUE_TIMEOUT_MS", 2000)),
+        float(os.environ.get("BATCH_REQUEST_DEADLINE_MS", 30000)),
+    ),
+}
+# endpoint -> max concurrent, on top of its priority's limit
+ENDPOINT_LIMITS = {
+    "explain": int(os.environ.get("ADMISSION_EXPLAIN_MAX_CONCURRENT", 2)),
+    "sweep": int(os.environ.get("ADMISSION_SWEEP_MAX_CONCURRENT", 2)),
+    "valuation": int(os.environ.get("ADMISSION_VALUATION_MAX_CONCURRENT", 4)),
+}
+# clients may ask for a shorter deadline, never a longer one
+DEADLINE_HEADER = "X-Request-Deadline-Ms"
+
+class Overloaded(Exception):
+    # Raised to reject a request; the route answers with status and Retry-After.
+
+    def __init__(self, reason: str, status: int, retry_after: int):
+        super().__init__(reason)
+        self.reason, self.status, self.retry_after = reason, status, retry_after
+
+class DeadlineExceeded(Overloaded):
+    def __init__(self, stage: str, retry_after: int = 1):
+        super().__init__(f"deadline exceeded before {stage}", 503, retry_after)
+        self.reason = "deadline"
+
+_local = threading.local()
+
+def Deadline():
+    # perf_counter time the current request must finish by, None outside admitted requests
+    return getattr(_local, "deadline", None)
+
+def Remaining():
+    deadline = Deadline()
+    return None if deadline is None else deadline - time.perf_counter()
+
+def CheckDeadline(stage: str, deadline: float = None):
+    # called between service stages; raises once the deadline (by default the current request's) has passed
+    deadline = Deadline() if deadline is None else deadline
+    if deadline is not None and time.perf_counter() > deadline:
+        raise DeadlineExceeded(stage)
+
+@contextlib.contextmanager
+def WithDeadline(deadline: float):
+    # the deadline is thread-local: work a request hands to a pool thread runs under this, with the
+    # request's Deadline(), so CheckDeadline in the service layer still applies there
+    previous = Deadline()
+    _local.deadline = deadline
+    try:
+        yield
+    finally:
+        _local.deadline = previous
+
+class AdmissionController:
+    # Shared slots with per-priority queues, interactive first.
+
+    def __init__(self, max_concurrent: int = MAX_CONCURRENT, limits: dict = LIMITS, endpoint_limits: dict = ENDPOINT_LIMITS):
+        self.max_concurrent, self.limits, self.endpoint_limits = max_concurrent, limits, endpoint_limits
+        self.condition = threading.Condition()
+        self.running = {priority: 0 for priority in limits}
+        self.waiting = {priority: 0 for priority in limits}
+        # running and interactive waiting requests of the capped endpoints
+        self.endpoint_running = {endpoint: 0 for endpoint in endpoint_limits}
+        self.endpoint_waiting = {endpoint: 0 for endpoint in endpoint_limits}
+        # moving average of the time a slot is held, for Retry-After
+        self.service_seconds = {priority: 0.05 for priority in limits}
+        self.counts = {}
+
+    def _AtEndpointLimit(self, endpoint: str) -> bool:
+        return endpoint in self.endpoint_limits and self.endpoint_running[endpoint] >= self.endpoint_limits[endpoint]
+
+    def _InteractiveWaiting(self) -> int:
+        # interactive waiters that would take a free slot; ones held back by their endpoint cap do not
+        # keep batch requests out
+        capped = sum(count for endpoint, count in self.endpoint_waiting.items() if self._AtEndpointLimit(endpoint))
+        return self.waiting[INTERACTIVE] - capped
+
+    def _CanRun(self, endpoint: str, priority: str) -> bool:
+        if sum(self.running.values()) >= self.max_concurrent or self._AtEndpointLimit(endpoint):
+            return False
+        if priority == INTERACTIVE:
+            return True
+        return self.running[priority] < self.limits[priority][0] and self._InteractiveWaiting() == 0
+
+    def _Start(self, endpoint: str, priority: str):
+        self.running[priority] += 1
+        if endpoint in self.endpoint_running:
+            self.endpoint_running[endpoint] += 1
+
+    def RetryAfter(self, priority: str, endpoint: str = None) -> int:
+        # seconds until the queue ahead of a new request has likely drained
+        concurrent = max(1, min(self.max_concurrent, self.limits[priority][0], self.endpoint_limits.get(endpoint, self.max_concurrent)))
+        return max(1, math.ceil((self.waiting[priority] + 1) * self.service_seconds[priority] / concurrent))
+
+    def _Gauge(self, priority: str):
+        metrics.RecordAdmissionLoad(priority, self.running[priority], self.waiting[priority])
+
+    def _Count(self, endpoint: str, result: str):
+        self.counts[(endpoint, result)] = self.counts.get((endpoint, result), 0) + 1
+        metrics.RecordAdmission(endpoint, result)
+
+    def Acquire(self, endpoint: str, priority: str):
+        _, max_queue, queue_timeout_ms, _ = self.limits[priority]
+        with self.condition:
+            if self._CanRun(endpoint, priority):
+                self._Start(endpoint, priority)
+                self._Count(endpoint, "admitted")
+                self._Gauge(priority)
+                return
+            if self.waiting[priority] >= max_queue:
+                self._Count(endpoint, "shed")
+                raise Overloaded("queue full", 429, self.RetryAfter(priority, endpoint))
+            self.waiting[priority] += 1
+            if priority == INTERACTIVE and endpoint in self.endpoint_waiting:
+                self.endpoint_waiting[endpoint] += 1
+            self._Gauge(priority)
+            give_up = time.perf_counter() + queue_timeout_ms / 1000
+            try:
+                while not self._CanRun(endpoint, priority):
+                    remaining = give_up - time.perf_counter()
+                    if remaining <= 0:
+                        self._Count(endpoint, "queue_timeout")
+                        raise Overloaded("queue timeout", 503, self.RetryAfter(priority, endpoint))
+                    self.condition.wait(remaining)
+            finally:
+                self.waiting[priority] -= 1
+                if priority == INTERACTIVE and endpoint in self.endpoint_waiting:
+                    self.endpoint_waiting[endpoint] -= 1
+            self._Start(endpoint, priority)
+            self._Count(endpoint, "admitted_after_wait")
+            self._Gauge(priority)
+
+    def Release(self, endpoint: str, priority: str, seconds: float):
+        with self.condition:
+            self.running[priority] -= 1
+            if endpoint in self.endpoint_running:
+                self.endpoint_running[endpoint] -= 1
+            self.service_seconds[priority] = 0.8 * self.service_seconds[priority] + 0.2 * seconds
+            # batch waiters re-check too, interactive ones win the race through _CanRun
+            self.condition.notify_all()
+            self._Gauge(priority)
+
+    def Stats(self) -> dict:
+        with self.condition:
+            counts = {}
+            for (endpoint, result), count in sorted(self.counts.items()):
+                counts.setdefault(endpoint, {})[result] = count
+            return {
+                "max_concurrent": self.max_concurrent,
+                "running": dict(self.running),
+                "waiting": dict(self.waiting),
+                "endpoint_limits": dict(self.endpoint_limits),
+                "endpoint_running": dict(self.endpoint_running),
+                "endpoint_waiting": dict(self.endpoint_waiting),
+                "mean_service_ms": {priority: round(seconds * 1000, 3) for priority, seconds in self.service_seconds.items()},
+                "endpoints": counts,
+            }
+
+_controller = AdmissionController()
+
+def GetController() -> AdmissionController:
+    return _controller
+
+def RecordTimeout(endpoint: str):
+    with _controller.condition:
+        _controller._Count(endpoint, "deadline")
+
+def Rejection(error: Overloaded):
+    response = jsonify({"error": str(error), "reason": error.reason})
+    response.headers["Retry-After"] = str(error.retry_after)
+    return response, error.status
+
+def Admit(endpoint: str, priority: str = INTERACTIVE):
+    # route decorator, below metrics.Instrument so rejections are counted with their status:
+    # @metrics.Instrument("predict") @admission.Admit("predict")
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            if not ENABLED:
+                return view(*args, **kwargs)
+            # the deadline runs from arrival, so time spent queued counts against it
+            arrival = time.perf_counter()
+            deadline_ms = LIMITS[priority][3]
+            requested = request.headers.get(DEADLINE_HEADER)
+            if requested:
+                try:
+                    deadline_ms = min(deadline_ms, max(1.0, float(requested)))
+                except ValueError:
+                    pass
+            try:
+                _controller.Acquire(endpoint, priority)
+            except Overloaded as e:
+                return Rejection(e)
+            start = time.perf_counter()
+            _local.deadline = arrival + deadline_ms / 1000
+            try:
+                return view(*args, **kwargs)
+            except DeadlineExceeded as e:
+                RecordTimeout(endpoint)
+                return Rejection(e)
+            finally:
+                _local.deadline = None
+                _controller.Release(endpoint, priority, time.perf_counter() - start)
+        return wrapper
+    return decorator
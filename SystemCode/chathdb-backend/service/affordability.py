@@ -0,0 +1,71 @@
+import bisect
+import os
+import threading
+import polars as pl
+from . import dimensions, http_cache, schema
+
+# Price-to-income and rent-to-income per month, town and flat type, precomputed by
+# lib/batch/affordability.py. The cube is read once into per (town, flat type) series sorted by
+# month; a request only slices them, and the file is checked on every lookup and the series rebuilt
+# when the batch writes a new one.
+AFFORDABILITY_FILE = "static/data/affordability/affordability_cube.parquet"
+FIELDS = [
+    "month", "transactions", "median_price", "model_price", "rentals", "median_rent",
+    "income_year", "monthly_income", "price_to_income", "model_price_to_income", "rent_to_income",
+]
+# ratios keep more digits than prices
+DECIMALS = {"price_to_income": 3, "model_price_to_income": 3, "rent_to_income": 4}
+
+class AffordabilityCube:
+    # Series of every town and flat type in one version of the cube.
+
+    def __init__(self, frame: pl.DataFrame, version: str = None):
+        self.version = version
+        frame = frame.with_columns(
+            pl.col("town").cast(pl.Utf8), pl.col("flat_type").cast(pl.Utf8),
+            *[pl.col(column).cast(pl.Float64).round(DECIMALS.get(column, 2)) for column, dtype in schema.AFFORDABILITY.items() if dtype == pl.Float32],
+        ).sort(["town", "flat_type", "month_key"])
+        # (town, flat type) -> (month keys, rows)
+        self.series = {}
+        for (town, flat_type), group in frame.group_by(["town", "flat_type"], maintain_order=True):
+            self.series[(town, flat_type)] = (group["month_key"].to_list(), group.select(FIELDS).to_dicts())
+        self.towns = sorted({town for town, _ in self.series})
+
+    @classmethod
+    def Load(cls, filepath: str = AFFORDABILITY_FILE, version: str = None):
+        if not os.path.exists(filepath):
+            return cls(pl.DataFrame(schema=schema.AFFORDABILITY), version)
+        return cls(pl.read_parquet(filepath), version)
+
+    def Town(self, area: str):
+        # HDB town for a town or planning area name, None when neither is known
+        area = (area or "").strip().upper()
+        if area in self.towns:
+            return area
+        return dimensions.GetDimensions().PlanningAreaToTown(area)
+
+    def Query(self, town: str = None, flat_type: str = None, month_from: str = None, month_to: str = None) -> dict:
+        low = schema.MonthKey(month_from) if month_from else None
+        high = schema.MonthKey(month_to) if month_to else None
+        series = []
+        for (series_town, series_flat_type), (month_keys, rows) in self.series.items():
+            if (town and series_town != town) or (flat_type and series_flat_type != flat_type):
+                continue
+            start = bisect.bisect_left(month_keys, low) if low is not None else 0
+            end = bisect.bisect_right(month_keys, high) if high is not None else len(month_keys)
+            if start < end:
+                series.append({"town": series_town, "flat_type": series_flat_type, "months": rows[start:end]})
+        return {"town": town, "flat_type": flat_type, "series": series}
+
+_cube = None
+_cube_lock = threading.Lock()
+
+def GetAffordability() -> AffordabilityCube:
+    # loaded on first use and reloaded when lib/batch/affordability.py rewrites the cube
+    global _cube
+    version = http_cache.ArtifactVersion([AFFORDABILITY_FILE])
+    if _cube is None or _cube.version != version:
+        with _cube_lock:
+            if _cube is None or _cube.version != version:
+                _cube = AffordabilityCube.Load(version=version)
+    return _cube
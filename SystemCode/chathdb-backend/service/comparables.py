@@ -0,0 +1,102 @@
+import os
+import statistics
+import threading
+import polars as pl
+from . import http_cache, schema
+
+# Recent resale transactions and rents around a flat, for /api/valuation. The newest
+# COMPARABLE_MONTHS of the consolidated resale data and RENT_MONTHS of the rental data are read once
+# into per (street, flat type) and (town, flat type) lists; the files are checked on every lookup
+# and the lists rebuilt when the pipeline writes new ones. Windows count back from the newest month
+# in each file, as the published data lags behind today.
+RESALE_FILE = "static/data/resale_price/parsed/consolidated_resale.parquet"
+RENTAL_FILE = "static/data/rental_amount/RentingOutofFlats2025.parquet"
+COMPARABLE_MONTHS = int(os.environ.get("COMPARABLE_MONTHS", 12))
+RENT_MONTHS = int(os.environ.get("RENT_MONTHS", 6))
+RESALE_COLUMNS = ["month", "town", "flat_type", "block", "street_name", "storey_range", "floor_area_sqm", "resale_price"]
+
+def _Recent(frame: pl.LazyFrame, months: int) -> pl.DataFrame:
+    # rows of the newest `months` months, town and flat type as plain text
+    newest = frame.select(pl.col("month_key").max()).collect().item()
+    if newest is None:
+        return frame.head(0).collect()
+    return frame.filter(pl.col("month_key") > newest - months).with_columns(
+        pl.col("town").cast(pl.Utf8).replace(schema.TOWN_ALIASES), pl.col("flat_type").cast(pl.Utf8), pl.col("street_name").cast(pl.Utf8),
+    ).sort("month_key", descending=True).collect()
+
+def _Group(rows: list, key) -> dict:
+    groups = {}
+    for row in rows:
+        groups.setdefault(key(row), []).append(row)
+    return groups
+
+class RecentTransactions:
+    # Recent resale transactions and rents of one version of the files, newest first.
+
+    def __init__(self, resale: pl.DataFrame, rental: pl.DataFrame, version: str = None):
+        self.version = version
+        resale = resale.with_columns(
+            pl.col("storey_range").cast(pl.Utf8),
+            pl.col("block").cast(pl.Utf8),
+            pl.col("floor_area_sqm").cast(pl.Float64),
+            pl.col("resale_price").cast(pl.Float64),
+            (pl.col("resale_price").cast(pl.Float64) / pl.col("floor_area_sqm").cast(pl.Float64)).round(2).alias("price_per_sqm"),
+        ).select(["month_key"] + RESALE_COLUMNS + ["price_per_sqm"])
+        transactions = resale.to_dicts()
+        self.resale_by_street = _Group(transactions, lambda row: (row["street_name"], row["flat_type"]))
+        self.resale_by_town = _Group(transactions, lambda row: (row["town"], row["flat_type"]))
+        rents = rental.select("rent_approval_date", "town", "street_name", "flat_type", pl.col("median_monthly_rent").cast(pl.Float64)).to_dicts()
+        self.rent_by_street = _Group(rents, lambda row: (row["street_name"], row["flat_type"]))
+        self.rent_by_town = _Group(rents, lambda row: (row["town"], row["flat_type"]))
+
+    @classmethod
+    def Load(cls, resale_file: str = RESALE_FILE, rental_file: str = RENTAL_FILE, version: str = None):
+        if os.path.exists(resale_file):
+            columns = schema.ReadColumns(RESALE_COLUMNS, pl.read_parquet_schema(resale_file))
+            resale = _Recent(schema.WithMonthKey(pl.scan_parquet(resale_file).select(columns)), COMPARABLE_MONTHS)
+        else:
+            resale = pl.DataFrame(schema={"month_key": pl.Int32, **{column: schema.RESALE[column] for column in RESALE_COLUMNS}})
+        if os.path.exists(rental_file):
+            # files written before the schema carry only rent_approval_date
+            rental = _Recent(schema.WithMonthKey(pl.scan_parquet(rental_file), "rent_approval_date"), RENT_MONTHS)
+        else:
+            rental = pl.DataFrame(schema={column: dtype for column, dtype in schema.RENTAL.items()})
+        return cls(resale, rental, version)
+
+    def Comparables(self, street_name: str, town: str, flat_type: str, floor_area: float, limit: int = 5) -> list:
+        # same street and flat type first, then the rest of the town; newest first, closest floor area
+        # first within a month
+        def Rank(rows: list) -> list:
+            return sorted(rows, key=lambda row: (-row["month_key"], abs(row["floor_area_sqm"] - floor_area)))
+        street = Rank(self.resale_by_street.get((street_name, flat_type), []))[:limit]
+        matches = [{**row, "match": "street"} for row in street]
+        if len(matches) < limit and town:
+            others = [row for row in self.resale_by_town.get((town, flat_type), []) if row["street_name"] != street_name]
+            matches += [{**row, "match": "town"} for row in Rank(others)[:limit - len(matches)]]
+        return [{key: value for key, value in row.items() if key != "month_key"} for row in matches]
+
+    def Rent(self, street_name: str, town: str, flat_type: str):
+        # median recent rent on the street, or in the town when the street had none; None without either
+        for basis, rows in (("street", self.rent_by_street.get((street_name, flat_type))), ("town", self.rent_by_town.get((town, flat_type)))):
+            if rows:
+                months = [row["rent_approval_date"] for row in rows]
+                return {
+                    "monthly_rent": round(statistics.median(row["median_monthly_rent"] for row in rows), 2),
+                    "basis": basis,
+                    "rentals": len(rows),
+                    "from": min(months),
+                    "to": max(months),
+                }
+        return None
+
+_transactions = None
+_transactions_lock = threading.Lock()
+
+def GetRecentTransactions() -> RecentTransactions:
+    global _transactions
+    version = http_cache.ArtifactVersion([RESALE_FILE, RENTAL_FILE])
+    if _transactions is None or _transactions.version != version:
+        with _transactions_lock:
+            if _transactions is None or _transactions.version != version:
+                _transactions = RecentTransactions.Load(RESALE_FILE, RENTAL_FILE, version)
+    return _transactions
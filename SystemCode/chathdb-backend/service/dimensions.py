@@ -0,0 +1,165 @@
+import json
+import os
+import threading
+import polars as pl
+from . import http_cache, schema
+
+# Small dimension tables written once by lib/datahub/build_dimensions.py, so pipeline stages and the
+# backend look towns, planning areas, streets and model columns up instead of rescanning raw data:
+#   towns.parquet               town_id, town
+#   planning_area_town.parquet  planning_area, town (null for areas without an HDB town)
+#   street_town.parquet         street_name, town, transactions, first/last month_key
+#   model_columns.parquet       model, kind, name, position (index in the model's cols_*.json)
+# paths are relative to the static folder, so datahub scripts can load the tables from anywhere
+STATIC_DIR = "static"
+DIMENSIONS_DIR = "data/dimensions"
+PLANNING_AREA_FILE = "data/planning_area/planning_area_2024.parquet"
+RESALE_FILE = "data/resale_price/parsed/consolidated_resale.parquet"
+MODEL_COLUMNS_DIR = "models/data"
+# cols_*.json prefix of each model
+MODEL_PREFIXES = {"current": "", "future": "future_"}
+COLUMN_KINDS = ["street_name", "flat_type"]
+
+# HDB towns that span several planning areas
+TOWN_MAPPING = {
+    "CENTRAL AREA": [
+        "SINGAPORE RIVER",
+        "ROCHOR",
+        "MUSEUM",
+        "DOWNTOWN CORE",
+        "RIVER VALLEY",
+        "ORCHARD",
+        "NEWTON",
+        "OUTRAM",
+        "MARINA SOUTH",
+    ],
+    "KALLANG/WHAMPOA": [
+        "KALLANG",
+        "WHAMPOA",
+    ],
+}
+
+def PlanningAreaToTown(planning_area: str):
+    # HDB town for a planning area, None when the area has no HDB town
+    for town, areas in TOWN_MAPPING.items():
+        if planning_area in areas:
+            return town
+    return planning_area if planning_area in schema.TOWNS else None
+
+def TownsFrame() -> pl.DataFrame:
+    # town_id is the town's code in schema.Town
+    return pl.DataFrame({"town_id": range(len(schema.TOWNS)), "town": schema.TOWNS}, schema={"town_id": pl.UInt8, "town": schema.Town})
+
+def PlanningAreaTownFrame(planning_area_file: str) -> pl.DataFrame:
+    # every URA planning area, plus the mapped names that are not planning areas themselves
+    names = set(pl.read_parquet(planning_area_file, columns=["pln_area_n"])["pln_area_n"].to_list())
+    names.update(area for areas in TOWN_MAPPING.values() for area in areas)
+    names = sorted(names)
+    return pl.DataFrame(
+        {"planning_area": names, "town": [PlanningAreaToTown(name) for name in names]},
+        schema={"planning_area": pl.Utf8, "town": schema.Town},
+    )
+
+def StreetTownFrame(resale: pl.LazyFrame) -> pl.DataFrame:
+    # one row per street and town it has transactions in, busiest town first
+    return (
+        schema.WithMonthKey(resale)
+        .group_by([pl.col("street_name").cast(pl.Utf8), pl.col("town").cast(schema.Town)])
+        .agg(
+            pl.len().cast(pl.UInt32).alias("transactions"),
+            pl.col("month_key").min().alias("first_month_key"),
+            pl.col("month_key").max().alias("last_month_key"),
+        )
+        .sort(["street_name", "transactions", "town"], descending=[False, True, False])
+        .collect()
+    )
+
+def ModelColumnsFrame(columns_dir: str) -> pl.DataFrame:
+    # street and flat type one-hot positions of both models, from their cols_*.json artifacts
+    rows = {"model": [], "kind": [], "name": [], "position": []}
+    for model, prefix in MODEL_PREFIXES.items():
+        for kind in COLUMN_KINDS:
+            filepath = os.path.join(columns_dir, f"{prefix}cols_{kind}.json")
+            if not os.path.exists(filepath):
+                continue
+            with open(filepath, "r") as openfile:
+                columns = json.load(openfile)
+            for column, position in columns.items():
+                rows["model"].append(model)
+                rows["kind"].append(kind)
+                rows["name"].append(column[len(kind) + 1:])
+                rows["position"].append(position)
+    return pl.DataFrame(rows, schema={"model": pl.Utf8, "kind": pl.Utf8, "name": pl.Utf8, "position": pl.Int32}).sort(["model", "kind", "position"])
+
+class Dimensions:
+    # In-memory dictionaries over the dimension tables.
+
+    def __init__(self, towns: pl.DataFrame, planning_area_town: pl.DataFrame, street_town: pl.DataFrame, model_columns: pl.DataFrame):
+        self.towns = towns["town"].cast(pl.Utf8).to_list()
+        self.planning_area_town = dict(zip(planning_area_town["planning_area"].to_list(), planning_area_town["town"].cast(pl.Utf8).to_list()))
+        # rows are sorted busiest town first, so the first town seen for a street is kept
+        self.street_town = {}
+        self.street_town_rows = len(street_town)
+        for street_name, town in zip(street_town["street_name"].to_list(), street_town["town"].cast(pl.Utf8).to_list()):
+            self.street_town.setdefault(street_name, town)
+        self.model_columns = {}
+        # stats of the files this copy was loaded from
+        self.sources = None
+        for model, kind, name, position in model_columns.iter_rows():
+            self.model_columns.setdefault((model, kind), {})[name] = position
+
+    @classmethod
+    def Load(cls, static_dir: str = STATIC_DIR):
+        def table(name: str, build):
+            filepath = os.path.join(static_dir, DIMENSIONS_DIR, name + ".parquet")
+            return pl.read_parquet(filepath) if os.path.exists(filepath) else build()
+        def street_town() -> pl.DataFrame:
+            # one scan of the resale history; empty, and refused by RequireStreetTowns, without it
+            resale_file = os.path.join(static_dir, RESALE_FILE)
+            if os.path.exists(resale_file):
+                return StreetTownFrame(schema.Scan(resale_file))
+            return pl.DataFrame(schema={"street_name": pl.Utf8, "town": schema.Town})
+        # every table is derived from its sources when the stage has not run
+        return cls(
+            table("towns", TownsFrame),
+            table("planning_area_town", lambda: PlanningAreaTownFrame(os.path.join(static_dir, PLANNING_AREA_FILE))),
+            table("street_town", street_town),
+            table("model_columns", lambda: ModelColumnsFrame(os.path.join(static_dir, MODEL_COLUMNS_DIR))),
+        )
+
+    def PlanningAreaToTown(self, planning_area: str):
+        if planning_area in self.planning_area_town:
+            return self.planning_area_town[planning_area]
+        return PlanningAreaToTown(planning_area)
+
+    def RequireStreetTowns(self):
+        # town aggregates built without street towns would be empty rather than wrong-looking
+        if not self.street_town_rows:
+            raise FileNotFoundError(
+                f"Street towns unavailable, {os.path.join(STATIC_DIR, DIMENSIONS_DIR, 'street_town.parquet')} and "
+                f"{os.path.join(STATIC_DIR, RESALE_FILE)} are missing: run python3 lib/datahub/build_dimensions.py"
+            )
+
+    def StreetTown(self, street_name: str):
+        # busiest town of a street, None for streets without transactions
+        return self.street_town.get(street_name)
+
+    def ModelColumns(self, model: str, kind: str) -> dict:
+        # name -> one-hot position
+        return self.model_columns.get((model, kind), {})
+
+_dimensions = None
+_dimensions_lock = threading.Lock()
+
+def GetDimensions() -> Dimensions:
+    # reloaded when the street town table or the resale data it is derived from changes, so a
+    # build_dimensions run after startup is picked up
+    global _dimensions
+    sources = http_cache.ArtifactVersion([os.path.join(STATIC_DIR, DIMENSIONS_DIR, "street_town.parquet"), os.path.join(STATIC_DIR, RESALE_FILE)])
+    if _dimensions is None or _dimensions.sources != sources:
+        with _dimensions_lock:
+            if _dimensions is None or _dimensions.sources != sources:
+                loaded = Dimensions.Load(STATIC_DIR)
+                loaded.sources = sources
+                _dimensions = loaded
+    return _dimensions
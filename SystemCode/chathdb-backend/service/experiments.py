@@ -0,0 +1,221 @@
+import contextlib
+import hashlib
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from . import admission, http_cache, metrics
+from .registry import BUNDLE_FILES, LEGACY_DIR, REGISTRY_DIR, ModelBundle
+
+# Challenger models scored next to the live one, configured in static/models/experiments.json:
+#   {"current": [{"name": "not_finetuned", "model": "xgboost_not_finetuned.pkl", "share": 0.05, "shadow": true}]}
+# "model" is a pickle in static/models that uses the live version's scaler and columns, "version" a
+# published registry version of the same model. "share" of requests (bucketed by client, or by the
+# inputs when there is none) are served by the challenger; with "shadow" the challenger also scores
+# requests the live model served, in a small background pool, and the difference is accumulated.
+# Shadow work is dropped, not queued, once SHADOW_MAX_PENDING tasks are waiting.
+EXPERIMENTS_FILE = os.environ.get("MODEL_EXPERIMENTS_FILE", os.path.join(LEGACY_DIR, "experiments.json"))
+SHADOW_WORKERS = int(os.environ.get("SHADOW_WORKERS", 2))
+SHADOW_MAX_PENDING = int(os.environ.get("SHADOW_MAX_PENDING", 32))
+
+def Bucket(key: str) -> float:
+    # stable position in [0, 1) for a request key
+    return int(hashlib.sha1(key.encode()).hexdigest()[:8], 16) / 0x100000000
+
+class Challenger:
+    # A candidate bundle and how much traffic it gets.
+
+    def __init__(self, name: str, share: float, shadow: bool, bundle: ModelBundle):
+        self.name, self.share, self.shadow, self.bundle = name, share, shadow, bundle
+
+class ExperimentStats:
+    # Running latency and prediction delta sums per variant, the live model being "live".
+
+    def __init__(self):
+        self.values = {}
+        self.lock = threading.Lock()
+
+    def Record(self, variant: str, role: str, seconds: float, delta: float = None, primary: float = None, error: bool = False):
+        with self.lock:
+            state = self.values.setdefault((variant, role), {
+                "requests": 0, "errors": 0, "seconds": 0.0, "max_seconds": 0.0,
+                "compared": 0, "abs_delta": 0.0, "squared_delta": 0.0, "relative_delta": 0.0, "max_abs_delta": 0.0,
+            })
+            state["requests"] += 1
+            if error:
+                state["errors"] += 1
+                return
+            state["seconds"] += seconds
+            state["max_seconds"] = max(state["max_seconds"], seconds)
+            if delta is not None:
+                state["compared"] += 1
+                state["abs_delta"] += abs(delta)
+                state["squared_delta"] += delta * delta
+                state["relative_delta"] += abs(delta) / abs(primary) if primary else 0.0
+                state["max_abs_delta"] = max(state["max_abs_delta"], abs(delta))
+
+    def Summary(self) -> dict:
+        with self.lock:
+            items = sorted((key, dict(state)) for key, state in self.values.items())
+        summary = {}
+        for (variant, role), state in items:
+            scored = state["requests"] - state["errors"]
+            compared = state["compared"]
+            summary.setdefault(variant, {})[role] = {
+                "requests": state["requests"],
+                "errors": state["errors"],
+                "mean_ms": round(state["seconds"] / scored * 1000, 3) if scored else None,
+                "max_ms": round(state["max_seconds"] * 1000, 3),
+                "compared": compared,
+                "mean_abs_delta": round(state["abs_delta"] / compared, 2) if compared else None,
+                "rmse_delta": round((state["squared_delta"] / compared) ** 0.5, 2) if compared else None,
+                "mean_relative_delta": round(state["relative_delta"] / compared, 5) if compared else None,
+                "max_abs_delta": round(state["max_abs_delta"], 2),
+            }
+        return summary
+
+class Experiments:
+    # Challengers of one model, rebuilt when the config file or the live version changes.
+
+    def __init__(self, name: str, config_file: str = EXPERIMENTS_FILE, workers: int = SHADOW_WORKERS, max_pending: int = SHADOW_MAX_PENDING):
+        self.name, self.config_file = name, config_file
+        self.challengers = []
+        self.loaded_for = None
+        self.lock = threading.Lock()
+        self.stats = ExperimentStats()
+        self.pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix=f"shadow-{name}")
+        self.pending = threading.BoundedSemaphore(max_pending)
+        self.dropped = 0
+
+    def _ConfigVersion(self):
+        try:
+            return os.stat(self.config_file).st_mtime_ns
+        except FileNotFoundError:
+            return None
+
+    def Challengers(self, live: ModelBundle) -> list:
+        key = (live.version, self._ConfigVersion())
+        if key == self.loaded_for:
+            return self.challengers
+        with self.lock:
+            if key != self.loaded_for:
+                challengers = []
+                try:
+                    if key[1] is not None:
+                        with open(self.config_file, "r") as openfile:
+                            specs = json.load(openfile).get(self.name, [])
+                        challengers = [self._Load(spec, live) for spec in specs]
+                except Exception as e:
+                    # a bad config or challenger artifact disables the experiment, never the live model
+                    metrics.RecordError(f"experiments_{self.name}", e)
+                for challenger in self.challengers:
+                    challenger.bundle.Retire()
+                self.challengers, self.loaded_for = challengers, key
+        return self.challengers
+
+    def _Load(self, spec: dict, live: ModelBundle) -> Challenger:
+        if "version" in spec:
+            version_dir = os.path.join(REGISTRY_DIR, self.name, spec["version"])
+            paths = {key: os.path.join(version_dir, filename) for key, filename in BUNDLE_FILES.items()}
+            version = spec["version"]
+        else:
+            # a bare model pickle scored with the live version's scaler and columns
+            paths = dict(live.paths, model=os.path.join(LEGACY_DIR, spec["model"]))
+            version = f"{live.version}+{spec['name']}-{http_cache.ArtifactVersion([paths['model']])[:8]}"
+        bundle = ModelBundle(self.name, version, paths)
+        return Challenger(spec["name"], float(spec.get("share", 0.0)), bool(spec.get("shadow", True)), bundle)
+
+    def Splitting(self, live: ModelBundle) -> bool:
+        # True while a challenger serves a share of requests, so the answer depends on the client
+        return any(challenger.share > 0 for challenger in self.Challengers(live))
+
+    def Assign(self, live: ModelBundle, key: str) -> tuple:
+        # (variant, bundle) serving a request: a challenger for its share of buckets, otherwise live
+        position, upper = Bucket(key), 0.0
+        for challenger in self.Challengers(live):
+            upper += challenger.share
+            if position < upper:
+                return challenger.name, challenger.bundle
+        return "live", live
+
+    @contextlib.contextmanager
+    def Serve(self, live: ModelBundle, key: str):
+        # with experiments.Serve(live, key) as (variant, bundle): the bundle stays loaded until the block ends
+        variant, bundle = self.Assign(live, key)
+        if bundle is not live and not self._Acquire(bundle):
+            variant, bundle = "live", live
+        try:
+            yield variant, bundle
+        finally:
+            if bundle is not live:
+                bundle.Release()
+
+    def _Acquire(self, bundle: ModelBundle) -> bool:
+        # False when the challenger was replaced since it was picked
+        with self.lock:
+            if not any(challenger.bundle is bundle for challenger in self.challengers):
+                return False
+            bundle.Acquire()
+            return True
+
+    def Record(self, variant: str, seconds: float):
+        self.stats.Record(variant, "served", seconds)
+        metrics.RecordExperiment(self.name, variant, "served", seconds)
+
+    def Shadow(self, live: ModelBundle, score, primary: float, deadline: float = None):
+        # score(bundle) -> float for each shadow challenger, off the request thread and within the
+        # request's deadline
+        for challenger in self.Challengers(live):
+            if not challenger.shadow:
+                continue
+            if not self.pending.acquire(blocking=False):
+                with self.lock:
+                    self.dropped += 1
+                metrics.RecordShadowDropped(self.name, challenger.name)
+                continue
+            if not self._Acquire(challenger.bundle):
+                self.pending.release()
+                continue
+            self.pool.submit(self._RunShadow, challenger, score, primary, deadline)
+
+    def _RunShadow(self, challenger: Challenger, score, primary: float, deadline: float = None):
+        start = time.perf_counter()
+        try:
+            with admission.WithDeadline(deadline):
+                value = score(challenger.bundle)
+            seconds = time.perf_counter() - start
+            self.stats.Record(challenger.name, "shadow", seconds, delta=value - primary, primary=primary)
+            metrics.RecordExperiment(self.name, challenger.name, "shadow", seconds)
+        except admission.DeadlineExceeded:
+            # queued past the request's deadline: dropped like a full queue
+            with self.lock:
+                self.dropped += 1
+            metrics.RecordShadowDropped(self.name, challenger.name)
+        except Exception as e:
+            # a broken challenger only shows up in its own stats
+            self.stats.Record(challenger.name, "shadow", 0.0, error=True)
+            metrics.RecordError(f"shadow_{self.name}", e)
+        finally:
+            challenger.bundle.Release()
+            self.pending.release()
+
+    def Summary(self) -> dict:
+        return {
+            "challengers": [
+                {"name": challenger.name, "version": challenger.bundle.version, "share": challenger.share, "shadow": challenger.shadow}
+                for challenger in self.challengers
+            ],
+            "shadow_dropped": self.dropped,
+            "variants": self.stats.Summary(),
+        }
+
+_experiments = {}
+_experiments_lock = threading.Lock()
+
+def GetExperiments(name: str) -> Experiments:
+    if name not in _experiments:
+        with _experiments_lock:
+            if name not in _experiments:
+                _experiments[name] = Experiments(name)
+    return _experiments[name]
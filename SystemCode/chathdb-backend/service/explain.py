@@ -0,0 +1,128 @@
+import datetime
+import json
+import os
+import threading
+from collections import OrderedDict
+import numpy as np
+import xgboost as xgb
+from . import admission, metrics
+from . import model, registry
+from .features import SPARSE_MISSING, STREET_PREFIX, FLAT_TYPE_PREFIX
+
+# Why a flat got its price: per-feature contributions from XGBoost's native tree SHAP
+# (pred_contribs) on the live booster, for one request or a batch scored in a single call.
+# Contributions are in price units and add up to the prediction. The hundreds of street name and
+# flat type one-hots are folded into one "street_name" and one "flat_type" contribution each,
+# the bias term is reported as "base_value". Explanations are cached per normalized inputs,
+# model version and month.
+EXPLAIN_CACHE_SIZE = int(os.environ.get("EXPLAIN_CACHE_SIZE", 4096))
+EXPLAIN_MAX_ROWS = int(os.environ.get("EXPLAIN_MAX_ROWS", 500))
+BASE_VALUE = "base_value"
+# layouts kept for the live version and the ones that just went out of service
+LAYOUT_VERSIONS = 2
+
+def FeatureGroup(column: str) -> str:
+    if column.startswith(STREET_PREFIX):
+        return "street_name"
+    if column.startswith(FLAT_TYPE_PREFIX):
+        return "flat_type"
+    return column
+
+class ExplainLayout:
+    # Matrix folding the contribution columns of one model version into groups.
+
+    def __init__(self, bundle: registry.ModelBundle):
+        column_groups = [FeatureGroup(column) for column in bundle.columns]
+        self.groups = list(dict.fromkeys(column_groups)) + [BASE_VALUE]
+        positions = {group: i for i, group in enumerate(self.groups)}
+        # pred_contribs returns one column per feature plus the bias last
+        self.fold = np.zeros((len(bundle.columns) + 1, len(self.groups)), dtype=np.float64)
+        self.fold[np.arange(len(bundle.columns)), [positions[group] for group in column_groups]] = 1
+        self.fold[-1, -1] = 1
+
+class Explainer:
+    # LRU of explanations plus the layout of each recent model version.
+
+    def __init__(self, cache_size: int = EXPLAIN_CACHE_SIZE):
+        self.cache_size = cache_size
+        self.cache = OrderedDict()
+        self.layouts = OrderedDict()
+        self.lock = threading.Lock()
+
+    def Layout(self, bundle: registry.ModelBundle) -> ExplainLayout:
+        with self.lock:
+            layout = self.layouts.get(bundle.version)
+        if layout is None:
+            layout = ExplainLayout(bundle)
+            with self.lock:
+                self.layouts[bundle.version] = layout
+                while len(self.layouts) > LAYOUT_VERSIONS:
+                    self.layouts.popitem(last=False)
+        return layout
+
+    def _Get(self, key: str):
+        with self.lock:
+            explanation = self.cache.get(key)
+            if explanation is not None:
+                self.cache.move_to_end(key)
+            size = len(self.cache)
+        metrics.RecordCache("explain", explanation is not None, size)
+        return explanation
+
+    def _Put(self, key: str, explanation: dict):
+        with self.lock:
+            self.cache[key] = explanation
+            while len(self.cache) > self.cache_size:
+                self.cache.popitem(last=False)
+
+    def Explain(self, bundle: registry.ModelBundle, rows: list, deadline: float = None) -> list:
+        # rows are model.NormalizeInputs dicts; one explanation per row, in order. deadline is the
+        # request's admission.Deadline(), checked between stages
+        today = datetime.date.today()
+        version = model.CacheVersion(bundle)
+        keys = [json.dumps([version, f"{today.year}-{today.month:02d}", row], sort_keys=True) for row in rows]
+        explanations = [self._Get(key) for key in keys]
+        missing = [i for i, explanation in enumerate(explanations) if explanation is None]
+        if not missing:
+            return explanations
+
+        layout = self.Layout(bundle)
+        admission.CheckDeadline("encode", deadline)
+        matrix = model.EncodeBatch([rows[i] for i in missing], bundle, "explain")
+        admission.CheckDeadline("inference", deadline)
+        with metrics.Stage("explain", "contributions"):
+            booster = bundle.model.get_booster()
+            data = xgb.DMatrix(matrix, missing=SPARSE_MISSING if bundle.sparse_input else np.nan, feature_names=booster.feature_names)
+            # the whole batch in one call, folded to (rows, groups)
+            grouped = booster.predict(data, pred_contribs=True).astype(np.float64) @ layout.fold
+        for i, values in zip(missing, grouped):
+            explanations[i] = Explanation(layout.groups, values)
+            self._Put(keys[i], explanations[i])
+        return explanations
+
+    def Stats(self) -> dict:
+        with self.lock:
+            return {"entries": len(self.cache), "cache_size": self.cache_size, "layouts": list(self.layouts)}
+
+def Explanation(groups: list, values: np.ndarray) -> dict:
+    # contributions largest first, the base value apart
+    contributions = sorted(
+        ({"feature": group, "contribution": round(float(value), 2)} for group, value in zip(groups[:-1], values[:-1])),
+        key=lambda item: -abs(item["contribution"]),
+    )
+    return {
+        "price": float(values.sum()),
+        BASE_VALUE: round(float(values[-1]), 2),
+        "contributions": contributions,
+    }
+
+_explainer = None
+_explainer_lock = threading.Lock()
+
+def GetExplainer() -> Explainer:
+    global _explainer
+    if _explainer is None:
+        with _explainer_lock:
+            if _explainer is None:
+                _explainer = Explainer()
+    return _explainer
@@ -0,0 +1,144 @@
+import os
+import threading
+import warnings
+import numpy as np
+import polars as pl
+from . import http_cache, schema
+from .schema import MonthKey, MonthFromKey
+
+# Monthly town-level features keyed by an integer month ordinal (year * 12 + month - 1), built once by
+# lib/datahub/build_feature_store.py. Values are point-in-time: the row for a month only holds data
+# published up to that month, carried forward with as-of joins.
+FEATURE_STORE_DIR = "static/data/feature_store"
+ECONOMIC_FEATURES = ["cpi", "gdp", "unemployment"]
+# two-year lags of the economic indicators, as in econs_lag_two.py
+LAG_MONTHS = 24
+LAGGED_FEATURES = [name + "_lag_2y" for name in ECONOMIC_FEATURES]
+TREND_FEATURES = ["gtrend_value"]
+SENTIMENT_FEATURES = ["aggregated_score", "mean_score"]
+FEATURES = ECONOMIC_FEATURES + LAGGED_FEATURES + TREND_FEATURES + SENTIMENT_FEATURES
+# how many months an older town value may be carried forward before it counts as missing
+TREND_TOLERANCE = 3
+SENTIMENT_TOLERANCE = 6
+
+def _AsOfSource(frame: pl.LazyFrame, columns: list, by: str = None) -> pl.LazyFrame:
+    # one row per key with nulls carried forward, so an as-of join returns the latest known value
+    # of every column rather than only of the latest row
+    keys = ([by] if by else []) + ["month_key"]
+    frame = schema.WithMonthKey(frame)
+    if by:
+        frame = frame.with_columns(pl.col(by).cast(schema.Town))
+    frame = frame.group_by(keys).agg([pl.col(column).drop_nulls().last() for column in columns])
+    fill = [pl.col(column).forward_fill().over(by) if by else pl.col(column).forward_fill() for column in columns]
+    return frame.sort(keys).with_columns(fill)
+
+def BuildTownMonthFeatures(economic: pl.LazyFrame, gtrends: pl.LazyFrame, gnews: pl.LazyFrame, towns: list,
+                           first_key: int, last_key: int) -> pl.DataFrame:
+    # (town, month_key) grid from first_key to last_key with every feature as known at that month
+    grid = pl.LazyFrame({"town": pl.Series(sorted(towns), dtype=schema.Town)}).join(
+        pl.LazyFrame({"month_key": pl.int_range(first_key, last_key + 1, eager=True).cast(pl.Int32)}), how="cross"
+    ).sort(["month_key", "town"])
+    economic = _AsOfSource(economic, ECONOMIC_FEATURES)
+    lagged = economic.select(
+        (pl.col("month_key") + LAG_MONTHS).alias("month_key"), *[pl.col(name).alias(name + "_lag_2y") for name in ECONOMIC_FEATURES]
+    )
+    # join_asof needs both sides sorted on the key; by= keeps town values within their town
+    query = (
+        grid
+        .join_asof(economic, on="month_key", strategy="backward")
+        .join_asof(lagged, on="month_key", strategy="backward")
+        .join_asof(_AsOfSource(gtrends, TREND_FEATURES, "town"), on="month_key", by="town", strategy="backward", tolerance=TREND_TOLERANCE)
+        .join_asof(_AsOfSource(gnews, SENTIMENT_FEATURES, "town"), on="month_key", by="town", strategy="backward", tolerance=SENTIMENT_TOLERANCE)
+        .select(["town", "month_key"] + FEATURES)
+        .sort(["town", "month_key"])
+    )
+    with warnings.catch_warnings():
+        # polars cannot verify sortedness within by= groups; every source is sorted above
+        warnings.filterwarnings("ignore", message="Sortedness")
+        return query.collect()
+
+def JoinFeatures(rows: pl.LazyFrame, town_month: pl.DataFrame) -> pl.LazyFrame:
+    # the grid is already resolved as of each month, so rows need only an integer equi-join
+    return schema.WithMonthKey(rows).with_columns(pl.col("town").cast(schema.Town)).join(town_month.lazy(), on=["town", "month_key"], how="left")
+
+class FeatureStore:
+    # In-memory copy of one feature store version's town-month table for point-in-time lookups.
+
+    def __init__(self, town_month: pl.DataFrame, version: str = None):
+        self.version = version
+        # stats of the LATEST pointer this version was read from
+        self.pointer = None
+        self.towns = sorted(town_month["town"].unique().to_list())
+        self.town_index = {town: i for i, town in enumerate(self.towns)}
+        self.first_key = int(town_month["month_key"].min())
+        self.last_key = int(town_month["month_key"].max())
+        months = self.last_key - self.first_key + 1
+        # values[town, month_key - first_key, feature], NaN where a value is missing
+        self.values = np.full((len(self.towns), months, len(FEATURES)), np.nan)
+        towns = np.array([self.town_index[town] for town in town_month["town"].to_list()])
+        offsets = town_month["month_key"].to_numpy() - self.first_key
+        self.values[towns, offsets] = town_month.select(FEATURES).to_numpy().astype(np.float64)
+        self.economic_positions = [FEATURES.index(name) for name in ECONOMIC_FEATURES + LAGGED_FEATURES]
+
+    @classmethod
+    def Load(cls, root: str = FEATURE_STORE_DIR, version: str = None):
+        version = version or LatestVersion(root)
+        return cls(pl.read_parquet(os.path.join(root, version, "town_month.parquet")), version)
+
+    def _Offsets(self, month_keys: np.ndarray) -> np.ndarray:
+        # months after the last built month get its values; there is nothing newer to know
+        return np.clip(np.asarray(month_keys) - self.first_key, -1, self.last_key - self.first_key)
+
+    def Lookup(self, town: str, month: str) -> dict:
+        # features as known at month; town features are None for towns without data
+        offset = int(self._Offsets([MonthKey(month)])[0])
+        if offset < 0:
+            return {name: None for name in FEATURES}
+        town_position = self.town_index.get(town)
+        if town_position is None:
+            # economic features are the same for every town
+            row = np.full(len(FEATURES), np.nan)
+            row[self.economic_positions] = self.values[0, offset, self.economic_positions]
+        else:
+            row = self.values[town_position, offset]
+        return {name: (None if value != value else value) for name, value in zip(FEATURES, row.tolist())}
+
+    def LookupMany(self, towns, month_keys, columns: list = None) -> np.ndarray:
+        # vectorized Lookup for training and batch scoring: one row per (town, month_key)
+        columns = columns or FEATURES
+        positions = [FEATURES.index(name) for name in columns]
+        offsets = self._Offsets(month_keys)
+        uniques, inverse = np.unique(np.asarray(towns, dtype=str), return_inverse=True)
+        town_positions = np.array([self.town_index.get(town, -1) for town in uniques], dtype=np.int64)[inverse]
+        result = np.full((len(offsets), len(columns)), np.nan)
+        known = (town_positions >= 0) & (offsets >= 0)
+        result[known] = self.values[town_positions[known], offsets[known]][:, positions]
+        # rows for unknown towns still get the economic features
+        economic = [i for i, position in enumerate(positions) if position in self.economic_positions]
+        unknown = (town_positions < 0) & (offsets >= 0)
+        if economic and unknown.any():
+            result[np.ix_(unknown, economic)] = self.values[0, offsets[unknown]][:, [positions[i] for i in economic]]
+        return result
+
+def LatestVersion(root: str = FEATURE_STORE_DIR) -> str:
+    pointer = os.path.join(root, "LATEST")
+    if not os.path.exists(pointer):
+        raise FileNotFoundError(f"Feature store not built, {pointer} is missing: run python3 -m lib.datahub.build_feature_store")
+    with open(pointer, "r") as openfile:
+        return openfile.read().strip()
+
+_store = None
+_store_lock = threading.Lock()
+
+def GetFeatureStore() -> FeatureStore:
+    # loaded on first use and reloaded when a newer version is published; LATEST is only read
+    # again when its stats change
+    global _store
+    pointer = http_cache.ArtifactVersion([os.path.join(FEATURE_STORE_DIR, "LATEST")])
+    if _store is None or _store.pointer != pointer:
+        with _store_lock:
+            if _store is None or _store.pointer != pointer:
+                store = FeatureStore.Load()
+                store.pointer = pointer
+                _store = store
+    return _store
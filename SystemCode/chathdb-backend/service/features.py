@@ -0,0 +1,201 @@
+import numpy as np
+import pandas as pd
+from scipy import sparse
+from .streets import StreetResolver
+from . import feature_store
+
+# Vectorized feature encoding for batch scoring. PredictPrice builds one row at a time;
+# this builds the same model input for a whole frame as a float32 matrix.
+NUMERICAL_FEATURES = ['floor_area_sqm', 'storey_median', 'flat_age']
+STREET_PREFIX = "street_name_"
+FLAT_TYPE_PREFIX = "flat_type_"
+# the future model names its date columns differently
+COLUMN_ALIASES = {"transaction_year": "year", "transaction_month": "month"}
+# XGBoost reads entries missing from a CSR matrix as missing values, not zeros. Models trained on
+# CSR input are fit with missing=0.0 so dense rows (single requests) score the same as CSR rows;
+# models trained on dense input must be scored dense.
+SPARSE_MISSING = 0.0
+
+def _FlatTypeKey(flat_type: str) -> str:
+    return str(flat_type).strip().upper().replace("-", " ")
+
+def _IsCategorical(series: pd.Series) -> bool:
+    # Enum and Categorical columns written with service/schema.py read back as pandas categories
+    return isinstance(series.dtype, pd.CategoricalDtype)
+
+def _Factorize(series: pd.Series):
+    # (codes, distinct values), straight from the dictionary for categorical columns; a missing
+    # value has code -1
+    if _IsCategorical(series):
+        return series.cat.codes.to_numpy(), series.cat.categories.astype(str)
+    return pd.factorize(series.astype(str))
+
+def UsesSparseInput(model) -> bool:
+    # sparse-trained models carry missing=0.0, dense-trained ones the default NaN
+    return getattr(model, "missing", np.nan) == SPARSE_MISSING
+
+def StoreyMedian(storey_range: pd.Series) -> pd.Series:
+    # training buckets the storey range median into 1 (up to 6), 2 (7 to 12) or 3 (above 12),
+    # the same 1/2/3 the API takes as storey_range; numeric values are already buckets
+    if pd.api.types.is_numeric_dtype(storey_range):
+        return storey_range.astype("float32")
+    if _IsCategorical(storey_range):
+        # one bucket per distinct range
+        buckets = StoreyMedian(pd.Series(storey_range.cat.categories.astype(str))).to_numpy()
+        return pd.Series(np.append(buckets, np.nan)[storey_range.cat.codes.to_numpy()], index=storey_range.index, dtype="float32")
+    bounds = storey_range.astype(str).str.extract(r"(\d+)\D+(\d+)").astype("float32")
+    single = pd.to_numeric(storey_range, errors="coerce").astype("float32")
+    median = ((bounds[0] + bounds[1]) / 2).fillna(single)
+    category = np.where(median <= 6, 1, np.where(median <= 12, 2, 3)).astype("float32")
+    return pd.Series(category, index=storey_range.index).where(median.notna())
+
+def PrepareResaleFrame(df: pd.DataFrame, as_of: str = None) -> pd.DataFrame:
+    # derive model inputs from resale columns (month, storey_range, lease_commence_date, ...)
+    # as_of ("YYYY-MM") prices every row at that month instead of its transaction month
+    if as_of:
+        year, month = (int(part) for part in as_of.split("-")[:2])
+        years = pd.Series(year, index=df.index, dtype="int32")
+        months = pd.Series(month, index=df.index, dtype="int32")
+    elif "month_key" in df.columns:
+        # data written with service/schema.py carries the integer month
+        years = (df["month_key"] // 12).astype("int32")
+        months = (df["month_key"] % 12 + 1).astype("int32")
+    else:
+        parts = df["month"].astype(str).str.split("-", n=2, expand=True)
+        years = parts[0].astype("int32")
+        months = parts[1].astype("int32")
+    storey = df["storey_median"] if "storey_median" in df.columns else StoreyMedian(df["storey_range"])
+    frame = pd.DataFrame({
+        "month": months,
+        "year": years,
+        "floor_area_sqm": df["floor_area_sqm"].astype("float32"),
+        "lease_commence_date": df["lease_commence_date"].astype("int32"),
+        "storey_median": storey.astype("float32"),
+        "flat_age": (years - df["lease_commence_date"]).astype("float32"),
+        "street_name": df["street_name"] if _IsCategorical(df["street_name"]) else df["street_name"].astype(str),
+        "flat_type": df["flat_type"] if _IsCategorical(df["flat_type"]) else df["flat_type"].astype(str),
+    }, index=df.index)
+    # town and any features already joined from the feature store pass through
+    for column in ["town"] + feature_store.FEATURES:
+        if column in df.columns:
+            frame[column] = df[column]
+    return frame
+
+def AddStoreFeatures(frame: pd.DataFrame, columns: list) -> pd.DataFrame:
+    # look up the feature store columns a model uses that the frame does not carry yet, as known
+    # in each row's month
+    missing = [column for column in columns if column in feature_store.FEATURES and column not in frame.columns]
+    if not missing:
+        return frame
+    towns = frame["town"] if "town" in frame.columns else pd.Series("", index=frame.index)
+    month_keys = frame["year"].to_numpy() * 12 + frame["month"].to_numpy() - 1
+    values = feature_store.GetFeatureStore().LookupMany(towns, month_keys, missing)
+    return frame.assign(**{column: values[:, i] for i, column in enumerate(missing)})
+
+class FeatureSchema:
+    # Column layout of one model: numeric columns plus street name and flat type one-hots.
+
+    def __init__(self, columns: list):
+        self.columns = list(columns)
+        self.index = {column: i for i, column in enumerate(self.columns)}
+        self.street_index = {
+            column[len(STREET_PREFIX):]: i for i, column in enumerate(self.columns) if column.startswith(STREET_PREFIX)
+        }
+        self.flat_type_index = {
+            column[len(FLAT_TYPE_PREFIX):]: i for i, column in enumerate(self.columns) if column.startswith(FLAT_TYPE_PREFIX)
+        }
+        self.flat_type_keys = {}
+        for flat_type, i in self.flat_type_index.items():
+            self.flat_type_keys.setdefault(_FlatTypeKey(flat_type), i)
+        self.numeric_columns = [
+            column for column in self.columns if not column.startswith(STREET_PREFIX) and not column.startswith(FLAT_TYPE_PREFIX)
+        ]
+        self.resolver = StreetResolver(self.street_index)
+        self.street_cache = {}
+
+    @classmethod
+    def FromCsv(cls, filepath: str):
+        # the model sample CSVs carry the training column order in their header
+        return cls(list(pd.read_csv(filepath, nrows=0).columns))
+
+    def __len__(self):
+        return len(self.columns)
+
+    def StreetPosition(self, street_name: str) -> int:
+        # column position for a street, -1 when it cannot be resolved
+        position = self.street_cache.get(street_name)
+        if position is None:
+            resolved, _, _ = self.resolver.Resolve(street_name)
+            position = self.street_index[resolved] if resolved is not None else -1
+            self.street_cache[street_name] = position
+        return position
+
+    def FlatTypePosition(self, flat_type: str) -> int:
+        position = self.flat_type_index.get(flat_type)
+        if position is None:
+            position = self.flat_type_keys.get(_FlatTypeKey(flat_type), -1)
+        return position
+
+    def CategoricalPositions(self, frame: pd.DataFrame):
+        # resolve each distinct street and flat type once per frame
+        street_codes, street_uniques = _Factorize(frame["street_name"])
+        street_positions = np.array([self.StreetPosition(name) for name in street_uniques] + [-1], dtype=np.int64)[street_codes]
+        flat_codes, flat_uniques = _Factorize(frame["flat_type"])
+        flat_positions = np.array([self.FlatTypePosition(name) for name in flat_uniques] + [-1], dtype=np.int64)[flat_codes]
+        return street_positions, flat_positions
+
+    def Encode(self, frame: pd.DataFrame) -> np.ndarray:
+        # frame holds the numeric columns of this schema plus street_name and flat_type
+        frame = AddStoreFeatures(frame, self.numeric_columns)
+        matrix = np.zeros((len(frame), len(self.columns)), dtype=np.float32)
+        for column in self.numeric_columns:
+            source = column if column in frame.columns else COLUMN_ALIASES.get(column, column)
+            matrix[:, self.index[column]] = frame[source].to_numpy(dtype=np.float32)
+        rows = np.arange(len(frame))
+        street_positions, flat_positions = self.CategoricalPositions(frame)
+        known = street_positions >= 0
+        matrix[rows[known], street_positions[known]] = 1
+        known = flat_positions >= 0
+        matrix[rows[known], flat_positions[known]] = 1
+        return matrix
+
+    def Scale(self, matrix: np.ndarray, scaler) -> np.ndarray:
+        # StandardScaler.transform on the numerical columns, in place
+        names = list(getattr(scaler, "feature_names_in_", NUMERICAL_FEATURES))
+        positions = [self.index[name] for name in names]
+        matrix[:, positions] = (matrix[:, positions] - scaler.mean_) / scaler.scale_
+        return matrix
+
+    def EncodeScaled(self, frame: pd.DataFrame, scaler, sparse_input: bool = False):
+        # scaled model input, CSR for sparse-trained models and dense otherwise
+        if sparse_input:
+            return self.EncodeSparse(frame, scaler)
+        return self.Scale(self.Encode(frame), scaler)
+
+    def EncodeSparse(self, frame: pd.DataFrame, scaler=None) -> sparse.csr_matrix:
+        # CSR with the numeric columns and one entry per known street and flat type, so a row holds
+        # about 8 values instead of the full width. Numeric columns are scaled before zeros are
+        # dropped, as a zero only counts as missing after scaling.
+        frame = AddStoreFeatures(frame, self.numeric_columns)
+        rows = len(frame)
+        numeric = np.empty((rows, len(self.numeric_columns)), dtype=np.float32)
+        for i, column in enumerate(self.numeric_columns):
+            source = column if column in frame.columns else COLUMN_ALIASES.get(column, column)
+            numeric[:, i] = frame[source].to_numpy(dtype=np.float32)
+        if scaler is not None:
+            names = list(getattr(scaler, "feature_names_in_", NUMERICAL_FEATURES))
+            positions = [self.numeric_columns.index(name) for name in names]
+            numeric[:, positions] = (numeric[:, positions] - scaler.mean_) / scaler.scale_
+        street_positions, flat_positions = self.CategoricalPositions(frame)
+        numeric_positions = np.array([self.index[column] for column in self.numeric_columns], dtype=np.int64)
+        positions = np.column_stack([np.broadcast_to(numeric_positions, numeric.shape), street_positions, flat_positions])
+        values = np.column_stack([numeric, np.ones((rows, 2), dtype=np.float32)])
+        keep = (positions >= 0) & (values != SPARSE_MISSING)
+        # CSR wants the column indices of each row in order
+        positions = np.where(keep, positions, len(self.columns))
+        order = np.argsort(positions, axis=1, kind="stable")
+        positions = np.take_along_axis(positions, order, axis=1)
+        values = np.take_along_axis(values, order, axis=1)
+        keep = np.take_along_axis(keep, order, axis=1)
+        indptr = np.concatenate([[0], np.cumsum(keep.sum(axis=1))])
+        return sparse.csr_matrix((values[keep], positions[keep].astype(np.int32), indptr), shape=(rows, len(self.columns)))
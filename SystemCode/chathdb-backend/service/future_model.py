@@ -3,78 +3,112 @@ import os
 import pandas as pd
 from flask import current_app
 from dateutil.relativedelta import relativedelta
-from .model import ReadColumnsFlatType, ReadColumnsStreetName, OpenPickle
+from .model import OpenPickle, NormalizeInputs, CacheVersion
+from . import admission, metrics
+from . import dimensions, feature_store, registry
 
 # define constants here
 script_dir = os.path.dirname(__file__) # absolute dir the script is in
 
 def ReadFutureModel():
-    return OpenPickle("static/models/final_model_future.pkl", "rb")
+    # unpickled from the live version's files; serving uses the bundle the registry keeps in memory
+    return OpenPickle(registry.GetRegistry().Live("future").paths["model"], "rb")
 
 def ReadFutureScaler():
-    return OpenPickle("static/models/scaler_future.pkl", "rb")
+    return OpenPickle(registry.GetRegistry().Live("future").paths["scaler"], "rb")
 
-cols_flat_type = ReadColumnsFlatType()
-cols_street_name = ReadColumnsStreetName()
+def FutureModelVersion() -> str:
+    return registry.GetRegistry().Live("future").version
 
-def PredictFuturePrice(street_name: str, floor_area: int, storey_range: int, lease_start: int, flat_type: str):
-    # get current year and month
-    year = datetime.date.today().year
+def PredictFuturePrice(street_name: str, floor_area: int, storey_range: int, lease_start: int, flat_type: str, bundle: registry.ModelBundle = None):
+    if bundle is None:
+        with registry.GetRegistry().Use("future") as bundle:
+            return PredictFuturePrice(street_name, floor_area, storey_range, lease_start, flat_type, bundle)
     date_after_1month = datetime.date.today()+ relativedelta(months=1)
     date_after_2month = datetime.date.today()+ relativedelta(months=2)
     date_after_3month = datetime.date.today()+ relativedelta(months=3)
-
-    # default flat age = 0
-    flat_age = 0
-    # calculate remaining_lease and flat_age if lease_start is defined by user
-    if lease_start > 0: 
-        flat_age = year - lease_start
-    
-    # default values for town and flat model
-    townList = [0] * 588
-    flatTypeList = [0] * 7
-    
-    if street_name != "": 
-        parsed_street_name = map_street_name(street_name)
-        # check if street name exists in the json file
-        if parsed_street_name in cols_street_name:
-            # get the index of the street name in the json file
-            index = cols_street_name.get(parsed_street_name)
-            # set the corresponding town to 1
-            townList[index] = 1
-        else:
-            current_app.logger.warning(f"Street name {parsed_street_name} not found in the json file")
-    
-    if flat_type != "":
-        parsed_flat_type = map_flat_type(flat_type)
-        if parsed_flat_type in cols_flat_type:
-            # get the index of the flat type in the json file
-            index = cols_flat_type.get(parsed_flat_type)
-            # set the corresponding flat type to 1
-            flatTypeList[index] = 1
-        else:
-            current_app.logger.warning(f"Flat type {parsed_flat_type} not found in the json file")
-
-    # Load the training data columns to get the correct order and names
-    cols_training = pd.read_csv("static/models/X_single_test_data_future.csv")
-    # Create an empty DataFrame with the correct columns
-    test_df = pd.DataFrame(columns=cols_training.columns)
-    # Fill in the values for your input data
-    test_df.loc[0] = [floor_area,lease_start,storey_range,flat_age] + townList + flatTypeList + [year, date_after_1month.month]
-    test_df.loc[1] = [floor_area,lease_start,storey_range,flat_age] + townList + flatTypeList + [year, date_after_2month.month]
-    test_df.loc[2] = [floor_area,lease_start,storey_range,flat_age] + townList + flatTypeList + [year, date_after_3month.month]
-    scaler = ReadFutureScaler()
+    admission.CheckDeadline("encode")
+    test_df = EncodeFutureFeatures(street_name=street_name, floor_area=floor_area, storey_range=storey_range, lease_start=lease_start, flat_type=flat_type, bundle=bundle)
+    admission.CheckDeadline("scale")
     # Scale numerical features
-    numerical_features = ['floor_area_sqm', 'storey_median', 'flat_age']
-    test_df[numerical_features] = scaler.transform(test_df[numerical_features])
+    with metrics.Stage("future_predict", "scale"):
+        numerical_features = ['floor_area_sqm', 'storey_median', 'flat_age']
+        test_df[numerical_features] = bundle.scaler.transform(test_df[numerical_features])
+    admission.CheckDeadline("inference")
     # Make prediction
-    xgb_model = ReadFutureModel()
+    with metrics.Stage("future_predict", "inference"):
+        # score all three months in a single call
+        predictions = bundle.model.predict(test_df)
     return {
-        date_after_1month.strftime("%m-%Y"): float(xgb_model.predict(test_df)[0]),
-        date_after_2month.strftime("%m-%Y"): float(xgb_model.predict(test_df)[1]),
-        date_after_3month.strftime("%m-%Y"): float(xgb_model.predict(test_df)[2])
+        date_after_1month.strftime("%m-%Y"): float(predictions[0]),
+        date_after_2month.strftime("%m-%Y"): float(predictions[1]),
+        date_after_3month.strftime("%m-%Y"): float(predictions[2])
     }
 
+def EncodeFutureFeatures(street_name: str, floor_area: int, storey_range: int, lease_start: int, flat_type: str, bundle: registry.ModelBundle = None) -> pd.DataFrame:
+    bundle = bundle or registry.GetRegistry().Live("future")
+    cols_street_name, cols_flat_type = bundle.cols_street_name, bundle.cols_flat_type
+    # query-string values arrive as text; the frame below is float64
+    floor_area, storey_range, lease_start = float(floor_area), float(storey_range), int(lease_start)
+    with metrics.Stage("future_predict", "one_hot"):
+        # get current year and month
+        year = datetime.date.today().year
+        date_after_1month = datetime.date.today()+ relativedelta(months=1)
+        date_after_2month = datetime.date.today()+ relativedelta(months=2)
+        date_after_3month = datetime.date.today()+ relativedelta(months=3)
+
+        # default flat age = 0
+        flat_age = 0
+        # calculate remaining_lease and flat_age if lease_start is defined by user
+        if lease_start > 0: 
+            flat_age = year - lease_start
+        
+        # default values for town and flat model
+        townList = [0] * len(cols_street_name)
+        flatTypeList = [0] * len(cols_flat_type)
+        # HDB town of the street, for town-level features
+        town = None
+        
+        if street_name != "": 
+            parsed_street_name = map_street_name(street_name, bundle.street_resolver)
+            town = dimensions.GetDimensions().StreetTown(parsed_street_name.replace("street_name_", "", 1))
+            # check if street name exists in the json file
+            if parsed_street_name in cols_street_name:
+                # get the index of the street name in the json file
+                index = cols_street_name.get(parsed_street_name)
+                # set the corresponding town to 1
+                townList[index] = 1
+            else:
+                current_app.logger.warning(f"Street name {parsed_street_name} not found in the json file")
+        
+        if flat_type != "":
+            parsed_flat_type = map_flat_type(flat_type)
+            if parsed_flat_type in cols_flat_type:
+                # get the index of the flat type in the json file
+                index = cols_flat_type.get(parsed_flat_type)
+                # set the corresponding flat type to 1
+                flatTypeList[index] = 1
+            else:
+                current_app.logger.warning(f"Flat type {parsed_flat_type} not found in the json file")
+
+    with metrics.Stage("future_predict", "build_frame"):
+        # Create a zero-filled DataFrame with the training columns of this version
+        test_df = pd.DataFrame(0.0, index=[0, 1, 2], columns=bundle.columns)
+        # Fill in the values for your input data by column name, so one-hot columns appended by
+        # incremental updates line up with their json index
+        test_df[["floor_area_sqm", "lease_commence_date", "storey_median", "flat_age"]] = [floor_area,lease_start,storey_range,flat_age]
+        test_df[list(cols_street_name)] = townList
+        test_df[list(cols_flat_type)] = flatTypeList
+        test_df["transaction_year"] = year
+        test_df["transaction_month"] = [date_after_1month.month, date_after_2month.month, date_after_3month.month]
+        # forecasts can only use features known today
+        store_columns = [column for column in test_df.columns if column in feature_store.FEATURES]
+        if store_columns:
+            today = datetime.date.today()
+            features = feature_store.GetFeatureStore().Lookup(town, f"{today.year}-{today.month:02d}")
+            test_df[store_columns] = [features[column] for column in store_columns]
+    return test_df
+
 
 def TestPredictFuturePrice() -> int:
     try:
@@ -84,8 +118,11 @@ def TestPredictFuturePrice() -> int:
         current_app.logger.error(f"Error in TestPredictPrice: {str(e)}")
         return str(e)
 
-def map_street_name(street_name: str) -> str:
-    return "street_name_" + street_name
+def map_street_name(street_name: str, street_resolver) -> str:
+    # resolve abbreviations and typos to the spelling used in the model columns
+    resolved, method, _ = street_resolver.Resolve(street_name)
+    metrics.RecordStreetResolution(method)
+    return "street_name_" + (resolved or street_name)
 
 def map_flat_type(flat_type: str) -> str:
     return "flat_type_" + flat_type
@@ -0,0 +1,98 @@
+import datetime
+import json
+import os
+import threading
+from collections import OrderedDict
+import numpy as np
+from . import dimensions, metrics, model, multipliers, registry
+from .features import STREET_PREFIX
+
+# "What would this flat cost on every street": one flat specification priced on every street the
+# model knows, in one batch, optionally with the town multipliers, and summarised per town and
+# planning area. Results are kept per (spec, model and feature store version, month, multiplier
+# version), so repeat map loads are served from memory.
+HEATMAP_CACHE_SIZE = int(os.environ.get("HEATMAP_CACHE_SIZE", 64))
+
+def Streets(bundle: registry.ModelBundle) -> list:
+    # street names in one-hot column order
+    return [column[len(STREET_PREFIX):] for column, _ in sorted(bundle.cols_street_name.items(), key=lambda item: item[1])]
+
+def Summary(prices: np.ndarray) -> dict:
+    return {
+        "streets": int(len(prices)),
+        "min": round(float(prices.min()), 2),
+        "median": round(float(np.median(prices)), 2),
+        "max": round(float(prices.max()), 2),
+        "mean": round(float(prices.mean()), 2),
+    }
+
+def Build(bundle: registry.ModelBundle, spec: dict, town_multipliers: multipliers.TownMultipliers = None) -> dict:
+    # spec is a model.NormalizeInputs dict without the street name
+    dims = dimensions.GetDimensions()
+    dims.RequireStreetTowns()
+    streets = Streets(bundle)
+    prices = model.PredictBatch([dict(spec, street_name=street) for street in streets], bundle, "heatmap").astype(np.float64)
+    towns = np.array([dims.StreetTown(street) or "" for street in streets], dtype=object)
+    if town_multipliers is not None:
+        prices *= np.array([town_multipliers.Multiplier(town) for town in towns])
+
+    by_town = {}
+    for town in sorted(set(towns) - {""}):
+        by_town[town] = Summary(prices[towns == town])
+    # planning areas without their own HDB town share the statistics of the town they belong to
+    by_planning_area = {
+        area: {**by_town[town], "town": town}
+        for area, town in sorted(dims.planning_area_town.items()) if town in by_town
+    }
+    return {
+        "spec": spec,
+        "multipliers": town_multipliers is not None,
+        "overall": Summary(prices),
+        "towns": by_town,
+        "planning_areas": by_planning_area,
+        "streets": [
+            {"street_name": street, "town": town or None, "price": round(float(price), 2)}
+            for street, town, price in zip(streets, towns, prices)
+        ],
+    }
+
+class HeatmapCache:
+    # LRU of built heatmaps.
+
+    def __init__(self, cache_size: int = HEATMAP_CACHE_SIZE):
+        self.cache_size = cache_size
+        self.cache = OrderedDict()
+        self.lock = threading.Lock()
+
+    def Key(self, bundle: registry.ModelBundle, spec: dict, apply_multipliers: bool) -> str:
+        today = datetime.date.today()
+        multiplier_version = multipliers.GetMultipliers().version if apply_multipliers else None
+        return json.dumps([model.CacheVersion(bundle), f"{today.year}-{today.month:02d}", spec, multiplier_version], sort_keys=True)
+
+    def Get(self, bundle: registry.ModelBundle, spec: dict, apply_multipliers: bool = False) -> dict:
+        key = self.Key(bundle, spec, apply_multipliers)
+        with self.lock:
+            result = self.cache.get(key)
+            if result is not None:
+                self.cache.move_to_end(key)
+            size = len(self.cache)
+        metrics.RecordCache("heatmap", result is not None, size)
+        if result is not None:
+            return result
+        result = Build(bundle, spec, multipliers.GetMultipliers() if apply_multipliers else None)
+        with self.lock:
+            self.cache[key] = result
+            while len(self.cache) > self.cache_size:
+                self.cache.popitem(last=False)
+        return result
+
+_heatmaps = None
+_heatmaps_lock = threading.Lock()
+
+def GetHeatmapCache() -> HeatmapCache:
+    global _heatmaps
+    if _heatmaps is None:
+        with _heatmaps_lock:
+            if _heatmaps is None:
+                _heatmaps = HeatmapCache()
+    return _heatmaps
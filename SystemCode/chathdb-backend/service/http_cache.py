@@ -0,0 +1,120 @@
+import datetime
+import gzip
+import hashlib
+import json
+import os
+from flask import Response, request
+from flask.json.provider import DefaultJSONProvider
+from . import metrics
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# HTTP caching for the prediction endpoints and compression for every large response.
+# Predictions only change with the model artifacts or the calendar month, so they get a strong
+# ETag over (endpoint, normalized inputs, model version, month): a client or CDN that sends it
+# back in If-None-Match gets a 304 without the model running.
+PREDICTION_MAX_AGE = int(os.environ.get("PREDICTION_MAX_AGE", 300))
+COMPRESS_MIN_BYTES = int(os.environ.get("COMPRESS_MIN_BYTES", 1024))
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+COMPRESSIBLE_TYPES = {"application/json", "text/plain", "text/csv", "text/html"}
+ENCODINGS = (["br"] if brotli is not None else []) + ["gzip"]
+
+class FastJSONProvider(DefaultJSONProvider):
+    # jsonify through orjson when it is installed; output matches the default provider (sorted
+    # keys, dates and dataclasses through default()) except NaN, which becomes null
+
+    def dumps(self, obj, **kwargs) -> str:
+        if orjson is None or set(kwargs) - {"indent", "separators"}:
+            return super().dumps(obj, **kwargs)
+        option = orjson.OPT_SORT_KEYS | orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+        option |= orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_PASSTHROUGH_DATACLASS
+        if kwargs.get("indent"):
+            option |= orjson.OPT_INDENT_2
+        try:
+            return orjson.dumps(obj, default=self.default, option=option).decode()
+        except TypeError:
+            return super().dumps(obj, **kwargs)
+
+def ArtifactVersion(paths: list) -> str:
+    # changes whenever any artifact is replaced; a stat per file, no reads
+    digest = hashlib.sha256()
+    for path in paths:
+        try:
+            stat = os.stat(path)
+            digest.update(f"{os.path.basename(path)}:{stat.st_mtime_ns}:{stat.st_size};".encode())
+        except FileNotFoundError:
+            digest.update(f"{os.path.basename(path)}:missing;".encode())
+    return digest.hexdigest()[:16]
+
+def PredictionETag(endpoint: str, inputs: dict, model_version: str) -> str:
+    today = datetime.date.today()
+    key = json.dumps([endpoint, inputs, model_version, f"{today.year}-{today.month:02d}"], sort_keys=True, default=str)
+    return hashlib.sha256(key.encode()).hexdigest()[:32]
+
+def SecondsToMonthEnd() -> int:
+    now = datetime.datetime.now()
+    next_month = (now.replace(day=28) + datetime.timedelta(days=4)).replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+    return max(0, int((next_month - now).total_seconds()))
+
+def NotModified(etag: str) -> bool:
+    # compressed responses carry the encoding in their tag, so any variant matches
+    if_none_match = request.if_none_match
+    if not if_none_match:
+        return False
+    matched = any(if_none_match.contains_weak(tag) for tag in [etag] + [f"{etag}-{encoding}" for encoding in ENCODINGS])
+    metrics.RecordCache("http_etag", matched)
+    return matched
+
+def Cacheable(response: Response, etag: str, private: bool = False) -> Response:
+    # responses stay fresh until the month ends (capped by PREDICTION_MAX_AGE) and are revalidated
+    # with the ETag afterwards, which catches model changes. A private response depends on the
+    # client (an A/B variant) and is kept out of shared caches and CDNs.
+    response.set_etag(etag)
+    if private:
+        response.cache_control.private = True
+        response.vary.add("X-Client-Id")
+    else:
+        response.cache_control.public = True
+    response.cache_control.max_age = min(PREDICTION_MAX_AGE, SecondsToMonthEnd())
+    response.vary.add("Accept-Encoding")
+    return response
+
+def NotModifiedResponse(etag: str, private: bool = False) -> Response:
+    return Cacheable(Response(status=304), etag, private)
+
+def Compress(response: Response) -> Response:
+    # after_request hook: gzip or brotli for large text responses the client accepts
+    if response.mimetype not in COMPRESSIBLE_TYPES:
+        return response
+    response.vary.add("Accept-Encoding")
+    if (response.status_code != 200 or response.direct_passthrough or response.is_streamed
+            or "Content-Encoding" in response.headers or response.cache_control.no_transform):
+        return response
+    encoding = request.accept_encodings.best_match(ENCODINGS)
+    if encoding is None:
+        return response
+    body = response.get_data()
+    if len(body) < COMPRESS_MIN_BYTES:
+        return response
+    if encoding == "br":
+        response.set_data(brotli.compress(body, quality=BROTLI_QUALITY))
+    else:
+        response.set_data(gzip.compress(body, compresslevel=GZIP_LEVEL))
+    response.headers["Content-Encoding"] = encoding
+    etag, weak = response.get_etag()
+    if etag:
+        response.set_etag(f"{etag}-{encoding}", weak)
+    return response
+
+def InitApp(app):
+    app.json = FastJSONProvider(app)
+    app.after_request(Compress)
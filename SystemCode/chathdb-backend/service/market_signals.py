@@ -0,0 +1,103 @@
+import os
+import threading
+import polars as pl
+from . import dimensions, http_cache
+
+# Town news sentiment and search interest from the datahub outputs, so the frontend does not call
+# SerpAPI and Gemini per page view:
+#   scored_consolidated_gnews.parquet  title, month, town, label (-1/0/1), score
+#   aggregated_gnews_scores.parquet    month, town, aggregated_score, mean_score
+#   consolidated_gtrends.parquet       gtrend_value, town, month (already monthly)
+# Each file is read once into per-town series; the files are checked on every lookup and the
+# series rebuilt when the pipeline writes new ones.
+GNEWS_DIR = "static/data/gnews/parsed"
+GTRENDS_DIR = "static/data/gtrends/parsed"
+SCORED_GNEWS_FILE = os.path.join(GNEWS_DIR, "scored_consolidated_gnews.parquet")
+AGGREGATED_GNEWS_FILE = os.path.join(GNEWS_DIR, "aggregated_gnews_scores.parquet")
+GTRENDS_FILE = os.path.join(GTRENDS_DIR, "consolidated_gtrends.parquet")
+SIGNAL_FILES = [SCORED_GNEWS_FILE, AGGREGATED_GNEWS_FILE, GTRENDS_FILE]
+# label written by lib/sentiment/gnews_analysis.py
+SENTIMENTS = {-1: "negative", 0: "neutral", 1: "positive"}
+
+def _ReadTownFrame(filepath: str, columns: list) -> pl.DataFrame:
+    # town as plain text, an empty frame when the stage has not run
+    if not os.path.exists(filepath):
+        return pl.DataFrame(schema={column: pl.Utf8 for column in columns})
+    frame = pl.read_parquet(filepath, columns=columns)
+    return frame.with_columns(pl.col("town").cast(pl.Utf8), pl.col("month").cast(pl.Utf8))
+
+def _ByTown(frame: pl.DataFrame, fields: list) -> dict:
+    # town -> list of row dicts in frame order
+    series = {}
+    for row in frame.select(["town"] + fields).iter_rows(named=True):
+        series.setdefault(row.pop("town"), []).append(row)
+    return series
+
+class MarketSignals:
+    # Per-town headlines, sentiment series and Google Trends series of one version of the files.
+
+    def __init__(self, scored: pl.DataFrame, aggregated: pl.DataFrame, gtrends: pl.DataFrame, version: str = None):
+        self.version = version
+        # newest month first, most confident headline first within a month
+        scored = scored.with_columns(
+            pl.col("label").cast(pl.Int8).replace_strict(SENTIMENTS, return_dtype=pl.Utf8, default="neutral").alias("sentiment"),
+            pl.col("score").cast(pl.Float64).round(4),
+        ).sort(["town", "month", "score"], descending=[False, True, True])
+        self.headlines = _ByTown(scored, ["title", "month", "sentiment", "score"])
+        aggregated = aggregated.with_columns(
+            pl.col("aggregated_score").cast(pl.Float64).round(4), pl.col("mean_score").cast(pl.Float64).round(4),
+        ).sort(["town", "month"])
+        self.sentiment = _ByTown(aggregated, ["month", "aggregated_score", "mean_score"])
+        gtrends = gtrends.with_columns(pl.col("gtrend_value").cast(pl.Int32).alias("value")).sort(["town", "month"])
+        self.trends = _ByTown(gtrends, ["month", "value"])
+        self.towns = sorted(set(self.headlines) | set(self.sentiment) | set(self.trends))
+
+    @classmethod
+    def Load(cls, version: str = None):
+        return cls(
+            _ReadTownFrame(SCORED_GNEWS_FILE, ["title", "month", "town", "label", "score"]),
+            _ReadTownFrame(AGGREGATED_GNEWS_FILE, ["month", "town", "aggregated_score", "mean_score"]),
+            _ReadTownFrame(GTRENDS_FILE, ["gtrend_value", "town", "month"]),
+            version,
+        )
+
+    def Town(self, area: str):
+        # HDB town for a town or planning area name, None when neither is known
+        area = (area or "").strip().upper()
+        if area in self.towns:
+            return area
+        return dimensions.GetDimensions().PlanningAreaToTown(area)
+
+    def News(self, town: str, limit: int = 5, month_from: str = None, month_to: str = None) -> dict:
+        headlines = [row for row in self.headlines.get(town, []) if _InRange(row["month"], month_from, month_to)]
+        return {
+            "town": town,
+            "headlines": headlines[:limit],
+            "sentiment": [row for row in self.sentiment.get(town, []) if _InRange(row["month"], month_from, month_to)],
+        }
+
+    def Trends(self, town: str, month_from: str = None, month_to: str = None) -> dict:
+        return {
+            "town": town,
+            "trends": [row for row in self.trends.get(town, []) if _InRange(row["month"], month_from, month_to)],
+        }
+
+def _InRange(month: str, month_from: str = None, month_to: str = None) -> bool:
+    # "YYYY-MM" strings compare in calendar order
+    return (month_from is None or month >= month_from) and (month_to is None or month <= month_to)
+
+def SignalsVersion() -> str:
+    return http_cache.ArtifactVersion(SIGNAL_FILES)
+
+_signals = None
+_signals_lock = threading.Lock()
+
+def GetMarketSignals() -> MarketSignals:
+    # loaded on first use and rebuilt when any of the files is replaced
+    global _signals
+    version = SignalsVersion()
+    if _signals is None or _signals.version != version:
+        with _signals_lock:
+            if _signals is None or _signals.version != version:
+                _signals = MarketSignals.Load(version)
+    return _signals
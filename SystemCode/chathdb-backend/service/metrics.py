@@ -0,0 +1,237 @@
+import functools
+import os
+import threading
+import time
+from contextlib import nullcontext
+from . import profiler
+
+# In-process metrics rendered in the Prometheus text format at /api/metrics.
+# Recording is a perf_counter read and a locked dict update; set METRICS_ENABLED=0 to turn it off.
+ENABLED = os.environ.get("METRICS_ENABLED", "1") != "0"
+
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+def _EscapeLabel(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+def _FormatLabels(names: tuple, values: tuple, extra: str = "") -> str:
+    pairs = [f'{name}="{_EscapeLabel(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+def _FormatValue(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name: str, help_text: str, labels: tuple = ()):
+        self.name, self.help_text, self.labels = name, help_text, labels
+        self.values = {}
+        self.lock = threading.Lock()
+
+    def inc(self, *label_values, amount: float = 1.0):
+        with self.lock:
+            self.values[label_values] = self.values.get(label_values, 0.0) + amount
+
+    def render(self) -> list:
+        with self.lock:
+            items = sorted(self.values.items())
+        return [f"{self.name}{_FormatLabels(self.labels, key)} {_FormatValue(value)}" for key, value in items]
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def set(self, value: float, *label_values):
+        with self.lock:
+            self.values[label_values] = value
+
+class Histogram:
+    kind = "histogram"
+
+    def __init__(self, name: str, help_text: str, labels: tuple = (), buckets: tuple = DEFAULT_BUCKETS):
+        self.name, self.help_text, self.labels, self.buckets = name, help_text, labels, buckets
+        self.values = {}  # label values -> [bucket counts..., sum, count]
+        self.lock = threading.Lock()
+
+    def observe(self, value: float, *label_values):
+        with self.lock:
+            state = self.values.get(label_values)
+            if state is None:
+                state = self.values[label_values] = [0] * len(self.buckets) + [0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[i] += 1
+                    break
+            state[-2] += value
+            state[-1] += 1
+
+    def render(self) -> list:
+        with self.lock:
+            items = sorted((key, list(state)) for key, state in self.values.items())
+        lines = []
+        for key, state in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets, state):
+                cumulative += count
+                bucket_labels = _FormatLabels(self.labels, key, 'le="%s"' % bound)
+                lines.append(f"{self.name}_bucket{bucket_labels} {cumulative}")
+            bucket_labels = _FormatLabels(self.labels, key, 'le="+Inf"')
+            lines.append(f"{self.name}_bucket{bucket_labels} {state[-1]}")
+            lines.append(f"{self.name}_sum{_FormatLabels(self.labels, key)} {repr(float(state[-2]))}")
+            lines.append(f"{self.name}_count{_FormatLabels(self.labels, key)} {state[-1]}")
+        return lines
+
+class _Timer:
+    __slots__ = ("histogram", "label_values", "start")
+
+    def __init__(self, histogram: Histogram, label_values: tuple):
+        self.histogram, self.label_values = histogram, label_values
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.start, *self.label_values)
+        return False
+
+# Registered metrics
+request_seconds = Histogram("chathdb_request_duration_seconds", "End-to-end handler latency.", ("endpoint",))
+requests_total = Counter("chathdb_requests_total", "Handled requests by status code.", ("endpoint", "status"))
+errors_total = Counter("chathdb_errors_total", "Handler errors by exception type.", ("endpoint", "type"))
+stage_seconds = Histogram("chathdb_stage_duration_seconds", "Latency of each prediction stage.", ("endpoint", "stage"))
+artifact_loads_total = Counter("chathdb_artifact_loads_total", "Pickle artifacts loaded from disk.", ("artifact",))
+artifact_load_seconds = Gauge("chathdb_artifact_last_load_seconds", "Duration of the most recent artifact load.", ("artifact",))
+cache_requests_total = Counter("chathdb_cache_requests_total", "Cache lookups by result.", ("cache", "result"))
+cache_entries = Gauge("chathdb_cache_entries", "Entries currently held by each cache.", ("cache",))
+street_resolutions_total = Counter("chathdb_street_resolutions_total", "Street name lookups by resolution method.", ("method",))
+slow_profiles_total = Counter("chathdb_slow_request_profiles_total", "Sampling profiles captured for slow requests.", ("endpoint",))
+model_bundle_events_total = Counter("chathdb_model_bundle_events_total", "Model versions loaded and reclaimed by the registry.", ("model", "event"))
+model_bundle_load_seconds = Gauge("chathdb_model_bundle_last_load_seconds", "Duration of the most recent model version load.", ("model",))
+experiment_requests_total = Counter("chathdb_experiment_requests_total", "Requests scored per model variant, served or shadowed.", ("model", "variant", "role"))
+experiment_seconds = Histogram("chathdb_experiment_duration_seconds", "Prediction latency per model variant.", ("model", "variant", "role"))
+shadow_dropped_total = Counter("chathdb_shadow_dropped_total", "Shadow scorings dropped because the shadow pool was full.", ("model", "variant"))
+admission_requests_total = Counter("chathdb_admission_requests_total", "Admission decisions: admitted, admitted_after_wait, shed, queue_timeout, deadline.", ("endpoint", "result"))
+admission_running = Gauge("chathdb_admission_running", "Requests holding an admission slot.", ("priority",))
+admission_waiting = Gauge("chathdb_admission_waiting", "Requests queued for an admission slot.", ("priority",))
+prediction_log_records_total = Counter("chathdb_prediction_log_records_total", "Prediction log records by outcome.", ("result",))
+prediction_log_queue_depth = Gauge("chathdb_prediction_log_queue_depth", "Records waiting in the prediction log queue.")
+prediction_log_flush_seconds = Histogram("chathdb_prediction_log_flush_seconds", "Duration of each prediction log bulk insert.")
+warmup_runs_total = Counter("chathdb_warmup_runs_total", "Prediction cache warm-ups by trigger.", ("trigger",))
+warmup_keys_total = Counter("chathdb_warmup_keys_total", "Inputs scored by prediction cache warm-ups.", ("trigger",))
+warmup_seconds = Gauge("chathdb_warmup_last_duration_seconds", "Duration of the most recent warm-up.", ("trigger",))
+warmup_coverage = Gauge("chathdb_warmup_coverage_ratio", "Share of counted /predict traffic cached after the most recent warm-up.", ("trigger",))
+
+REGISTRY = [
+    request_seconds, requests_total, errors_total, stage_seconds,
+    artifact_loads_total, artifact_load_seconds, cache_requests_total, cache_entries, street_resolutions_total, slow_profiles_total,
+    prediction_log_records_total, prediction_log_queue_depth, prediction_log_flush_seconds,
+    warmup_runs_total, warmup_keys_total, warmup_seconds, warmup_coverage,
+    model_bundle_events_total, model_bundle_load_seconds,
+    experiment_requests_total, experiment_seconds, shadow_dropped_total,
+    admission_requests_total, admission_running, admission_waiting,
+]
+
+_disabled = nullcontext()
+
+def Stage(endpoint: str, stage: str):
+    # time one stage of a request: with metrics.Stage("predict", "inference"): ...
+    if not ENABLED:
+        return _disabled
+    return _Timer(stage_seconds, (endpoint, stage))
+
+def RecordError(endpoint: str, error: Exception):
+    if ENABLED:
+        errors_total.inc(endpoint, type(error).__name__)
+
+def RecordArtifactLoad(artifact: str, seconds: float):
+    if ENABLED:
+        artifact_loads_total.inc(artifact)
+        artifact_load_seconds.set(seconds, artifact)
+
+def RecordCache(cache: str, hit: bool, size: int = None):
+    if ENABLED:
+        cache_requests_total.inc(cache, "hit" if hit else "miss")
+        if size is not None:
+            cache_entries.set(size, cache)
+
+def RecordStreetResolution(method: str):
+    if ENABLED:
+        street_resolutions_total.inc(method)
+
+def RecordModelBundle(model: str, event: str, seconds: float = None):
+    if ENABLED:
+        model_bundle_events_total.inc(model, event)
+        if seconds is not None:
+            model_bundle_load_seconds.set(seconds, model)
+
+def RecordExperiment(model: str, variant: str, role: str, seconds: float):
+    if ENABLED:
+        experiment_requests_total.inc(model, variant, role)
+        experiment_seconds.observe(seconds, model, variant, role)
+
+def RecordShadowDropped(model: str, variant: str):
+    if ENABLED:
+        shadow_dropped_total.inc(model, variant)
+
+def RecordAdmission(endpoint: str, result: str):
+    if ENABLED:
+        admission_requests_total.inc(endpoint, result)
+
+def RecordAdmissionLoad(priority: str, running: int, waiting: int):
+    if ENABLED:
+        admission_running.set(running, priority)
+        admission_waiting.set(waiting, priority)
+
+def RecordPredictionLog(result: str, count: int, queue_depth: int):
+    if ENABLED:
+        prediction_log_records_total.inc(result, amount=count)
+        prediction_log_queue_depth.set(queue_depth)
+
+def RecordPredictionLogFlush(seconds: float):
+    if ENABLED:
+        prediction_log_flush_seconds.observe(seconds)
+
+def RecordWarmup(trigger: str, seconds: float, keys: int, coverage: float = None):
+    if ENABLED:
+        warmup_runs_total.inc(trigger)
+        warmup_keys_total.inc(trigger, amount=keys)
+        warmup_seconds.set(seconds, trigger)
+        if coverage is not None:
+            warmup_coverage.set(coverage, trigger)
+
+def Instrument(endpoint: str):
+    # route decorator counting requests and timing the whole handler
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            if not ENABLED:
+                return view(*args, **kwargs)
+            profile_token = profiler.Start() if profiler.ENABLED else None
+            start = time.perf_counter()
+            status = 500
+            try:
+                response = view(*args, **kwargs)
+                if isinstance(response, tuple):
+                    status = response[1] if len(response) > 1 else 200
+                else:
+                    status = getattr(response, "status_code", 200)
+                return response
+            finally:
+                elapsed = time.perf_counter() - start
+                request_seconds.observe(elapsed, endpoint)
+                requests_total.inc(endpoint, str(status))
+                if profile_token is not None and profiler.Stop(profile_token, endpoint, elapsed):
+                    slow_profiles_total.inc(endpoint)
+        return wrapper
+    return decorator
+
+def RenderPrometheus() -> str:
+    lines = []
+    for metric in REGISTRY:
+        lines.append(f"# HELP {metric.name} {metric.help_text}")
+        lines.append(f"# TYPE {metric.name} {metric.kind}")
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
@@ -1,90 +1,167 @@
 import pickle
 import datetime
-import json
 import os
+import time
+import numpy as np
 import pandas as pd
 from flask import current_app
 from xgboost import XGBRegressor
 from sklearn.preprocessing import StandardScaler
+from . import admission, metrics
+from . import dimensions, feature_store, http_cache, registry
+from .features import SPARSE_MISSING
+from .streets import NormalizeStreetName
 
 # define constants here
 script_dir = os.path.dirname(__file__) # absolute dir the script is in
 
 def ReadModel():
-    return OpenPickle("static/models/final_model.pkl", "rb")
+    # unpickled from the live version's files; serving uses the bundle the registry keeps in memory
+    return OpenPickle(registry.GetRegistry().Live("current").paths["model"], "rb")
 
 def ReadScaler():
-    return OpenPickle("static/models/final_scaler.pkl", "rb")
+    return OpenPickle(registry.GetRegistry().Live("current").paths["scaler"], "rb")
 
-def ReadColumnsFlatType():
-    # Load as json
-    with open('static/models/data/cols_flat_type.json', "r") as openfile:
-        columns_flat_type = json.load(openfile)
-    return columns_flat_type
+def ModelVersion() -> str:
+    return registry.GetRegistry().Live("current").version
 
-def ReadColumnsStreetName():
-    # Load as json
-    with open('static/models/data/cols_street_name.json', "r") as openfile:
-        street_name_json = json.load(openfile)
-    return street_name_json
+def CacheVersion(bundle) -> str:
+    # what a cached prediction depends on besides its inputs: the model version and the feature store version
+    return f"{bundle.version}:{http_cache.ArtifactVersion([os.path.join(feature_store.FEATURE_STORE_DIR, 'LATEST')])}"
 
-cols_flat_type = ReadColumnsFlatType()
-cols_street_name = ReadColumnsStreetName()
+def NormalizeInputs(street_name: str, floor_area, storey_range, lease_start: int, flat_type: str) -> dict:
+    # request parameters as the model sees them, so equivalent requests share an ETag
+    return {
+        "street_name": NormalizeStreetName(street_name),
+        "floor_area": float(floor_area),
+        "storey_range": float(storey_range),
+        "lease_start": int(lease_start),
+        # flat types are matched to their one-hot column as given
+        "flat_type": str(flat_type),
+    }
 
 def OpenPickle(filepath: str, perm: str):
     # Load the ML model
+    start = time.perf_counter()
     with (open(filepath, perm)) as openfile:
-        return pickle.load(openfile)
-
-def PredictPrice(street_name: str, floor_area: int, storey_range: int, lease_start: int, flat_type: str) -> int:
-    # get current year and month
-    year = datetime.date.today().year
-    month = datetime.date.today().month
-
-    # default flat age = 0
-    flat_age = 0
-    # calculate remaining_lease and flat_age if lease_start is defined by user
-    if lease_start > 0: 
-        flat_age = year - lease_start
-    
-    # default values for town and flat model
-    townList = [0] * 570
-    flatTypeList = [0] * 6
-    
-    if street_name != "": 
-        parsed_street_name = map_street_name(street_name)
-        # check if street name exists in the json file
-        if parsed_street_name in cols_street_name:
-            # get the index of the street name in the json file
-            index = cols_street_name.get(parsed_street_name)
-            # set the corresponding town to 1
-            townList[index] = 1
-        else:
-            current_app.logger.warning(f"Street name {parsed_street_name} not found in the json file")
-    
-    if flat_type != "":
-        parsed_flat_type = map_flat_type(flat_type)
-        if parsed_flat_type in cols_flat_type:
-            # get the index of the flat type in the json file
-            index = cols_flat_type.get(parsed_flat_type)
-            # set the corresponding flat type to 1
-            flatTypeList[index] = 1
-        else:
-            current_app.logger.warning(f"Flat type {parsed_flat_type} not found in the json file")
-
-    # Load the training data columns to get the correct order and names
-    cols_training = pd.read_csv("static/models/data/model_input_sample.csv")
-    # Create an empty DataFrame with the correct columns
-    test_df = pd.DataFrame(columns=cols_training.columns)
-    # Fill in the values for your input data
-    test_df.loc[0] = [month,floor_area,lease_start,year,storey_range,flat_age] + townList + flatTypeList
-    scaler = ReadScaler()
+        artifact = pickle.load(openfile)
+    metrics.RecordArtifactLoad(os.path.basename(filepath), time.perf_counter() - start)
+    return artifact
+
+def PredictPrice(street_name: str, floor_area: int, storey_range: int, lease_start: int, flat_type: str, bundle: registry.ModelBundle = None) -> int:
+    if bundle is None:
+        with registry.GetRegistry().Use("current") as bundle:
+            return PredictPrice(street_name, floor_area, storey_range, lease_start, flat_type, bundle)
+    admission.CheckDeadline("encode")
+    test_df = EncodeFeatures(street_name=street_name, floor_area=floor_area, storey_range=storey_range, lease_start=lease_start, flat_type=flat_type, bundle=bundle)
+    admission.CheckDeadline("scale")
     # Scale numerical features
-    numerical_features = ['floor_area_sqm', 'storey_median', 'flat_age']
-    test_df[numerical_features] = scaler.transform(test_df[numerical_features])
+    with metrics.Stage("predict", "scale"):
+        numerical_features = ['floor_area_sqm', 'storey_median', 'flat_age']
+        test_df[numerical_features] = bundle.scaler.transform(test_df[numerical_features])
+    admission.CheckDeadline("inference")
     # Make prediction
-    xgb_model = ReadModel()
-    return float(xgb_model.predict(test_df)[0]) # Return predicted as a float
+    with metrics.Stage("predict", "inference"):
+        return float(bundle.model.predict(test_df)[0]) # Return predicted as a float
+
+def EncodeFeatures(street_name: str, floor_area: int, storey_range: int, lease_start: int, flat_type: str, bundle: registry.ModelBundle = None) -> pd.DataFrame:
+    bundle = bundle or registry.GetRegistry().Live("current")
+    cols_street_name, cols_flat_type = bundle.cols_street_name, bundle.cols_flat_type
+    # query-string values arrive as text; the frame below is float64
+    floor_area, storey_range, lease_start = float(floor_area), float(storey_range), int(lease_start)
+    with metrics.Stage("predict", "one_hot"):
+        # get current year and month
+        year = datetime.date.today().year
+        month = datetime.date.today().month
+
+        # default flat age = 0
+        flat_age = 0
+        # calculate remaining_lease and flat_age if lease_start is defined by user
+        if lease_start > 0: 
+            flat_age = year - lease_start
+        
+        # default values for town and flat model
+        townList = [0] * len(cols_street_name)
+        flatTypeList = [0] * len(cols_flat_type)
+        # HDB town of the street, for town-level features
+        town = None
+        
+        if street_name != "": 
+            parsed_street_name = map_street_name(street_name, bundle.street_resolver)
+            town = dimensions.GetDimensions().StreetTown(parsed_street_name.replace("street_name_", "", 1))
+            # check if street name exists in the json file
+            if parsed_street_name in cols_street_name:
+                # get the index of the street name in the json file
+                index = cols_street_name.get(parsed_street_name)
+                # set the corresponding town to 1
+                townList[index] = 1
+            else:
+                current_app.logger.warning(f"Street name {parsed_street_name} not found in the json file")
+        
+        if flat_type != "":
+            parsed_flat_type = map_flat_type(flat_type)
+            if parsed_flat_type in cols_flat_type:
+                # get the index of the flat type in the json file
+                index = cols_flat_type.get(parsed_flat_type)
+                # set the corresponding flat type to 1
+                flatTypeList[index] = 1
+            else:
+                current_app.logger.warning(f"Flat type {parsed_flat_type} not found in the json file")
+
+    with metrics.Stage("predict", "build_frame"):
+        # Create a zero-filled DataFrame with the training columns of this version
+        test_df = pd.DataFrame(0.0, index=[0], columns=bundle.columns)
+        # Fill in the values for your input data by column name, so one-hot columns appended by
+        # incremental updates line up with their json index
+        test_df.loc[0, ["month", "floor_area_sqm", "lease_commence_date", "year", "storey_median", "flat_age"]] = [month,floor_area,lease_start,year,storey_range,flat_age]
+        test_df.loc[0, list(cols_street_name)] = townList
+        test_df.loc[0, list(cols_flat_type)] = flatTypeList
+        # models trained with feature store columns get them as known this month
+        store_columns = [column for column in test_df.columns if column in feature_store.FEATURES]
+        if store_columns:
+            features = feature_store.GetFeatureStore().Lookup(town, f"{year}-{month:02d}")
+            test_df.loc[0, store_columns] = [features[column] for column in store_columns]
+    return test_df
+
+def BatchFrame(rows: list, bundle: registry.ModelBundle, year: int, month: int) -> pd.DataFrame:
+    # the inputs EncodeFeatures builds per request for many NormalizeInputs rows, as one frame
+    lease_start = np.array([row["lease_start"] for row in rows], dtype=np.int64)
+    frame = pd.DataFrame({
+        "month": month,
+        "year": year,
+        "floor_area_sqm": np.array([row["floor_area"] for row in rows], dtype=np.float32),
+        "lease_commence_date": lease_start,
+        "storey_median": np.array([row["storey_range"] for row in rows], dtype=np.float32),
+        # flat age stays 0 when no lease start was given
+        "flat_age": np.where(lease_start > 0, year - lease_start, 0).astype(np.float32),
+        "street_name": [row["street_name"] for row in rows],
+        # EncodeFeatures only sets a flat type whose column matches exactly, so no lenient match here either
+        "flat_type": [row["flat_type"] if map_flat_type(row["flat_type"]) in bundle.cols_flat_type else "" for row in rows],
+    })
+    schema = bundle.Schema()
+    if any(column in feature_store.FEATURES for column in schema.numeric_columns):
+        # town of each distinct street, for town-level feature store columns
+        towns = {}
+        for street_name in frame["street_name"].unique():
+            resolved, _, _ = schema.resolver.Resolve(street_name)
+            towns[street_name] = dimensions.GetDimensions().StreetTown(resolved) if resolved is not None else None
+        frame["town"] = frame["street_name"].map(towns)
+    return frame
+
+def EncodeBatch(rows: list, bundle: registry.ModelBundle, endpoint: str = "predict_batch", as_of: datetime.date = None):
+    # scaled model input for many rows at this month (or as_of's): CSR for sparse-trained models, dense otherwise
+    as_of = as_of or datetime.date.today()
+    with metrics.Stage(endpoint, "encode"):
+        frame = BatchFrame(rows, bundle, as_of.year, as_of.month)
+        return bundle.Schema().EncodeScaled(frame, bundle.scaler, bundle.sparse_input)
+
+def PredictBatch(rows: list, bundle: registry.ModelBundle, endpoint: str = "predict_batch", as_of: datetime.date = None, deadline: float = None) -> np.ndarray:
+    # one price per row from a single booster call, the same values PredictPrice gives one by one
+    admission.CheckDeadline("encode", deadline)
+    matrix = EncodeBatch(rows, bundle, endpoint, as_of)
+    admission.CheckDeadline("inference", deadline)
+    with metrics.Stage(endpoint, "inference"):
+        return bundle.model.get_booster().inplace_predict(matrix, missing=SPARSE_MISSING if bundle.sparse_input else np.nan)
 
 def TestPredictPrice() -> int:
     try:
@@ -94,8 +171,11 @@ def TestPredictPrice() -> int:
         current_app.logger.error(f"Error in TestPredictPrice: {str(e)}")
         return str(e)
 
-def map_street_name(street_name: str) -> str:
-    return "street_name_" + street_name
+def map_street_name(street_name: str, street_resolver) -> str:
+    # resolve abbreviations and typos to the spelling used in the model columns
+    resolved, method, _ = street_resolver.Resolve(street_name)
+    metrics.RecordStreetResolution(method)
+    return "street_name_" + (resolved or street_name)
 
 def map_flat_type(flat_type: str) -> str:
     return "flat_type_" + flat_type
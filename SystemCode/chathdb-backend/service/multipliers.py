@@ -0,0 +1,49 @@
+import os
+import threading
+import polars as pl
+from . import http_cache
+
+# Town adjustment factors written by lib/multiplier/multiplier.py: news sentiment, Google Trends and
+# economic factors per town, each scaled to [-0.03, 0.03]. A town's multiplier is the product of
+# (1 + factor) over the three, and 1.0 for towns without factors.
+MULTIPLIER_FILE = "static/data/multiplier/adjustment_factors_by_town_final.csv"
+FACTORS = {"gnews": "adj_factor_gnews", "gtrend": "adj_factor_gtrend", "econ": "adj_factor_econ"}
+
+class TownMultipliers:
+    # Factors of every town in one version of the file.
+
+    def __init__(self, factors: dict, version: str = None):
+        self.factors, self.version = factors, version
+
+    @classmethod
+    def Load(cls, filepath: str = MULTIPLIER_FILE, version: str = None):
+        if not os.path.exists(filepath):
+            return cls({}, version)
+        frame = pl.read_csv(filepath)
+        factors = {
+            row["town"]: {name: float(row[column] or 0.0) for name, column in FACTORS.items()}
+            for row in frame.iter_rows(named=True)
+        }
+        return cls(factors, version)
+
+    def Factors(self, town: str) -> dict:
+        return self.factors.get(town, {name: 0.0 for name in FACTORS})
+
+    def Multiplier(self, town: str) -> float:
+        multiplier = 1.0
+        for factor in self.Factors(town).values():
+            multiplier *= 1.0 + factor
+        return multiplier
+
+_multipliers = None
+_multipliers_lock = threading.Lock()
+
+def GetMultipliers() -> TownMultipliers:
+    # loaded on first use and reloaded when the multiplier stage rewrites the file
+    global _multipliers
+    version = http_cache.ArtifactVersion([MULTIPLIER_FILE])
+    if _multipliers is None or _multipliers.version != version:
+        with _multipliers_lock:
+            if _multipliers is None or _multipliers.version != version:
+                _multipliers = TownMultipliers.Load(version=version)
+    return _multipliers
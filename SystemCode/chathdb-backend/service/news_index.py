@@ -0,0 +1,233 @@
+import datetime
+import math
+import os
+import re
+import threading
+from collections import Counter
+import numpy as np
+import polars as pl
+from . import http_cache, schema
+from .market_signals import SENTIMENTS
+
+# BM25 full-text index over the scraped GNews headlines, built by lib/datahub/build_news_index.py.
+# Everything lives in one .npz file, replaced atomically on each build:
+#   titles        utf-8 titles concatenated, title_offsets marks where each one starts
+#   towns         code in schema.TOWNS, month_keys, labels (-1/0/1), scores (NaN until scored)
+#   lengths       tokens per headline
+#   terms         sorted vocabulary; postings of terms[i] are doc_ids/tfs[indptr[i]:indptr[i + 1]]
+# Builds are incremental: headlines already in the index are not tokenized again, and sentiment
+# from the scored file is attached to every headline on each build.
+NEWS_INDEX_FILE = "static/data/gnews/index/news_index.npz"
+GNEWS_FILE = "static/data/gnews/parsed/consolidated_gnews.parquet"
+SCORED_GNEWS_FILE = "static/data/gnews/parsed/scored_consolidated_gnews.parquet"
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+STOPWORDS = frozenset(
+    "a an and are as at be been by for from has have how in into is it its of on or that the their this to was were what when where which who why will with".split()
+)
+# BM25 parameters
+K1 = 1.2
+B = 0.75
+
+def Tokenize(text: str) -> list:
+    # lowercase words without stopwords, with a plural "s" dropped so "delays" finds "delay"
+    tokens = []
+    for token in TOKEN_PATTERN.findall(text.lower()):
+        if token in STOPWORDS:
+            continue
+        if len(token) > 3 and token.endswith("s") and not token.endswith("ss"):
+            token = token[:-1]
+        tokens.append(token)
+    return tokens
+
+def _Postings(term_ids: np.ndarray, doc_ids: np.ndarray, tfs: np.ndarray, term_count: int):
+    # (indptr, doc_ids, tfs) ordered by term, then document
+    order = np.lexsort((doc_ids, term_ids))
+    indptr = np.zeros(term_count + 1, dtype=np.int64)
+    np.cumsum(np.bincount(term_ids, minlength=term_count), out=indptr[1:])
+    return indptr, doc_ids[order].astype(np.uint32), tfs[order].astype(np.uint16)
+
+class NewsIndex:
+    # Headlines with their postings, searched with BM25.
+
+    def __init__(self, arrays: dict, version: str = None):
+        self.version = version
+        self.title_offsets = arrays["title_offsets"]
+        self.titles_blob = arrays["titles"].tobytes()
+        self.towns = arrays["towns"]
+        self.month_keys = arrays["month_keys"]
+        self.labels = arrays["labels"]
+        self.scores = arrays["scores"]
+        self.lengths = arrays["lengths"]
+        self.terms = arrays["terms"]
+        self.indptr = arrays["indptr"]
+        self.doc_ids = arrays["doc_ids"]
+        self.tfs = arrays["tfs"]
+        self.term_index = {term: i for i, term in enumerate(self.terms.tolist())}
+        self.average_length = float(self.lengths.mean()) if len(self.lengths) else 0.0
+
+    @classmethod
+    def Empty(cls):
+        return cls({
+            "titles": np.zeros(0, dtype=np.uint8), "title_offsets": np.zeros(1, dtype=np.int64),
+            "towns": np.zeros(0, dtype=np.int16), "month_keys": np.zeros(0, dtype=np.int32),
+            "labels": np.zeros(0, dtype=np.int8), "scores": np.zeros(0, dtype=np.float32),
+            "lengths": np.zeros(0, dtype=np.uint16), "terms": np.zeros(0, dtype="<U1"),
+            "indptr": np.zeros(1, dtype=np.int64), "doc_ids": np.zeros(0, dtype=np.uint32), "tfs": np.zeros(0, dtype=np.uint16),
+        })
+
+    @classmethod
+    def Load(cls, filepath: str = NEWS_INDEX_FILE, version: str = None):
+        with np.load(filepath, allow_pickle=False) as arrays:
+            return cls({name: arrays[name] for name in arrays.files}, version)
+
+    def __len__(self):
+        return len(self.lengths)
+
+    def Title(self, doc_id: int) -> str:
+        return self.titles_blob[self.title_offsets[doc_id]:self.title_offsets[doc_id + 1]].decode("utf-8")
+
+    def Keys(self) -> list:
+        # (title, town code, month_key) of every headline in doc_id order
+        return [(self.Title(i), int(self.towns[i]), int(self.month_keys[i])) for i in range(len(self))]
+
+    def Search(self, query: str, k: int = 10, towns: list = None, month_from: int = None, month_to: int = None) -> dict:
+        # top k headlines by BM25, restricted to towns (schema.TOWNS names) and a month_key range
+        term_ids = sorted({self.term_index[token] for token in Tokenize(query) if token in self.term_index})
+        if not term_ids or not len(self):
+            return {"matches": 0, "results": []}
+        allowed = np.ones(len(self), dtype=bool)
+        if towns:
+            allowed &= np.isin(self.towns, [schema.TOWNS.index(town) for town in towns if town in schema.TOWNS])
+        if month_from is not None:
+            allowed &= self.month_keys >= month_from
+        if month_to is not None:
+            allowed &= self.month_keys <= month_to
+
+        relevance = np.zeros(len(self), dtype=np.float64)
+        for term_id in term_ids:
+            start, end = self.indptr[term_id], self.indptr[term_id + 1]
+            doc_ids = self.doc_ids[start:end]
+            tfs = self.tfs[start:end].astype(np.float64)
+            idf = math.log(1 + (len(self) - len(doc_ids) + 0.5) / (len(doc_ids) + 0.5))
+            norm = K1 * (1 - B + B * self.lengths[doc_ids] / self.average_length)
+            relevance[doc_ids] += idf * tfs * (K1 + 1) / (tfs + norm)
+        relevance[~allowed] = 0
+        matched = np.flatnonzero(relevance)
+        top = matched[np.argsort(-relevance[matched], kind="stable")[:k]]
+        return {
+            "matches": int(len(matched)),
+            "results": [
+                {
+                    "title": self.Title(doc_id),
+                    "town": schema.TOWNS[self.towns[doc_id]],
+                    "month": schema.MonthFromKey(int(self.month_keys[doc_id])),
+                    # headlines the sentiment stage has not scored yet have no score
+                    "sentiment": SENTIMENTS.get(int(self.labels[doc_id])) if not np.isnan(self.scores[doc_id]) else None,
+                    "score": round(float(self.scores[doc_id]), 4) if not np.isnan(self.scores[doc_id]) else None,
+                    "relevance": round(float(relevance[doc_id]), 4),
+                }
+                for doc_id in top
+            ],
+        }
+
+def _Headlines(gnews_path: str) -> pl.DataFrame:
+    frame = schema.Scan(gnews_path).select(
+        pl.col("title").cast(pl.Utf8), pl.col("town").cast(pl.Utf8), pl.col("month_key").cast(pl.Int32),
+    ).collect()
+    return frame.filter(pl.col("town").is_in(schema.TOWNS)).unique(maintain_order=True)
+
+def _Sentiment(scored_path: str) -> dict:
+    # (title, town code, month_key) -> (label, score)
+    if not os.path.exists(scored_path):
+        return {}
+    frame = schema.Scan(scored_path).select(
+        pl.col("title").cast(pl.Utf8), pl.col("town").cast(pl.Utf8), pl.col("month_key"), pl.col("label"), pl.col("score"),
+    ).collect()
+    return {
+        (title, schema.TOWNS.index(town), month_key): (label, score)
+        for title, town, month_key, label, score in frame.iter_rows() if town in schema.TOWNS
+    }
+
+def Update(index_path: str = NEWS_INDEX_FILE, gnews_path: str = GNEWS_FILE, scored_path: str = SCORED_GNEWS_FILE) -> dict:
+    # add headlines not in the index yet and write it back; returns build stats
+    index = NewsIndex.Load(index_path) if os.path.exists(index_path) else NewsIndex.Empty()
+    keys = index.Keys()
+    known = set(keys)
+    headlines = _Headlines(gnews_path)
+    new = [
+        (title, schema.TOWNS.index(town), month_key) for title, town, month_key in headlines.iter_rows()
+        if (title, schema.TOWNS.index(town), month_key) not in known
+    ]
+
+    # existing postings as (term, doc, tf) triples, extended with the new headlines'
+    vocabulary = index.terms.tolist()
+    term_index = dict(index.term_index)
+    term_ids = [np.repeat(np.arange(len(vocabulary)), np.diff(index.indptr))]
+    doc_ids, tfs = [index.doc_ids.astype(np.int64)], [index.tfs.astype(np.int64)]
+    lengths = [index.lengths]
+    new_terms, new_docs, new_tfs, new_lengths = [], [], [], []
+    for offset, (title, _, _) in enumerate(new):
+        tokens = Tokenize(title)
+        new_lengths.append(len(tokens))
+        for token, count in Counter(tokens).items():
+            if token not in term_index:
+                term_index[token] = len(vocabulary)
+                vocabulary.append(token)
+            new_terms.append(term_index[token])
+            new_docs.append(len(index) + offset)
+            new_tfs.append(count)
+    term_ids.append(np.array(new_terms, dtype=np.int64))
+    doc_ids.append(np.array(new_docs, dtype=np.int64))
+    tfs.append(np.array(new_tfs, dtype=np.int64))
+    lengths.append(np.array(new_lengths, dtype=np.uint16))
+
+    # terms are stored sorted, so renumber them
+    order = np.argsort(np.array(vocabulary, dtype=str), kind="stable")
+    renumber = np.empty(len(vocabulary), dtype=np.int64)
+    renumber[order] = np.arange(len(vocabulary))
+    indptr, all_doc_ids, all_tfs = _Postings(renumber[np.concatenate(term_ids)], np.concatenate(doc_ids), np.concatenate(tfs), len(vocabulary))
+
+    titles = [index.titles_blob] + [title.encode("utf-8") for title, _, _ in new]
+    title_lengths = [len(blob) for blob in titles[1:]]
+    title_offsets = np.concatenate([index.title_offsets, index.title_offsets[-1] + np.cumsum(title_lengths, dtype=np.int64)])
+    towns = np.concatenate([index.towns, np.array([town for _, town, _ in new], dtype=np.int16)])
+    month_keys = np.concatenate([index.month_keys, np.array([month_key for _, _, month_key in new], dtype=np.int32)])
+    # sentiment is refreshed for every headline, as scoring runs after scraping
+    sentiment = _Sentiment(scored_path)
+    keys += new
+    labels = np.array([sentiment.get(key, (0, np.nan))[0] for key in keys], dtype=np.int8)
+    scores = np.array([sentiment.get(key, (0, np.nan))[1] for key in keys], dtype=np.float32)
+
+    os.makedirs(os.path.dirname(index_path) or ".", exist_ok=True)
+    # written next to the index and swapped in, so the service never reads a partial file
+    temporary = index_path + ".tmp.npz"
+    np.savez(
+        temporary,
+        titles=np.frombuffer(b"".join(titles), dtype=np.uint8), title_offsets=title_offsets,
+        towns=towns, month_keys=month_keys, labels=labels, scores=scores, lengths=np.concatenate(lengths),
+        terms=np.array(vocabulary, dtype=str)[order], indptr=indptr, doc_ids=all_doc_ids, tfs=all_tfs,
+    )
+    os.replace(temporary, index_path)
+    return {
+        "built_at": datetime.datetime.now().isoformat(timespec="seconds"),
+        "headlines": len(keys),
+        "added": len(new),
+        "terms": len(vocabulary),
+        "postings": int(len(all_doc_ids)),
+        "scored": int(sum(key in sentiment for key in keys)),
+        "bytes": os.path.getsize(index_path),
+    }
+
+_index = None
+_index_lock = threading.Lock()
+
+def GetNewsIndex() -> NewsIndex:
+    # loaded on first use and reloaded when a build replaces the file
+    global _index
+    version = http_cache.ArtifactVersion([NEWS_INDEX_FILE])
+    if _index is None or _index.version != version:
+        with _index_lock:
+            if _index is None or _index.version != version:
+                _index = NewsIndex.Load(version=version) if os.path.exists(NEWS_INDEX_FILE) else NewsIndex.Empty()
+                _index.version = version
+    return _index
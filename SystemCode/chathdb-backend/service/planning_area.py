@@ -0,0 +1,141 @@
+import json
+import numpy as np
+import pandas as pd
+from . import dimensions
+
+# Point to planning area lookup over the URA 2024 planning area boundaries.
+# Every boundary ring is flattened into one edge table. A grid over the island answers points in
+# cells no boundary passes through directly; other points ray-cast only against the edges in their
+# latitude band that reach east of them (tens of edges instead of ~40k).
+PLANNING_AREA_FILE = "static/data/planning_area/planning_area_2024.parquet"
+
+def PlanningAreaToTown(planning_area: str):
+    # HDB town for a planning area, None when the area has no HDB town
+    return dimensions.GetDimensions().PlanningAreaToTown(planning_area)
+
+class PlanningAreaIndex:
+
+    def __init__(self, names: list, geometries: list, bands: int = 256):
+        # the grid has `bands` rows (latitude) and as many columns (longitude)
+        self.names = list(names)
+        self.towns = [PlanningAreaToTown(name) for name in self.names]
+        x1, y1, x2, y2, owners = [], [], [], [], []
+        for area_id, geometry in enumerate(geometries):
+            polygons = geometry["coordinates"] if geometry["type"] == "MultiPolygon" else [geometry["coordinates"]]
+            for polygon in polygons:
+                # outer ring and holes alike: even-odd crossings handle holes
+                for ring in polygon:
+                    ring = np.asarray(ring, dtype=np.float64)[:, :2]
+                    x1.append(ring[:-1, 0])
+                    y1.append(ring[:-1, 1])
+                    x2.append(ring[1:, 0])
+                    y2.append(ring[1:, 1])
+                    owners.append(np.full(len(ring) - 1, area_id, dtype=np.int32))
+        self.x1, self.y1 = np.concatenate(x1), np.concatenate(y1)
+        self.x2, self.y2 = np.concatenate(x2), np.concatenate(y2)
+        self.owner = np.concatenate(owners)
+        # x of the edge at a given y is x1 + (y - y1) * slope; horizontal edges never cross a ray
+        with np.errstate(divide="ignore", invalid="ignore"):
+            self.slope = np.where(self.y2 != self.y1, (self.x2 - self.x1) / (self.y2 - self.y1), 0.0)
+
+        self.min_x, self.max_x = float(min(self.x1.min(), self.x2.min())), float(max(self.x1.max(), self.x2.max()))
+        self.min_y, self.max_y = float(min(self.y1.min(), self.y2.min())), float(max(self.y1.max(), self.y2.max()))
+        self.bands = bands
+        self.band_height = (self.max_y - self.min_y) / bands
+        low = np.clip(((np.minimum(self.y1, self.y2) - self.min_y) / self.band_height).astype(int), 0, bands - 1)
+        high = np.clip(((np.maximum(self.y1, self.y2) - self.min_y) / self.band_height).astype(int), 0, bands - 1)
+        members = [[] for _ in range(bands)]
+        for edge, (start, end) in enumerate(zip(low, high)):
+            for band in range(start, end + 1):
+                members[band].append(edge)
+        # within a band, edges are ordered by their east-most x so the edges a ray going east
+        # can hit are a prefix found by binary search
+        east = np.maximum(self.x1, self.x2)
+        self.band_edges, self.band_east = [], []
+        for edges in members:
+            edges = np.asarray(edges, dtype=np.int64)
+            edges = edges[np.argsort(-east[edges], kind="stable")] if len(edges) else edges
+            self.band_edges.append(edges)
+            self.band_east.append(-east[edges])
+
+        # cells no edge touches lie wholly inside one area (or none): -2 marks cells that need ray casting
+        self.cell_width = (self.max_x - self.min_x) / bands
+        west_cell = np.clip(((np.minimum(self.x1, self.x2) - self.min_x) / self.cell_width).astype(int), 0, bands - 1)
+        east_cell = np.clip(((east - self.min_x) / self.cell_width).astype(int), 0, bands - 1)
+        mixed = np.zeros((bands, bands), dtype=bool)
+        for row_start, row_end, col_start, col_end in zip(low, high, west_cell, east_cell):
+            mixed[row_start:row_end + 1, col_start:col_end + 1] = True
+        self.cells = np.full((bands, bands), -2, dtype=np.int16)
+        rows, cols = np.nonzero(~mixed)
+        centre_lats = self.min_y + (rows + 0.5) * self.band_height
+        centre_lngs = self.min_x + (cols + 0.5) * self.cell_width
+        self.cells[rows, cols] = self._RayCast(centre_lats, centre_lngs, np.arange(len(rows)))
+
+    @classmethod
+    def FromParquet(cls, filepath: str = PLANNING_AREA_FILE):
+        df = pd.read_parquet(filepath)
+        return cls(df["pln_area_n"].tolist(), [json.loads(geojson) for geojson in df["geojson"]])
+
+    def Lookup(self, lat: float, lng: float):
+        # planning area name containing the point, None when outside every area
+        if not (self.min_y <= lat <= self.max_y and self.min_x <= lng <= self.max_x):
+            return None
+        band = min(int((lat - self.min_y) / self.band_height), self.bands - 1)
+        area_id = self.cells[band, min(int((lng - self.min_x) / self.cell_width), self.bands - 1)]
+        if area_id == -2:
+            count = np.searchsorted(self.band_east[band], -lng, side="right")
+            edges = self.band_edges[band][:count]
+            crosses = ((self.y1[edges] > lat) != (self.y2[edges] > lat)) & (lng < self.x1[edges] + (lat - self.y1[edges]) * self.slope[edges])
+            inside = np.flatnonzero(np.bincount(self.owner[edges[crosses]], minlength=len(self.names)) & 1)
+            area_id = inside[0] if len(inside) else -1
+        return self.names[area_id] if area_id >= 0 else None
+
+    def LookupTown(self, lat: float, lng: float):
+        area = self.Lookup(lat, lng)
+        return PlanningAreaToTown(area) if area else None
+
+    def BulkLookup(self, lats, lngs) -> np.ndarray:
+        # area id per point (-1 outside every area)
+        lats = np.asarray(lats, dtype=np.float64)
+        lngs = np.asarray(lngs, dtype=np.float64)
+        result = np.full(len(lats), -1, dtype=np.int32)
+        within = np.flatnonzero((lats >= self.min_y) & (lats <= self.max_y) & (lngs >= self.min_x) & (lngs <= self.max_x))
+        rows = np.minimum(((lats[within] - self.min_y) / self.band_height).astype(int), self.bands - 1)
+        cols = np.minimum(((lngs[within] - self.min_x) / self.cell_width).astype(int), self.bands - 1)
+        cell_ids = self.cells[rows, cols]
+        result[within] = cell_ids
+        mixed = within[cell_ids == -2]
+        if len(mixed):
+            result[mixed] = self._RayCast(lats, lngs, mixed)
+        return result
+
+    def _RayCast(self, lats: np.ndarray, lngs: np.ndarray, point_ids: np.ndarray, block: int = 4096) -> np.ndarray:
+        # even-odd test for many points: group by band, then crossings per area as a matrix product
+        found = np.full(len(point_ids), -1, dtype=np.int32)
+        bands = np.minimum(((lats[point_ids] - self.min_y) / self.band_height).astype(int), self.bands - 1)
+        order = np.argsort(bands, kind="stable")
+        boundaries = np.flatnonzero(np.diff(bands[order])) + 1
+        for group in np.split(order, boundaries):
+            if len(group) == 0:
+                continue
+            edges = self.band_edges[bands[group[0]]]
+            if len(edges) == 0:
+                continue
+            x1, y1, y2, slope = self.x1[edges], self.y1[edges], self.y2[edges], self.slope[edges]
+            owners = np.zeros((len(edges), len(self.names)), dtype=np.float32)
+            owners[np.arange(len(edges)), self.owner[edges]] = 1
+            for start in range(0, len(group), block):
+                positions = group[start:start + block]
+                lat = lats[point_ids[positions]][:, None]
+                lng = lngs[point_ids[positions]][:, None]
+                crossing = ((y1 > lat) != (y2 > lat)) & (lng < x1 + (lat - y1) * slope)
+                odd = (crossing.astype(np.float32) @ owners).astype(np.int32) & 1
+                hit = odd.any(axis=1)
+                found[positions[hit]] = odd[hit].argmax(axis=1)
+        return found
+
+    def BulkLookupNames(self, lats, lngs) -> list:
+        return [self.names[i] if i >= 0 else None for i in self.BulkLookup(lats, lngs)]
+
+    def BulkLookupTowns(self, lats, lngs) -> list:
+        return [self.towns[i] if i >= 0 else None for i in self.BulkLookup(lats, lngs)]
@@ -0,0 +1,87 @@
+import datetime
+import json
+import os
+import threading
+from collections import Counter, OrderedDict
+from . import metrics
+
+# Server-side cache of /predict prices, keyed by model and feature store version (model.CacheVersion),
+# month and normalized inputs. The current month is a model feature, so every entry goes stale at
+# month end and after each deploy; the cache also counts how often each input is requested, so
+# service/warmup.py can score the most popular ones ahead of those moments.
+PREDICTION_CACHE_SIZE = int(os.environ.get("PREDICTION_CACHE_SIZE", 20000))
+# distinct inputs counted; beyond this every count is halved and the ones reaching 0 forgotten,
+# so the counts favour recent traffic
+TRACKED_INPUTS = int(os.environ.get("PREDICTION_TRACKED_INPUTS", 50000))
+
+def Month(as_of: datetime.date = None) -> str:
+    as_of = as_of or datetime.date.today()
+    return f"{as_of.year}-{as_of.month:02d}"
+
+def InputsKey(inputs: dict) -> str:
+    return json.dumps(inputs, sort_keys=True)
+
+class PredictionCache:
+    # LRU of prices plus request counts per normalized input.
+
+    def __init__(self, cache_size: int = PREDICTION_CACHE_SIZE, tracked: int = TRACKED_INPUTS):
+        self.cache_size, self.tracked = cache_size, tracked
+        self.cache = OrderedDict()
+        self.counts = Counter()
+        self.lock = threading.Lock()
+
+    def Key(self, cache_version: str, inputs: dict, month: str = None) -> tuple:
+        return cache_version, month or Month(), InputsKey(inputs)
+
+    def Track(self, inputs: dict, count: int = 1):
+        key = InputsKey(inputs)
+        with self.lock:
+            self.counts[key] += count
+            if len(self.counts) > self.tracked:
+                self.counts = Counter({item: value // 2 for item, value in self.counts.items() if value > 1})
+
+    def Popular(self, limit: int) -> list:
+        # (inputs, count) most requested first
+        with self.lock:
+            popular = self.counts.most_common(limit)
+        return [(json.loads(key), count) for key, count in popular]
+
+    def TotalCount(self) -> int:
+        with self.lock:
+            return sum(self.counts.values())
+
+    def Get(self, key: tuple, record: bool = True):
+        with self.lock:
+            price = self.cache.get(key)
+            if price is not None:
+                self.cache.move_to_end(key)
+            size = len(self.cache)
+        if record:
+            metrics.RecordCache("prediction", price is not None, size)
+        return price
+
+    def Contains(self, key: tuple) -> bool:
+        with self.lock:
+            return key in self.cache
+
+    def Put(self, key: tuple, price: float):
+        with self.lock:
+            self.cache[key] = price
+            self.cache.move_to_end(key)
+            while len(self.cache) > self.cache_size:
+                self.cache.popitem(last=False)
+
+    def Stats(self) -> dict:
+        with self.lock:
+            return {"entries": len(self.cache), "cache_size": self.cache_size, "tracked_inputs": len(self.counts)}
+
+_cache = None
+_cache_lock = threading.Lock()
+
+def GetPredictionCache() -> PredictionCache:
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = PredictionCache()
+    return _cache
@@ -0,0 +1,246 @@
+import atexit
+import datetime
+import json
+import os
+import queue
+import sqlite3
+import threading
+import time
+from . import metrics
+
+# Write-behind log of served predictions and the user metrics sent with them (static/userflow.md).
+# Handlers only push a record onto a bounded queue; a background thread drains it and writes in
+# bulk, so a slow or unavailable database never adds latency to a prediction. When the queue is
+# full a record waits at most PREDICTION_LOG_BLOCK_MS and is then dropped and counted.
+ENABLED = os.environ.get("PREDICTION_LOG_ENABLED", "1") != "0"
+# sqlite:///relative/path.db locally; any other SQLAlchemy URL (e.g. the Supabase Postgres) in production
+PREDICTION_LOG_URL = os.environ.get("PREDICTION_LOG_URL", "sqlite:///static/data/prediction_log/predictions.db")
+QUEUE_SIZE = int(os.environ.get("PREDICTION_LOG_QUEUE_SIZE", 10000))
+BATCH_SIZE = int(os.environ.get("PREDICTION_LOG_BATCH_SIZE", 500))
+FLUSH_INTERVAL_SECONDS = float(os.environ.get("PREDICTION_LOG_FLUSH_SECONDS", 2))
+BLOCK_MS = float(os.environ.get("PREDICTION_LOG_BLOCK_MS", 0))
+SHUTDOWN_TIMEOUT_SECONDS = 10
+TABLE = "prediction_log"
+# column -> SQLite type
+COLUMNS = {
+    "logged_at": "TEXT",
+    "endpoint": "TEXT",
+    "street_name": "TEXT",
+    "floor_area": "REAL",
+    "storey_range": "REAL",
+    "lease_start": "INTEGER",
+    "flat_type": "TEXT",
+    "model_version": "TEXT",
+    "prediction": "TEXT",
+    "latency_ms": "REAL",
+    "client_id": "TEXT",
+    "user_agent": "TEXT",
+}
+
+def Record(endpoint: str, inputs: dict, prediction, model_version: str, latency_ms: float, client_id: str = None, user_agent: str = None) -> dict:
+    # one row; the prediction is stored as JSON since the future endpoint returns one price per month
+    return {
+        "logged_at": datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="milliseconds"),
+        "endpoint": endpoint,
+        "street_name": inputs.get("street_name"),
+        "floor_area": inputs.get("floor_area"),
+        "storey_range": inputs.get("storey_range"),
+        "lease_start": inputs.get("lease_start"),
+        "flat_type": inputs.get("flat_type"),
+        "model_version": model_version,
+        "prediction": json.dumps(prediction, sort_keys=True, default=str),
+        "latency_ms": round(latency_ms, 3),
+        "client_id": client_id,
+        "user_agent": user_agent,
+    }
+
+class SQLiteDriver:
+    # Local stand-in for the database, one connection owned by the writer thread.
+
+    def __init__(self, path: str):
+        self.path = path
+        self.connection = None
+
+    def _Connect(self):
+        if os.path.dirname(self.path):
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        self.connection = sqlite3.connect(self.path)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        columns = ", ".join(f"{name} {kind}" for name, kind in COLUMNS.items())
+        self.connection.execute(f"CREATE TABLE IF NOT EXISTS {TABLE} (id INTEGER PRIMARY KEY, {columns})")
+
+    def Write(self, records: list):
+        if self.connection is None:
+            self._Connect()
+        names = list(COLUMNS)
+        statement = f"INSERT INTO {TABLE} ({', '.join(names)}) VALUES ({', '.join('?' for _ in names)})"
+        with self.connection:
+            self.connection.executemany(statement, [[record.get(name) for name in names] for record in records])
+
+    def Close(self):
+        if self.connection is not None:
+            self.connection.close()
+            self.connection = None
+
+class SQLAlchemyDriver:
+    # Any database SQLAlchemy can reach; one executemany insert per batch.
+
+    def __init__(self, url: str):
+        self.url = url
+        self.engine = None
+        self.table = None
+
+    def _Connect(self):
+        import sqlalchemy
+        kinds = {"TEXT": sqlalchemy.Text, "REAL": sqlalchemy.Float, "INTEGER": sqlalchemy.Integer}
+        metadata = sqlalchemy.MetaData()
+        self.table = sqlalchemy.Table(
+            TABLE, metadata,
+            sqlalchemy.Column("id", sqlalchemy.Integer, primary_key=True),
+            *[sqlalchemy.Column(name, kinds[kind]) for name, kind in COLUMNS.items()],
+        )
+        self.engine = sqlalchemy.create_engine(self.url, pool_pre_ping=True)
+        metadata.create_all(self.engine)
+
+    def Write(self, records: list):
+        if self.engine is None:
+            self._Connect()
+        with self.engine.begin() as connection:
+            connection.execute(self.table.insert(), records)
+
+    def Close(self):
+        if self.engine is not None:
+            self.engine.dispose()
+            self.engine = None
+
+def Driver(url: str):
+    # sqlite:/// paths use the standard library driver, everything else goes through SQLAlchemy
+    if url.startswith("sqlite:///"):
+        return SQLiteDriver(url[len("sqlite:///"):])
+    return SQLAlchemyDriver(url)
+
+def PopularInputs(endpoint: str, limit: int, url: str = PREDICTION_LOG_URL) -> list:
+    # (inputs, count) of the most logged requests of an endpoint, read on a connection of its own
+    names = ["street_name", "floor_area", "storey_range", "lease_start", "flat_type"]
+    statement = (
+        f"SELECT {', '.join(names)}, COUNT(*) AS requests FROM {TABLE} WHERE endpoint = :endpoint "
+        f"GROUP BY {', '.join(names)} ORDER BY requests DESC LIMIT :limit"
+    )
+    if url.startswith("sqlite:///"):
+        path = url[len("sqlite:///"):]
+        if not os.path.exists(path):
+            return []
+        connection = sqlite3.connect(path)
+        try:
+            rows = connection.execute(statement, {"endpoint": endpoint, "limit": limit}).fetchall()
+        finally:
+            connection.close()
+    else:
+        import sqlalchemy
+        engine = sqlalchemy.create_engine(url)
+        try:
+            with engine.connect() as connection:
+                rows = connection.execute(sqlalchemy.text(statement), {"endpoint": endpoint, "limit": limit}).fetchall()
+        finally:
+            engine.dispose()
+    return [(dict(zip(names, row[:-1])), row[-1]) for row in rows]
+
+class PredictionLogger:
+    # Bounded queue drained by one writer thread; any object with Write(records) and Close() is a driver.
+
+    def __init__(self, driver, queue_size: int = QUEUE_SIZE, batch_size: int = BATCH_SIZE, flush_interval: float = FLUSH_INTERVAL_SECONDS, block_ms: float = BLOCK_MS):
+        self.driver = driver
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.block_seconds = block_ms / 1000
+        self.stopping = threading.Event()
+        self.counts = {"queued": 0, "written": 0, "dropped_full": 0, "dropped_error": 0}
+        self.counts_lock = threading.Lock()
+        self.worker = threading.Thread(target=self._Run, name="prediction-log", daemon=True)
+        self.worker.start()
+
+    def _Count(self, result: str, amount: int = 1):
+        with self.counts_lock:
+            self.counts[result] += amount
+        if result != "queued":
+            metrics.RecordPredictionLog(result, amount, self.queue.qsize())
+
+    def Log(self, record: dict) -> bool:
+        # never raises and never waits longer than block_ms; False when the record was dropped
+        if self.stopping.is_set():
+            self._Count("dropped_full")
+            return False
+        try:
+            if self.block_seconds > 0:
+                self.queue.put(record, timeout=self.block_seconds)
+            else:
+                self.queue.put_nowait(record)
+        except queue.Full:
+            self._Count("dropped_full")
+            return False
+        self._Count("queued")
+        return True
+
+    def _Drain(self, first: dict) -> list:
+        batch = [first]
+        while len(batch) < self.batch_size:
+            try:
+                batch.append(self.queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _Write(self, batch: list):
+        start = time.perf_counter()
+        try:
+            self.driver.Write(batch)
+            self._Count("written", len(batch))
+        except Exception as e:
+            # the batch is lost rather than retried, so a dead database cannot back the queue up
+            metrics.RecordError("prediction_log", e)
+            self._Count("dropped_error", len(batch))
+        metrics.RecordPredictionLogFlush(time.perf_counter() - start)
+
+    def _Run(self):
+        # waits up to flush_interval for the first record, then writes whatever else is queued with it
+        while not (self.stopping.is_set() and self.queue.empty()):
+            try:
+                first = self.queue.get(timeout=self.flush_interval)
+            except queue.Empty:
+                continue
+            self._Write(self._Drain(first))
+        self.driver.Close()
+
+    def Stats(self) -> dict:
+        with self.counts_lock:
+            counts = dict(self.counts)
+        return {**counts, "queue_depth": self.queue.qsize(), "queue_size": self.queue.maxsize}
+
+    def Close(self, timeout: float = SHUTDOWN_TIMEOUT_SECONDS) -> dict:
+        # stop accepting records and flush what is queued
+        self.stopping.set()
+        self.worker.join(timeout)
+        return self.Stats()
+
+_logger = None
+_logger_lock = threading.Lock()
+
+def GetPredictionLogger() -> PredictionLogger:
+    global _logger
+    if _logger is None:
+        with _logger_lock:
+            if _logger is None:
+                _logger = PredictionLogger(Driver(PREDICTION_LOG_URL))
+                atexit.register(_logger.Close)
+    return _logger
+
+def Log(endpoint: str, inputs: dict, prediction, model_version: str, latency_ms: float, client_id: str = None, user_agent: str = None) -> bool:
+    if not ENABLED:
+        return False
+    try:
+        return GetPredictionLogger().Log(Record(endpoint, inputs, prediction, model_version, latency_ms, client_id, user_agent))
+    except Exception as e:
+        # logging must never fail the prediction it records
+        metrics.RecordError("prediction_log", e)
+        return False
@@ -0,0 +1,70 @@
+import collections
+import datetime
+import os
+import sys
+import tempfile
+import threading
+import time
+
+# Optional sampling profiler for slow requests, off unless PROFILE_SLOW_MS is set.
+# Stacks are written in the folded format read by flamegraph.pl and speedscope.
+PROFILE_SLOW_MS = float(os.environ.get("PROFILE_SLOW_MS", "0"))
+PROFILE_INTERVAL_MS = float(os.environ.get("PROFILE_INTERVAL_MS", "5"))
+PROFILE_DIR = os.environ.get("PROFILE_DIR", os.path.join(tempfile.gettempdir(), "chathdb-profiles"))
+ENABLED = PROFILE_SLOW_MS > 0
+
+_active = {}  # thread id -> Counter of folded stacks
+_lock = threading.Lock()
+_sampler = None
+
+def _Fold(frame) -> str:
+    names = []
+    while frame is not None:
+        code = frame.f_code
+        names.append(f"{code.co_name} ({os.path.basename(code.co_filename)})")
+        frame = frame.f_back
+    return ";".join(reversed(names))
+
+def _Sample():
+    interval = PROFILE_INTERVAL_MS / 1000
+    while True:
+        time.sleep(interval)
+        with _lock:
+            targets = list(_active.items())
+        if not targets:
+            continue
+        frames = sys._current_frames()
+        for thread_id, stacks in targets:
+            frame = frames.get(thread_id)
+            if frame is not None:
+                stacks[_Fold(frame)] += 1
+
+def _EnsureSampler():
+    global _sampler
+    if _sampler is None:
+        with _lock:
+            if _sampler is None:
+                _sampler = threading.Thread(target=_Sample, name="chathdb-profiler", daemon=True)
+                _sampler.start()
+
+def Start() -> int:
+    # start sampling the calling thread
+    _EnsureSampler()
+    thread_id = threading.get_ident()
+    with _lock:
+        _active[thread_id] = collections.Counter()
+    return thread_id
+
+def Stop(thread_id: int, endpoint: str, elapsed: float):
+    # stop sampling, returns the written profile path if the request was slow
+    with _lock:
+        stacks = _active.pop(thread_id, None)
+    if not stacks or elapsed * 1000 < PROFILE_SLOW_MS:
+        return None
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    timestamp = datetime.datetime.now().strftime("%Y%m%d-%H%M%S-%f")
+    filepath = os.path.join(PROFILE_DIR, f"{endpoint}-{timestamp}-{int(elapsed * 1000)}ms.folded")
+    with open(filepath, "w") as openfile:
+        for stack, count in stacks.most_common():
+            openfile.write(f"{stack} {count}\n")
+    return filepath
@@ -0,0 +1,298 @@
+import contextlib
+import datetime
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+import pandas as pd
+from . import feature_store, http_cache, metrics
+from .features import FeatureSchema, UsesSparseInput
+from .streets import StreetResolver
+
+# Versioned model artifacts, swapped into the running service without a restart:
+#   <registry>/<model>/<version>/model.pkl, scaler.pkl, columns.csv, cols_street_name.json, cols_flat_type.json
+#   <registry>/<model>/<version>/manifest.json  files with their sha256, source and training run
+#   <registry>/<model>/LIVE                      name of the version the service serves
+# A model without a registry folder is served from its fixed paths in static/models, versioned by
+# the artifacts' stats. Requests hold a reference to one bundle for their whole duration, so a swap
+# never mixes the model of one version with the columns of another, and a replaced bundle is
+# released once its last request finishes.
+REGISTRY_DIR = "static/models/registry"
+LEGACY_DIR = "static/models"
+BUNDLE_FILES = {
+    "model": "model.pkl",
+    "scaler": "scaler.pkl",
+    "columns": "columns.csv",
+    "cols_street_name": "cols_street_name.json",
+    "cols_flat_type": "cols_flat_type.json",
+}
+# fixed artifact paths of each model, relative to static/models
+LEGACY_ARTIFACTS = {
+    "current": {
+        "model": "final_model.pkl",
+        "scaler": "final_scaler.pkl",
+        "columns": "data/model_input_sample.csv",
+        "cols_street_name": "data/cols_street_name.json",
+        "cols_flat_type": "data/cols_flat_type.json",
+    },
+    "future": {
+        "model": "final_model_future.pkl",
+        "scaler": "scaler_future.pkl",
+        "columns": "X_single_test_data_future.csv",
+        "cols_street_name": "data/future_cols_street_name.json",
+        "cols_flat_type": "data/future_cols_flat_type.json",
+    },
+}
+# seconds between checks of the LIVE pointers, 0 to only swap through the admin endpoint
+WATCH_SECONDS = float(os.environ.get("MODEL_WATCH_SECONDS", 5))
+
+def _ReadJson(filepath: str):
+    with open(filepath, "r") as openfile:
+        return json.load(openfile)
+
+def _Sha256(filepath: str) -> str:
+    digest = hashlib.sha256()
+    with open(filepath, "rb") as openfile:
+        for block in iter(lambda: openfile.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+class ModelBundle:
+    # One version's model, scaler and one-hot schema, loaded together.
+
+    def __init__(self, name: str, version: str, paths: dict, manifest: dict = None):
+        from .model import OpenPickle
+        self.name, self.version, self.paths, self.manifest = name, version, paths, manifest or {}
+        self.model = OpenPickle(paths["model"], "rb")
+        self.scaler = OpenPickle(paths["scaler"], "rb")
+        self.columns = list(pd.read_csv(paths["columns"], nrows=0).columns)
+        # a model trained with feature store columns cannot score without the store: fail while
+        # loading rather than on every request
+        if any(column in feature_store.FEATURES for column in self.columns):
+            feature_store.GetFeatureStore()
+        self.cols_street_name = _ReadJson(paths["cols_street_name"])
+        self.cols_flat_type = _ReadJson(paths["cols_flat_type"])
+        self.street_resolver = StreetResolver(name.replace("street_name_", "", 1) for name in self.cols_street_name)
+        self.sparse_input = UsesSparseInput(self.model)
+        self.schema = None
+        self.references = 0
+        self.retired = False
+        self.lock = threading.Lock()
+
+    def Schema(self) -> FeatureSchema:
+        # column layout for scoring many rows at once, built on first use
+        if self.schema is None:
+            self.schema = FeatureSchema(self.columns)
+        return self.schema
+
+    def Acquire(self):
+        with self.lock:
+            self.references += 1
+
+    def Release(self):
+        with self.lock:
+            self.references -= 1
+            reclaim = self.retired and self.references == 0
+        if reclaim:
+            self._Reclaim()
+
+    def Retire(self):
+        # called once the bundle is no longer live; freed now or when its last request ends
+        with self.lock:
+            self.retired = True
+            reclaim = self.references == 0
+        if reclaim:
+            self._Reclaim()
+
+    def _Reclaim(self):
+        self.model = self.scaler = None
+        metrics.RecordModelBundle(self.name, "reclaimed")
+
+class ModelRegistry:
+    # Live bundle per model, swapped atomically when its LIVE pointer or legacy artifacts change.
+
+    def __init__(self, root: str = REGISTRY_DIR, legacy_dir: str = LEGACY_DIR):
+        self.root, self.legacy_dir = root, legacy_dir
+        self.live = {}
+        self.lock = threading.Lock()
+        self.swap_lock = threading.Lock()
+        self.watcher = None
+
+    def _Source(self, name: str):
+        # (version, artifact paths, manifest) the model should be served from right now
+        version = LiveVersion(name, self.root)
+        if version is not None:
+            version_dir = os.path.join(self.root, name, version)
+            paths = {key: os.path.join(version_dir, filename) for key, filename in BUNDLE_FILES.items()}
+            return version, paths, _ReadJson(os.path.join(version_dir, "manifest.json"))
+        paths = {key: os.path.join(self.legacy_dir, filename) for key, filename in LEGACY_ARTIFACTS[name].items()}
+        return "legacy-" + http_cache.ArtifactVersion(list(paths.values())), paths, {}
+
+    def Refresh(self, name: str) -> bool:
+        # load the version the pointer names when it differs from the live one; True when swapped
+        version, paths, manifest = self._Source(name)
+        if name in self.live and self.live[name].version == version:
+            return False
+        with self.swap_lock:
+            current = self.live.get(name)
+            if current is not None and current.version == version:
+                return False
+            # loaded before the swap, so requests never wait on unpickling
+            start = time.perf_counter()
+            bundle = ModelBundle(name, version, paths, manifest)
+            with self.lock:
+                previous = self.live.get(name)
+                self.live[name] = bundle
+            metrics.RecordModelBundle(name, "loaded", time.perf_counter() - start)
+        if previous is not None:
+            previous.Retire()
+        return True
+
+    def Live(self, name: str) -> ModelBundle:
+        # the serving bundle, for lookups that do not span a whole request
+        if name not in self.live:
+            self.Refresh(name)
+        return self.live[name]
+
+    @contextlib.contextmanager
+    def Use(self, name: str):
+        # with registry.Use("current") as bundle: every stage of a request reads the same version
+        with self.lock:
+            bundle = self.live.get(name)
+            if bundle is not None:
+                bundle.Acquire()
+        if bundle is None:
+            self.Refresh(name)
+            with self.lock:
+                bundle = self.live[name]
+                bundle.Acquire()
+        try:
+            yield bundle
+        finally:
+            bundle.Release()
+
+    def Versions(self, name: str) -> list:
+        return Versions(name, self.root)
+
+    def Activate(self, name: str, version: str) -> bool:
+        # point LIVE at a published version (a rollback is activating an older one) and swap to it
+        Activate(name, version, self.root)
+        return self.Refresh(name)
+
+    def Status(self) -> dict:
+        with self.lock:
+            live = dict(self.live)
+        return {
+            name: {
+                "live": live[name].version if name in live else None,
+                "manifest": live[name].manifest if name in live else None,
+                "versions": self.Versions(name),
+            }
+            for name in LEGACY_ARTIFACTS
+        }
+
+    def _Watch(self):
+        while True:
+            time.sleep(WATCH_SECONDS)
+            for name in list(self.live):
+                try:
+                    self.Refresh(name)
+                except Exception as e:
+                    # a half-published or broken version keeps the old one live
+                    metrics.RecordError("model_registry", e)
+
+    def StartWatching(self):
+        if WATCH_SECONDS > 0 and self.watcher is None:
+            self.watcher = threading.Thread(target=self._Watch, name="model-registry-watch", daemon=True)
+            self.watcher.start()
+
+def Versions(name: str, root: str = REGISTRY_DIR) -> list:
+    model_dir = os.path.join(root, name)
+    if not os.path.isdir(model_dir):
+        return []
+    return sorted(entry for entry in os.listdir(model_dir) if os.path.isfile(os.path.join(model_dir, entry, "manifest.json")))
+
+def LiveVersion(name: str, root: str = REGISTRY_DIR):
+    # version LIVE points at, None while the model is served from static/models
+    pointer = os.path.join(root, name, "LIVE")
+    if not os.path.exists(pointer):
+        return None
+    with open(pointer, "r") as openfile:
+        return openfile.read().strip()
+
+def Activate(name: str, version: str, root: str = REGISTRY_DIR):
+    # running services swap to it on their next watch
+    if version not in Versions(name, root):
+        raise ValueError(f"Unknown {name} model version {version}")
+    _WritePointer(os.path.join(root, name), version)
+
+def _WritePointer(model_dir: str, version: str):
+    pointer = os.path.join(model_dir, "LIVE")
+    with open(pointer + ".tmp", "w") as openfile:
+        openfile.write(version)
+    os.replace(pointer + ".tmp", pointer)
+
+def Publish(name: str, artifacts: dict, root: str = REGISTRY_DIR, run: dict = None, activate: bool = True, keep: int = 5) -> dict:
+    # copy a model's artifacts (keys of BUNDLE_FILES -> paths) into a new version and optionally make it live
+    model_dir = os.path.join(root, name)
+    os.makedirs(model_dir, exist_ok=True)
+    # microseconds keep back-to-back publishes apart and versions sortable; a version another
+    # publish has already claimed is skipped
+    while True:
+        version = datetime.datetime.now().strftime("%Y%m%dT%H%M%S%f")
+        # written under a hidden name and renamed once complete, so the watcher never loads a partial version
+        version_dir = os.path.join(model_dir, "." + version)
+        if os.path.exists(os.path.join(model_dir, version)):
+            continue
+        try:
+            os.mkdir(version_dir)
+            break
+        except FileExistsError:
+            continue
+    try:
+        files = {}
+        for key, filename in BUNDLE_FILES.items():
+            target = os.path.join(version_dir, filename)
+            shutil.copyfile(artifacts[key], target)
+            files[filename] = {"sha256": _Sha256(target), "bytes": os.path.getsize(target), "source": os.path.abspath(artifacts[key])}
+        manifest = {
+            "model": name,
+            "version": version,
+            "published_at": datetime.datetime.now().isoformat(timespec="seconds"),
+            "files": files,
+            "run": run or {},
+        }
+        with open(os.path.join(version_dir, "manifest.json"), "w") as openfile:
+            json.dump(manifest, openfile, indent=4, default=str)
+        os.rename(version_dir, os.path.join(model_dir, version))
+    finally:
+        # a failed publish leaves no hidden version behind
+        if os.path.isdir(version_dir):
+            shutil.rmtree(version_dir, ignore_errors=True)
+    if activate:
+        _WritePointer(model_dir, version)
+
+    # drop the oldest versions, never the live one
+    live = LiveVersion(name, root)
+    versions = sorted(entry for entry in os.listdir(model_dir) if os.path.isdir(os.path.join(model_dir, entry)) and not entry.startswith("."))
+    for entry in versions[:-keep] if keep > 0 else []:
+        if entry != live:
+            shutil.rmtree(os.path.join(model_dir, entry))
+    return manifest
+
+def LegacyArtifacts(name: str, models_dir: str = LEGACY_DIR) -> dict:
+    return {key: os.path.join(models_dir, filename) for key, filename in LEGACY_ARTIFACTS[name].items()}
+
+_registry = None
+_registry_lock = threading.Lock()
+
+def GetRegistry() -> ModelRegistry:
+    global _registry
+    if _registry is None:
+        with _registry_lock:
+            if _registry is None:
+                _registry = ModelRegistry()
+                _registry.StartWatching()
+    return _registry
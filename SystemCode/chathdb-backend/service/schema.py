@@ -0,0 +1,111 @@
+import polars as pl
+
+# Column types shared by every dataset in static/data. Closed dimensions are Enums (a fixed,
+# sorted dictionary, so codes compare and sort like the strings and concatenate without a
+# string cache), open ones such as street names are Categoricals. Each dataset with a month
+# also carries month_key, an Int32 month ordinal (year * 12 + month - 1), so readers join,
+# filter and derive year/month on integers instead of re-parsing "YYYY-MM".
+TOWNS = [
+    "ANG MO KIO", "BEDOK", "BISHAN", "BUKIT BATOK", "BUKIT MERAH", "BUKIT PANJANG", "BUKIT TIMAH",
+    "CENTRAL AREA", "CHOA CHU KANG", "CLEMENTI", "GEYLANG", "HOUGANG", "JURONG EAST", "JURONG WEST",
+    "KALLANG/WHAMPOA", "LIM CHU KANG", "MARINE PARADE", "PASIR RIS", "PUNGGOL", "QUEENSTOWN", "SEMBAWANG",
+    "SENGKANG", "SERANGOON", "TAMPINES", "TENGAH", "TOA PAYOH", "WOODLANDS", "YISHUN",
+]
+# the rental data calls the central town by its planning region
+TOWN_ALIASES = {"CENTRAL": "CENTRAL AREA"}
+FLAT_TYPES = ["1 ROOM", "2 ROOM", "3 ROOM", "4 ROOM", "5 ROOM", "EXECUTIVE", "MULTI-GENERATION"]
+# three-storey ranges, and the five-storey ranges of older transactions
+STOREY_RANGES = sorted(
+    [f"{low:02d} TO {low + 2:02d}" for low in range(1, 50, 3)] + [f"{low:02d} TO {low + 4:02d}" for low in range(1, 37, 5)]
+)
+
+Town = pl.Enum(TOWNS)
+FlatType = pl.Enum(FLAT_TYPES)
+StoreyRange = pl.Enum(STOREY_RANGES)
+MonthKeyType = pl.Int32
+
+RESALE = {
+    "month": pl.Utf8,
+    "month_key": MonthKeyType,
+    "town": Town,
+    "flat_type": FlatType,
+    "block": pl.Categorical,
+    "street_name": pl.Categorical,
+    "storey_range": StoreyRange,
+    "floor_area_sqm": pl.Float32,
+    "flat_model": pl.Categorical,
+    "lease_commence_date": pl.Int16,
+    "remaining_lease": pl.Int16,
+    "resale_price": pl.Float32,
+}
+ECONOMIC = {"month": pl.Utf8, "month_key": MonthKeyType, "cpi": pl.Float32, "gdp": pl.Float32, "unemployment": pl.Float32}
+GTRENDS = {"gtrend_value": pl.Int16, "town": Town, "month": pl.Utf8, "month_key": MonthKeyType}
+GNEWS = {"title": pl.Utf8, "month": pl.Utf8, "month_key": MonthKeyType, "town": Town}
+GNEWS_SCORED = {**GNEWS, "label": pl.Int8, "score": pl.Float32}
+GNEWS_AGGREGATED = {"month": pl.Utf8, "month_key": MonthKeyType, "town": Town, "aggregated_score": pl.Float32, "mean_score": pl.Float32}
+RENTAL = {
+    "rent_approval_date": pl.Utf8,
+    "month_key": MonthKeyType,
+    "town": Town,
+    "block": pl.Categorical,
+    "street_name": pl.Categorical,
+    "flat_type": FlatType,
+    "median_monthly_rent": pl.Float32,
+}
+# yearly, national: Ministry of Manpower median gross monthly income of full-time employed residents
+MEDIAN_INCOME = {"year": pl.Int16, "med_income_incl_empcpf": pl.Float32, "med_income_excl_empcpf": pl.Float32}
+AFFORDABILITY = {
+    "month": pl.Utf8,
+    "month_key": MonthKeyType,
+    "town": Town,
+    "flat_type": FlatType,
+    "transactions": pl.Int32,
+    "median_price": pl.Float32,
+    "model_price": pl.Float32,
+    "rentals": pl.Int32,
+    "median_rent": pl.Float32,
+    "income_year": pl.Int16,
+    "monthly_income": pl.Float32,
+    "price_to_income": pl.Float32,
+    "model_price_to_income": pl.Float32,
+    "rent_to_income": pl.Float32,
+    "model_version": pl.Utf8,
+}
+
+def MonthKey(month: str) -> int:
+    # "YYYY-MM" -> month ordinal
+    year, month = (int(part) for part in str(month).split("-")[:2])
+    return year * 12 + month - 1
+
+def MonthFromKey(key: int) -> str:
+    return f"{key // 12}-{key % 12 + 1:02d}"
+
+def MonthKeyExpr(column: str = "month") -> pl.Expr:
+    return (pl.col(column).str.slice(0, 4).cast(pl.Int32) * 12 + pl.col(column).str.slice(5, 2).cast(pl.Int32) - 1).alias("month_key")
+
+def YearExpr() -> pl.Expr:
+    return (pl.col("month_key") // 12).alias("year")
+
+def WithMonthKey(frame, column: str = "month"):
+    # add month_key to data written before the schema; frames that carry it are left as they are
+    names = frame.collect_schema().names() if isinstance(frame, pl.LazyFrame) else frame.columns
+    return frame if "month_key" in names else frame.with_columns(MonthKeyExpr(column))
+
+def Apply(frame, schema: dict, month_column: str = "month"):
+    # cast a frame (eager or lazy) to a dataset schema, deriving month_key from month_column;
+    # values outside an Enum fail the cast rather than being written as nulls; yearly datasets have no month_key
+    if "month_key" in schema:
+        frame = WithMonthKey(frame, month_column)
+    if "town" in schema:
+        frame = frame.with_columns(pl.col("town").replace(TOWN_ALIASES))
+    return frame.select([pl.col(column).cast(dtype) for column, dtype in schema.items()])
+
+def Scan(filepath: str) -> pl.LazyFrame:
+    # lazy reader for any dataset, with month_key whether or not it was written with the schema
+    frame = pl.scan_parquet(filepath)
+    names = frame.collect_schema().names()
+    return WithMonthKey(frame) if "month" in names else frame
+
+def ReadColumns(columns: list, available) -> list:
+    # columns to read from a dataset, plus month_key when it was written with the schema
+    return list(columns) + (["month_key"] if "month_key" in available and "month_key" not in columns else [])
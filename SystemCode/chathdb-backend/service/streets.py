@@ -0,0 +1,152 @@
+import bisect
+import re
+
+# HDB street names use short forms (BT BATOK ST 52, C'WEALTH AVE WEST). Every alias here maps to
+# the form found in the model column files; the frontend's own abbreviations (EST, WST, LK, UPR, LWR)
+# are mapped back so both spellings resolve to the same key.
+ABBREVIATIONS = {
+    "AVENUE": "AVE",
+    "ROAD": "RD",
+    "DRIVE": "DR",
+    "STREET": "ST",
+    "SAINT": "ST",
+    "NORTH": "NTH",
+    "SOUTH": "STH",
+    "EST": "EAST",
+    "WST": "WEST",
+    "CENTRAL": "CTRL",
+    "CENTRE": "CTR",
+    "CENTER": "CTR",
+    "CLOSE": "CL",
+    "CRESCENT": "CRES",
+    "TERRACE": "TER",
+    "UPPER": "UPP",
+    "UPR": "UPP",
+    "LWR": "LOWER",
+    "LK": "LINK",
+    "LORONG": "LOR",
+    "BUKIT": "BT",
+    "JALAN": "JLN",
+    "KAMPONG": "KG",
+    "KAMPUNG": "KG",
+    "TANJONG": "TG",
+    "COMMONWEALTH": "CWEALTH",
+    "HEIGHTS": "HTS",
+    "GARDENS": "GDNS",
+    "PLACE": "PL",
+    "PARK": "PK",
+    "MARKET": "MKT",
+    "BOULEVARD": "BLVD",
+    "JUNCTION": "JCN",
+}
+
+_punctuation = re.compile(r"['.]")
+_separators = re.compile(r"[^A-Z0-9]+")
+# best trigram matches checked for matching numbers
+FUZZY_CANDIDATES = 10
+
+def NormalizeStreetName(street_name: str) -> str:
+    # canonical lookup key: upper case, no punctuation, abbreviations expanded to HDB short forms
+    tokens = _separators.split(_punctuation.sub("", street_name.upper()))
+    return " ".join(ABBREVIATIONS.get(token, token) for token in tokens if token)
+
+def _Trigrams(key: str) -> set:
+    padded = f"  {key} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+def _Numbers(key: str) -> list:
+    # street and block numbers of a normalized name, in order
+    return re.findall(r"\b\d+[A-Z]?\b", key)
+
+class StreetResolver:
+    # Built once per model schema. Exact and abbreviation-insensitive lookups are a dict hit,
+    # autocomplete is a bisect over sorted keys and fuzzy matching scores trigram overlap.
+
+    def __init__(self, street_names, fuzzy_threshold: float = 0.6):
+        self.names = sorted(set(street_names))
+        self.fuzzy_threshold = fuzzy_threshold
+        self.by_key = {}
+        for name in self.names:
+            self.by_key.setdefault(NormalizeStreetName(name), name)
+
+        # every token boundary is a prefix entry, so "BATOK" completes "BT BATOK ST 52"
+        entries = []
+        for key, name in self.by_key.items():
+            tokens = key.split(" ")
+            for i in range(len(tokens)):
+                entries.append((" ".join(tokens[i:]), i, name))
+        entries.sort()
+        self.prefix_keys = [entry[0] for entry in entries]
+        self.prefix_entries = entries
+
+        self.trigrams = {}
+        self.trigram_counts = []
+        self.trigram_names = []
+        for key, name in self.by_key.items():
+            grams = _Trigrams(key)
+            name_id = len(self.trigram_names)
+            self.trigram_names.append(name)
+            self.trigram_counts.append(len(grams))
+            for gram in grams:
+                self.trigrams.setdefault(gram, []).append(name_id)
+
+    def __len__(self):
+        return len(self.names)
+
+    def __contains__(self, street_name: str):
+        return NormalizeStreetName(street_name) in self.by_key
+
+    def Complete(self, prefix: str, limit: int = 10) -> list:
+        # a partial last word is left as typed, so "ANG MO KIO AV" still matches "AVE"
+        key = NormalizeStreetName(prefix)
+        if not key:
+            return self.names[:limit]
+        start = bisect.bisect_left(self.prefix_keys, key)
+        matches = []
+        for i in range(start, len(self.prefix_keys)):
+            if not self.prefix_keys[i].startswith(key):
+                break
+            matches.append(self.prefix_entries[i])
+        # whole-name prefix matches first, then matches on a later word
+        matches.sort(key=lambda entry: (entry[1], entry[2]))
+        results = []
+        seen = set()
+        for _, _, name in matches:
+            if name not in seen:
+                seen.add(name)
+                results.append(name)
+                if len(results) == limit:
+                    break
+        return results
+
+    def Fuzzy(self, query: str, limit: int = 5) -> list:
+        # Dice coefficient over character trigrams, returns [(name, score)]
+        grams = _Trigrams(NormalizeStreetName(query))
+        overlap = {}
+        for gram in grams:
+            for name_id in self.trigrams.get(gram, ()):
+                overlap[name_id] = overlap.get(name_id, 0) + 1
+        scored = [
+            (self.trigram_names[name_id], round(2 * shared / (len(grams) + self.trigram_counts[name_id]), 4))
+            for name_id, shared in overlap.items()
+        ]
+        scored.sort(key=lambda item: (-item[1], item[0]))
+        return scored[:limit]
+
+    def Resolve(self, street_name: str):
+        # returns (canonical name or None, method, score)
+        key = NormalizeStreetName(street_name)
+        if not key:
+            return None, "empty", 0.0
+        name = self.by_key.get(key)
+        if name is not None:
+            return name, "exact" if name == street_name else "normalized", 1.0
+        # a fuzzy match may fix the words but never the numbers: TAMPINES ST 99 is not ST 91
+        numbers = _Numbers(key)
+        fuzzy = self.Fuzzy(key, limit=FUZZY_CANDIDATES)
+        candidates = [candidate for candidate in fuzzy if _Numbers(NormalizeStreetName(candidate[0])) == numbers][:2]
+        if candidates and candidates[0][1] >= self.fuzzy_threshold:
+            # refuse ties, e.g. "TAMPINES ST" against ST 11 and ST 12
+            if len(candidates) == 1 or candidates[0][1] > candidates[1][1]:
+                return candidates[0][0], "fuzzy", candidates[0][1]
+        return None, "unresolved", fuzzy[0][1] if fuzzy else 0.0
@@ -0,0 +1,67 @@
+import os
+import numpy as np
+from . import model, registry
+
+# What-if sweeps: the price of one flat as one or two of its inputs vary. The whole grid is encoded
+# as one feature matrix and scored in a single booster call, so a 50 x 20 surface costs about as
+# much as one /predict.
+SWEEP_MAX_STEPS = int(os.environ.get("SWEEP_MAX_STEPS", 200))
+SWEEP_MAX_POINTS = int(os.environ.get("SWEEP_MAX_POINTS", 5000))
+# variable -> (lowest, highest) accepted value
+VARIABLES = {
+    "floor_area": (20.0, 400.0),
+    "storey_range": (1.0, 3.0),
+    "lease_start": (1960, 2030),
+}
+
+class SweepError(ValueError):
+    pass
+
+class Axis:
+    # One swept variable and its values.
+
+    def __init__(self, name: str, values: list):
+        if name not in VARIABLES:
+            raise SweepError(f"Cannot sweep {name}, choose one of {', '.join(VARIABLES)}")
+        low, high = VARIABLES[name]
+        if not values:
+            raise SweepError(f"No values to sweep for {name}")
+        if len(values) > SWEEP_MAX_STEPS:
+            raise SweepError(f"At most {SWEEP_MAX_STEPS} values per variable")
+        if min(values) < low or max(values) > high:
+            raise SweepError(f"{name} must be between {low} and {high}")
+        # lease start years and storey bands are whole numbers
+        values = [round(float(value), 2) for value in values] if name == "floor_area" else [int(round(value)) for value in values]
+        self.name = name
+        self.values = list(dict.fromkeys(values))
+
+    @classmethod
+    def FromRange(cls, name: str, start: float, stop: float, steps: int):
+        # steps evenly spaced values from start to stop, both included
+        if steps < 1 or steps > SWEEP_MAX_STEPS:
+            raise SweepError(f"steps must be between 1 and {SWEEP_MAX_STEPS}")
+        return cls(name, np.linspace(start, stop, steps).tolist())
+
+    def ToDict(self) -> dict:
+        return {"name": self.name, "values": self.values}
+
+def Sweep(bundle: registry.ModelBundle, base: dict, axes: list, deadline: float = None) -> dict:
+    # base is a model.NormalizeInputs dict; prices[i] for one axis, prices[i][j] (x value i, y value j) for two.
+    # deadline is the request's admission.Deadline(), checked between stages
+    if len(axes) not in (1, 2) or len({axis.name for axis in axes}) != len(axes):
+        raise SweepError("Sweep one variable or two different ones")
+    shape = tuple(len(axis.values) for axis in axes)
+    if int(np.prod(shape)) > SWEEP_MAX_POINTS:
+        raise SweepError(f"At most {SWEEP_MAX_POINTS} grid points")
+    # row-major grid, the last axis varying fastest
+    rows = []
+    for point in np.ndindex(*shape):
+        row = dict(base)
+        for axis, position in zip(axes, point):
+            row[axis.name] = axis.values[position]
+        rows.append(row)
+    prices = model.PredictBatch(rows, bundle, "sweep", deadline=deadline).astype(np.float64).reshape(shape)
+    result = {"base": base, "x": axes[0].ToDict(), "prices": np.round(prices, 2).tolist()}
+    if len(axes) == 2:
+        result["y"] = axes[1].ToDict()
+    return result
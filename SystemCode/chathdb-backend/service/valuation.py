@@ -0,0 +1,130 @@
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from . import admission, comparables, dimensions, future_model, metrics, model, multipliers, prediction_cache, registry
+
+# Everything a valuation page shows for one flat, in one request. The inputs are normalized and the
+# street resolved to its model spelling and HDB town once; the current price, the 3-month forecast,
+# the town adjustment factors, a rent estimate and recent comparable transactions are then computed
+# concurrently on a shared worker pool. A component that fails or is not done by the deadline comes
+# back as null with its error, and the others are returned as usual.
+VALUATION_WORKERS = int(os.environ.get("VALUATION_WORKERS", 8))
+VALUATION_TIMEOUT_MS = float(os.environ.get("VALUATION_TIMEOUT_MS", 2000))
+COMPARABLES_LIMIT = int(os.environ.get("VALUATION_COMPARABLES", 5))
+COMPONENTS = ["price", "forecast", "town_adjustment", "rental", "comparables"]
+
+def Price(flat: dict, bundle: registry.ModelBundle) -> float:
+    # shares the /api/model/predict cache, so warmed inputs cost a lookup
+    cache = prediction_cache.GetPredictionCache()
+    cache.Track(flat["inputs"])
+    key = cache.Key(model.CacheVersion(bundle), flat["inputs"])
+    price = cache.Get(key)
+    if price is None:
+        price = float(model.PredictBatch([flat["inputs"]], bundle, "valuation")[0])
+        cache.Put(key, price)
+    return price
+
+def Forecast(flat: dict, bundle: registry.ModelBundle) -> dict:
+    return future_model.PredictFuturePrice(**flat["inputs"], bundle=bundle)
+
+def TownAdjustment(flat: dict) -> dict:
+    town_multipliers = multipliers.GetMultipliers()
+    return {"factors": town_multipliers.Factors(flat["town"]), "multiplier": round(town_multipliers.Multiplier(flat["town"]), 6)}
+
+def Rental(flat: dict):
+    return comparables.GetRecentTransactions().Rent(flat["street_name"], flat["town"], flat["inputs"]["flat_type"])
+
+def Comparables(flat: dict) -> list:
+    inputs = flat["inputs"]
+    return comparables.GetRecentTransactions().Comparables(flat["street_name"], flat["town"], inputs["flat_type"], inputs["floor_area"], COMPARABLES_LIMIT)
+
+def _Run(app, deadline, name: str, component, *args):
+    # (result, seconds, error) of one component, run in the app context for its logging and
+    # under the request's deadline
+    start = time.perf_counter()
+    try:
+        with app.app_context(), admission.WithDeadline(deadline), metrics.Stage("valuation", name):
+            return component(*args), time.perf_counter() - start, None
+    except Exception as e:
+        metrics.RecordError("valuation", e)
+        return None, time.perf_counter() - start, str(e) or type(e).__name__
+
+def Valuate(app, inputs: dict, bundle: registry.ModelBundle, future_bundle: registry.ModelBundle, timeout: float = None) -> dict:
+    # inputs is a model.NormalizeInputs dict
+    start = time.perf_counter()
+    dims = dimensions.GetDimensions()
+    # without street towns the town adjustment and town comparables would silently be null
+    dims.RequireStreetTowns()
+    resolved, method, _ = bundle.street_resolver.Resolve(inputs["street_name"])
+    flat = {
+        "inputs": inputs,
+        "street_name": resolved or inputs["street_name"],
+        "town": dims.StreetTown(resolved) if resolved is not None else None,
+    }
+    # the tighter of the valuation timeout and the request deadline
+    timeout = VALUATION_TIMEOUT_MS / 1000 if timeout is None else timeout
+    remaining = admission.Remaining()
+    if remaining is not None:
+        timeout = max(0.0, min(timeout, remaining))
+
+    calls = {
+        "price": (Price, flat, bundle),
+        "forecast": (Forecast, flat, future_bundle),
+        "town_adjustment": (TownAdjustment, flat),
+        "rental": (Rental, flat),
+        "comparables": (Comparables, flat),
+    }
+    futures = {}
+    for name, (component, *args) in calls.items():
+        # a model stays loaded until its component ends, even one still running after the response
+        held = [arg for arg in args if isinstance(arg, registry.ModelBundle)]
+        for held_bundle in held:
+            held_bundle.Acquire()
+        futures[name] = GetPool().submit(_Run, app, admission.Deadline(), name, component, *args)
+        for held_bundle in held:
+            futures[name].add_done_callback(lambda _, held_bundle=held_bundle: held_bundle.Release())
+    done, _ = wait(futures.values(), timeout=timeout)
+
+    result, timings, errors = {}, {}, {}
+    for name in COMPONENTS:
+        future = futures[name]
+        if future in done:
+            result[name], seconds, error = future.result()
+            timings[name] = round(seconds * 1000, 2)
+            if error is not None:
+                errors[name] = error
+        else:
+            # not started yet or still running; a queued one is dropped
+            future.cancel()
+            result[name] = None
+            errors[name] = f"timed out after {timeout * 1000:.0f} ms"
+            metrics.RecordError("valuation", TimeoutError(name))
+    if result["price"] is not None:
+        result["price"] = round(result["price"], 2)
+        if result["town_adjustment"] is not None:
+            result["town_adjustment"]["adjusted_price"] = round(result["price"] * result["town_adjustment"]["multiplier"], 2)
+    timings["total"] = round((time.perf_counter() - start) * 1000, 2)
+    return {
+        "inputs": inputs,
+        "street_name": flat["street_name"],
+        "street_resolution": method,
+        "town": flat["town"],
+        **result,
+        "model_version": bundle.version,
+        "future_model_version": future_bundle.version,
+        "partial": bool(errors),
+        "errors": errors,
+        "timings_ms": timings,
+    }
+
+_pool = None
+_pool_lock = threading.Lock()
+
+def GetPool() -> ThreadPoolExecutor:
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ThreadPoolExecutor(max_workers=VALUATION_WORKERS, thread_name_prefix="valuation")
+    return _pool
@@ -0,0 +1,155 @@
+import datetime
+import os
+import threading
+import time
+from collections import deque
+from . import admission, http_cache, metrics, model, prediction_cache, prediction_log, registry
+
+# Warms the /predict cache (service/prediction_cache.py) with the most requested inputs whenever its
+# entries are about to go stale: at startup, when a new model or feature store version goes live,
+# and around month end, first for the coming month shortly before midnight and again for the new
+# month once it has started if that was missed. Inputs are scored in small batches on one background
+# thread that pauses while live requests are queued or most admission slots are busy.
+WARMUP_ENABLED = os.environ.get("WARMUP_ENABLED", "1") != "0"
+WARMUP_KEYS = int(os.environ.get("WARMUP_KEYS", 2000))
+WARMUP_CHECK_SECONDS = float(os.environ.get("WARMUP_CHECK_SECONDS", 30))
+# how long before month end the next month's prices are scored
+WARMUP_LEAD_SECONDS = int(os.environ.get("WARMUP_LEAD_SECONDS", 900))
+WARMUP_BATCH_SIZE = int(os.environ.get("WARMUP_BATCH_SIZE", 100))
+WARMUP_PAUSE_MS = float(os.environ.get("WARMUP_PAUSE_MS", 50))
+# share of admission slots live traffic may hold before warming waits
+WARMUP_MAX_BUSY = float(os.environ.get("WARMUP_MAX_BUSY", 0.5))
+RUN_HISTORY = 20
+
+def NextMonth(today: datetime.date) -> datetime.date:
+    return (today.replace(day=28) + datetime.timedelta(days=4)).replace(day=1)
+
+class CacheWarmer:
+    # Background warm-ups of one model's prediction cache, with a history of runs.
+
+    def __init__(self, cache: prediction_cache.PredictionCache, name: str = "current"):
+        self.cache, self.name = cache, name
+        self.warmed = set()
+        self.last = None
+        self.runs = deque(maxlen=RUN_HISTORY)
+        self.running = None
+        self.lock = threading.Lock()
+        self.thread = None
+
+    def Busy(self) -> bool:
+        # live requests waiting, or more than WARMUP_MAX_BUSY of the slots taken
+        controller = admission.GetController()
+        with controller.condition:
+            waiting = sum(controller.waiting.values())
+            running = sum(controller.running.values())
+        return waiting > 0 or running >= controller.max_concurrent * WARMUP_MAX_BUSY
+
+    def _Yield(self) -> float:
+        # seconds spent giving way to live traffic before the next batch
+        start = time.perf_counter()
+        time.sleep(WARMUP_PAUSE_MS / 1000)
+        while self.Busy():
+            time.sleep(WARMUP_PAUSE_MS / 1000)
+        return time.perf_counter() - start
+
+    def Targets(self, bundle: registry.ModelBundle, today: datetime.date = None) -> list:
+        # (trigger, cache version, month, as_of) still to warm
+        today = today or datetime.date.today()
+        version = model.CacheVersion(bundle)
+        month = prediction_cache.Month(today)
+        if self.last is None:
+            trigger = "startup"
+        elif self.last[1] != month:
+            trigger = "rollover"
+        else:
+            trigger = "deploy"
+        targets = [(trigger, version, month, today)]
+        if http_cache.SecondsToMonthEnd() <= WARMUP_LEAD_SECONDS:
+            upcoming = NextMonth(today)
+            targets.append(("pre_rollover", version, prediction_cache.Month(upcoming), upcoming))
+        return [target for target in targets if target[1:3] not in self.warmed]
+
+    def Check(self):
+        with registry.GetRegistry().Use(self.name) as bundle:
+            for trigger, version, month, as_of in self.Targets(bundle):
+                self.Warm(bundle, trigger, version, month, as_of)
+                self.warmed.add((version, month))
+                if month == prediction_cache.Month():
+                    self.last = (version, month)
+
+    def Warm(self, bundle: registry.ModelBundle, trigger: str, version: str, month: str, as_of: datetime.date) -> dict:
+        start = time.perf_counter()
+        popular = self.cache.Popular(WARMUP_KEYS)
+        todo = [inputs for inputs, _ in popular if not self.cache.Contains(self.cache.Key(version, inputs, month))]
+        run = {
+            "trigger": trigger, "model_version": bundle.version, "month": month,
+            "started_at": datetime.datetime.now().isoformat(timespec="seconds"),
+            "keys": len(popular), "already_cached": len(popular) - len(todo), "scored": 0, "throttled_seconds": 0.0,
+        }
+        with self.lock:
+            self.running = run
+        try:
+            for offset in range(0, len(todo), WARMUP_BATCH_SIZE):
+                run["throttled_seconds"] += self._Yield()
+                batch = todo[offset:offset + WARMUP_BATCH_SIZE]
+                prices = model.PredictBatch(batch, bundle, "warmup", as_of)
+                for inputs, price in zip(batch, prices):
+                    self.cache.Put(self.cache.Key(version, inputs, month), float(price))
+                run["scored"] += len(batch)
+        finally:
+            # coverage: share of the counted request volume the cache now answers for this month
+            total = sum(count for _, count in popular)
+            covered = sum(count for inputs, count in popular if self.cache.Contains(self.cache.Key(version, inputs, month)))
+            run["coverage"] = round(covered / total, 4) if total else None
+            run["seconds"] = round(time.perf_counter() - start, 3)
+            run["throttled_seconds"] = round(run["throttled_seconds"], 3)
+            with self.lock:
+                self.running = None
+                self.runs.append(run)
+            metrics.RecordWarmup(trigger, run["seconds"], run["scored"], run["coverage"])
+        return run
+
+    def Seed(self, limit: int = WARMUP_KEYS):
+        # after a restart, count the inputs the prediction log has seen most
+        if self.cache.TotalCount() > 0:
+            return
+        for inputs, count in prediction_log.PopularInputs("predict", limit):
+            self.cache.Track(inputs, count)
+
+    def _Run(self):
+        try:
+            self.Seed()
+        except Exception as e:
+            metrics.RecordError("warmup", e)
+        while True:
+            try:
+                self.Check()
+            except Exception as e:
+                # a failed warm-up is retried on the next check
+                metrics.RecordError("warmup", e)
+            time.sleep(WARMUP_CHECK_SECONDS)
+
+    def Start(self):
+        if WARMUP_ENABLED and self.thread is None:
+            self.thread = threading.Thread(target=self._Run, name="cache-warmup", daemon=True)
+            self.thread.start()
+
+    def Status(self) -> dict:
+        with self.lock:
+            return {
+                "enabled": WARMUP_ENABLED,
+                "running": dict(self.running) if self.running else None,
+                "runs": list(self.runs),
+                "cache": self.cache.Stats(),
+            }
+
+_warmer = None
+_warmer_lock = threading.Lock()
+
+def GetWarmer() -> CacheWarmer:
+    global _warmer
+    if _warmer is None:
+        with _warmer_lock:
+            if _warmer is None:
+                _warmer = CacheWarmer(prediction_cache.GetPredictionCache())
+    return _warmer
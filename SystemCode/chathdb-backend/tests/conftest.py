@@ -0,0 +1,23 @@
+import os
+import sys
+import pytest
+
+# Run from the backend root like the service: python -m pytest tests. Background threads and the
+# prediction log stay off so tests never write into static/data.
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+os.chdir(BACKEND_DIR)
+os.environ.setdefault("MODEL_WATCH_SECONDS", "0")
+os.environ.setdefault("PREDICTION_LOG_ENABLED", "0")
+os.environ.setdefault("WARMUP_ENABLED", "0")
+
+@pytest.fixture(scope="session")
+def synthetic_models():
+    # small synthetic current and future models published to a temp registry, as the benchmarks use
+    from benchmarks.fixtures import use_models
+    return use_models(synthetic=True)
+
+@pytest.fixture
+def client(synthetic_models):
+    from app import app
+    return app.test_client()
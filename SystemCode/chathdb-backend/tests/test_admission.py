@@ -0,0 +1,155 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import pytest
+from flask import Flask, jsonify
+from service import admission
+
+# priority -> (max concurrent, max queued, queue timeout ms, deadline ms)
+LIMITS = {
+    admission.INTERACTIVE: (2, 1, 100, 200),
+    admission.BATCH: (1, 1, 100, 1000),
+}
+
+@pytest.fixture
+def controller(monkeypatch):
+    controller = admission.AdmissionController(max_concurrent=2, limits=LIMITS, endpoint_limits={"explain": 1})
+    monkeypatch.setattr(admission, "_controller", controller)
+    monkeypatch.setattr(admission, "LIMITS", LIMITS)
+    monkeypatch.setattr(admission, "ENABLED", True)
+    return controller
+
+@pytest.fixture
+def app(controller):
+    # endpoints that hold their slot until released, and one that runs past its deadline
+    app = Flask(__name__)
+    app.release = threading.Event()
+
+    @app.route("/hold/<endpoint>")
+    def hold(endpoint):
+        @admission.Admit(endpoint, admission.BATCH if endpoint == "batch" else admission.INTERACTIVE)
+        def view():
+            app.release.wait(5)
+            return jsonify({"endpoint": endpoint})
+        return view()
+
+    @app.route("/slow")
+    @admission.Admit("slow")
+    def slow():
+        time.sleep(0.25)
+        admission.CheckDeadline("inference")
+        return jsonify({})
+
+    @app.route("/pooled")
+    @admission.Admit("pooled")
+    def pooled():
+        # the deadline does not follow work onto a pool thread unless it is passed along
+        deadline = admission.Deadline()
+        def stage():
+            with admission.WithDeadline(deadline):
+                time.sleep(0.25)
+                admission.CheckDeadline("pooled")
+        with ThreadPoolExecutor(max_workers=1) as pool:
+            pool.submit(stage).result()
+        return jsonify({})
+    return app
+
+def Holding(app, controller, endpoints: list) -> list:
+    # start requests that keep their slots until app.release is set
+    threads = []
+    for endpoint in endpoints:
+        thread = threading.Thread(target=app.test_client().get, args=(f"/hold/{endpoint}",))
+        thread.start()
+        threads.append(thread)
+    deadline = time.perf_counter() + 2
+    while sum(controller.running.values()) + sum(controller.waiting.values()) < len(endpoints) and time.perf_counter() < deadline:
+        time.sleep(0.005)
+    return threads
+
+def Finish(app, threads: list):
+    app.release.set()
+    for thread in threads:
+        thread.join()
+
+def test_full_queue_is_shed_with_429(app, controller):
+    threads = Holding(app, controller, ["predict", "predict", "predict"])
+    try:
+        assert controller.running[admission.INTERACTIVE] == 2 and controller.waiting[admission.INTERACTIVE] == 1
+        response = app.test_client().get("/hold/predict")
+        assert response.status_code == 429
+        assert response.json["reason"] == "queue full"
+        assert int(response.headers["Retry-After"]) >= 1
+    finally:
+        Finish(app, threads)
+    assert controller.Stats()["endpoints"]["predict"]["shed"] == 1
+
+def test_queue_timeout_is_503(app, controller):
+    threads = Holding(app, controller, ["predict", "predict"])
+    try:
+        start = time.perf_counter()
+        response = app.test_client().get("/hold/predict")
+        assert response.status_code == 503
+        assert response.json["reason"] == "queue timeout"
+        assert int(response.headers["Retry-After"]) >= 1
+        assert time.perf_counter() - start >= LIMITS[admission.INTERACTIVE][2] / 1000
+    finally:
+        Finish(app, threads)
+    assert controller.Stats()["endpoints"]["predict"]["queue_timeout"] == 1
+
+def test_endpoint_cap_leaves_slots_for_other_endpoints(app, controller):
+    threads = Holding(app, controller, ["explain", "explain"])
+    try:
+        # the second explain waits on its own cap while a slot is still free
+        assert controller.endpoint_running["explain"] == 1 and controller.endpoint_waiting["explain"] == 1
+        controller.Acquire("predict", admission.INTERACTIVE)
+        controller.Release("predict", admission.INTERACTIVE, 0.01)
+        # waiting on an endpoint cap does not keep batch requests out
+        controller.Acquire("batch", admission.BATCH)
+        controller.Release("batch", admission.BATCH, 0.01)
+    finally:
+        Finish(app, threads)
+    counts = controller.Stats()["endpoints"]
+    assert counts["predict"] == {"admitted": 1} and counts["batch"] == {"admitted": 1}
+    assert counts["explain"]["admitted"] == 1 and sum(counts["explain"].values()) == 2
+
+def test_batch_waits_while_interactive_requests_queue(controller):
+    controller.Acquire("predict", admission.INTERACTIVE)
+    controller.Acquire("predict", admission.INTERACTIVE)
+    waiter = threading.Thread(target=controller.Acquire, args=("predict", admission.INTERACTIVE))
+    waiter.start()
+    while controller.waiting[admission.INTERACTIVE] == 0:
+        time.sleep(0.005)
+    controller.Release("predict", admission.INTERACTIVE, 0.01)
+    waiter.join()
+    # the interactive waiter took the freed slot
+    with pytest.raises(admission.Overloaded) as rejected:
+        controller.Acquire("batch", admission.BATCH)
+    assert rejected.value.status == 503
+
+def test_deadline_exceeded_is_503(app, controller):
+    response = app.test_client().get("/slow")
+    assert response.status_code == 503
+    assert response.json["reason"] == "deadline"
+    assert response.headers["Retry-After"] == "1"
+    assert controller.Stats()["endpoints"]["slow"]["deadline"] == 1
+    assert sum(controller.running.values()) == 0
+
+def test_client_can_shorten_deadline(app, controller, monkeypatch):
+    monkeypatch.setattr(admission, "LIMITS", {**LIMITS, admission.INTERACTIVE: (2, 1, 100, 5000)})
+    assert app.test_client().get("/slow").status_code == 200
+    assert app.test_client().get("/slow", headers={admission.DEADLINE_HEADER: "50"}).status_code == 503
+
+def test_deadline_passed_to_pool_threads(app, controller):
+    response = app.test_client().get("/pooled")
+    assert response.status_code == 503
+    assert response.json["error"] == "deadline exceeded before pooled"
+
+def test_check_deadline_outside_requests():
+    admission.CheckDeadline("encode")
+    admission.CheckDeadline("encode", time.perf_counter() + 60)
+    with pytest.raises(admission.DeadlineExceeded):
+        admission.CheckDeadline("encode", time.perf_counter() - 1)
+    with admission.WithDeadline(time.perf_counter() - 1):
+        with pytest.raises(admission.DeadlineExceeded):
+            admission.CheckDeadline("encode")
+    assert admission.Deadline() is None
@@ -0,0 +1,92 @@
+import os
+import pickle
+import shutil
+import pandas as pd
+import pytest
+from benchmarks.fixtures import train_synthetic_model
+from lib.batch import backtest
+from service import registry
+
+MONTHS = ["2024-01", "2024-02", "2024-03"]
+
+@pytest.fixture
+def current_model(tmp_path, monkeypatch):
+    # a synthetic booster with the production column layout, under the "current" backtest config
+    artifacts = registry.LegacyArtifacts("current")
+    columns = list(pd.read_csv(artifacts["columns"], nrows=0).columns)
+    config = {
+        "model": str(tmp_path / "model.pkl"),
+        "scaler": str(tmp_path / "scaler.pkl"),
+        "columns": str(tmp_path / "columns.csv"),
+        "horizons": [0],
+    }
+    with open(config["model"], "wb") as openfile:
+        pickle.dump(train_synthetic_model(columns, rows=200), openfile)
+    shutil.copyfile(artifacts["scaler"], config["scaler"])
+    shutil.copyfile(artifacts["columns"], config["columns"])
+    monkeypatch.setitem(backtest.MODELS, "current", config)
+    return config
+
+@pytest.fixture
+def resale_path(tmp_path):
+    rows = pd.DataFrame({
+        "month": [month for month in MONTHS for _ in range(4)],
+        "town": "CLEMENTI",
+        "street_name": "CLEMENTI AVE 1",
+        "flat_type": ["3 ROOM", "4 ROOM"] * 6,
+        "floor_area_sqm": 70.0,
+        "storey_range": "04 TO 06",
+        "lease_commence_date": 1980,
+        "resale_price": 400000.0,
+    })
+    path = str(tmp_path / "resale.parquet")
+    rows.to_parquet(path, index=False)
+    return path
+
+def ScoredBy(results: pd.DataFrame) -> dict:
+    return results.groupby("month")["model_version"].agg(lambda versions: sorted(set(versions))).to_dict()
+
+def test_second_run_rescores_newest_and_stale_months(current_model, resale_path, tmp_path, monkeypatch):
+    results_path = str(tmp_path / "results.parquet")
+    first = backtest.RunBacktest(resale_path, results_path, ["current"])
+    version = backtest.ModelVersion(current_model)
+    assert ScoredBy(first) == {month: [version] for month in MONTHS}
+
+    # January was scored by an older model
+    stored = pd.read_parquet(results_path)
+    stored.loc[stored["month"] == "2024-01", "model_version"] = "older"
+    stored.to_parquet(results_path, index=False)
+
+    scored = []
+    evaluate = backtest.Evaluate
+    def Recording(rows, *args, **kwargs):
+        scored.extend(sorted(rows["month"].unique()))
+        return evaluate(rows, *args, **kwargs)
+    monkeypatch.setattr(backtest, "Evaluate", Recording)
+    second = backtest.RunBacktest(resale_path, results_path, ["current"])
+
+    assert scored == ["2024-01", "2024-03"]
+    # re-scored months replace their old rows instead of adding to them
+    assert ScoredBy(second) == {month: [version] for month in MONTHS}
+    assert len(second) == len(first)
+    pd.testing.assert_frame_equal(
+        backtest.Summarize(second, ["month"]), backtest.Summarize(first, ["month"]), check_dtype=False,
+    )
+
+def test_new_model_files_rescore_every_month(current_model, resale_path, tmp_path):
+    results_path = str(tmp_path / "results.parquet")
+    backtest.RunBacktest(resale_path, results_path, ["current"])
+    stat = os.stat(current_model["model"])
+    os.utime(current_model["model"], ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    results = backtest.RunBacktest(resale_path, results_path, ["current"])
+    assert ScoredBy(results) == {month: [backtest.ModelVersion(current_model)] for month in MONTHS}
+
+def test_scored_months_skips_only_same_version():
+    results = pd.DataFrame({
+        "model": ["current", "current", "current", "future"],
+        "month": ["2024-01", "2024-02", "2024-03", "2024-04"],
+        "model_version": ["a", "b", "a", "a"],
+    })
+    assert backtest.ScoredMonths(results, "current", "a") == {"2024-01"}
+    assert backtest.ScoredMonths(results, "future", "a") == set()
+    assert backtest.ScoredMonths(results.head(0), "current", "a") == set()
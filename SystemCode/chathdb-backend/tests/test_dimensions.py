@@ -0,0 +1,48 @@
+import os
+import shutil
+import polars as pl
+import pytest
+from service import dimensions
+
+RESALE = pl.DataFrame({
+    "month": ["2024-01", "2024-02", "2024-03", "2024-03"],
+    "town": ["CLEMENTI", "CLEMENTI", "CLEMENTI", "JURONG WEST"],
+    "street_name": ["CLEMENTI AVE 1", "CLEMENTI AVE 1", "CLEMENTI AVE 1", "CLEMENTI AVE 1"],
+})
+
+@pytest.fixture
+def static_dir(tmp_path, monkeypatch):
+    # a static folder with the planning areas but neither the dimension tables nor the resale data
+    os.makedirs(tmp_path / "data" / "planning_area")
+    shutil.copy(os.path.join(dimensions.STATIC_DIR, dimensions.PLANNING_AREA_FILE), tmp_path / dimensions.PLANNING_AREA_FILE)
+    monkeypatch.setattr(dimensions, "STATIC_DIR", str(tmp_path))
+    monkeypatch.setattr(dimensions, "_dimensions", None)
+    return tmp_path
+
+def test_missing_street_towns_are_refused(static_dir):
+    dims = dimensions.GetDimensions()
+    assert dims.StreetTown("CLEMENTI AVE 1") is None
+    with pytest.raises(FileNotFoundError, match="build_dimensions"):
+        dims.RequireStreetTowns()
+
+def test_street_towns_derived_from_resale(static_dir):
+    assert dimensions.GetDimensions().street_town_rows == 0
+    os.makedirs(static_dir / "data" / "resale_price" / "parsed")
+    RESALE.write_parquet(static_dir / dimensions.RESALE_FILE)
+    # picked up without a restart, busiest town first
+    dims = dimensions.GetDimensions()
+    dims.RequireStreetTowns()
+    assert dims.StreetTown("CLEMENTI AVE 1") == "CLEMENTI"
+    assert dimensions.GetDimensions() is dims
+
+def test_built_table_is_preferred(static_dir):
+    os.makedirs(static_dir / dimensions.DIMENSIONS_DIR)
+    table = dimensions.StreetTownFrame(RESALE.with_columns(pl.lit("JURONG WEST").alias("town")).lazy())
+    table.write_parquet(static_dir / dimensions.DIMENSIONS_DIR / "street_town.parquet")
+    assert dimensions.GetDimensions().StreetTown("CLEMENTI AVE 1") == "JURONG WEST"
+
+def test_endpoints_refuse_empty_town_aggregates(static_dir, client):
+    for path in ["/api/model/heatmap", "/api/valuation"]:
+        response = client.get(path)
+        assert response.status_code == 404
+        assert "Street towns unavailable" in response.json["error"]
@@ -0,0 +1,119 @@
+import datetime
+import gzip
+import json
+import types
+import pytest
+from service import experiments, feature_store, http_cache, model, registry
+
+PARAMS = {"street_name": "CLEMENTI AVE 1", "floor_area": 70, "storey_range": 2, "lease_start": 1990, "flat_type": "3 ROOM"}
+INPUTS = model.NormalizeInputs(**PARAMS)
+
+def Predict(client, headers: dict = None, **params):
+    return client.get("/api/model/predict", query_string={**PARAMS, **params}, headers=headers or {})
+
+def test_etag_changes_with_month(monkeypatch):
+    def ETagOn(day: datetime.date) -> str:
+        monkeypatch.setattr(http_cache, "datetime", types.SimpleNamespace(date=types.SimpleNamespace(today=lambda: day)))
+        return http_cache.PredictionETag("predict", INPUTS, "v1")
+    assert ETagOn(datetime.date(2025, 4, 1)) == ETagOn(datetime.date(2025, 4, 30))
+    assert ETagOn(datetime.date(2025, 4, 30)) != ETagOn(datetime.date(2025, 5, 1))
+
+def test_etag_changes_with_model_and_inputs():
+    etag = http_cache.PredictionETag("predict", INPUTS, "v1")
+    assert http_cache.PredictionETag("predict", INPUTS, "v2") != etag
+    assert http_cache.PredictionETag("future_predict", INPUTS, "v1") != etag
+    assert http_cache.PredictionETag("predict", model.NormalizeInputs(**{**PARAMS, "floor_area": 71}), "v1") != etag
+    # equivalent spellings normalize to the same tag
+    same = model.NormalizeInputs(**{**PARAMS, "street_name": "Clementi Avenue 1", "floor_area": "70.0"})
+    assert http_cache.PredictionETag("predict", same, "v1") == etag
+
+def test_etag_changes_with_feature_store(client, tmp_path, monkeypatch):
+    monkeypatch.setattr(feature_store, "FEATURE_STORE_DIR", str(tmp_path))
+    without_store = Predict(client).headers["ETag"]
+    (tmp_path / "LATEST").write_text("20250401T000000000000")
+    with_store = Predict(client).headers["ETag"]
+    assert with_store != without_store
+    (tmp_path / "LATEST").write_text("20250501T000000000000-rebuilt")
+    assert Predict(client).headers["ETag"] != with_store
+
+def test_etag_changes_with_model_version(client):
+    first = Predict(client)
+    live = registry.GetRegistry()
+    registry.Publish("current", live.Live("current").paths, root=live.root)
+    assert live.Refresh("current")
+    second = Predict(client)
+    assert second.headers["X-Model-Version"] != first.headers["X-Model-Version"]
+    assert second.headers["ETag"] != first.headers["ETag"]
+
+def test_prediction_is_cacheable(client):
+    response = Predict(client)
+    assert response.status_code == 200
+    assert response.headers["ETag"]
+    assert response.cache_control.public
+    assert 0 < response.cache_control.max_age <= http_cache.PREDICTION_MAX_AGE
+    assert "Accept-Encoding" in response.headers["Vary"]
+
+def test_if_none_match_returns_304(client):
+    response = Predict(client)
+    etag = response.headers["ETag"]
+    cached = Predict(client, {"If-None-Match": etag})
+    assert cached.status_code == 304
+    assert cached.data == b""
+    assert cached.headers["ETag"] == etag
+    assert cached.headers["X-Model-Version"] == response.headers["X-Model-Version"]
+    # other inputs do not match the tag
+    assert Predict(client, {"If-None-Match": etag}, floor_area=90).status_code == 200
+
+@pytest.mark.parametrize("encoding", http_cache.ENCODINGS)
+def test_compression_appends_encoding_to_etag(client, monkeypatch, encoding):
+    monkeypatch.setattr(http_cache, "COMPRESS_MIN_BYTES", 0)
+    plain = Predict(client, {"Accept-Encoding": "identity"})
+    assert "Content-Encoding" not in plain.headers
+    etag = plain.headers["ETag"].strip('"')
+
+    compressed = Predict(client, {"Accept-Encoding": encoding})
+    assert compressed.headers["Content-Encoding"] == encoding
+    assert compressed.headers["ETag"].strip('"') == f"{etag}-{encoding}"
+    if encoding == "gzip":
+        assert gzip.decompress(compressed.data) == plain.data
+    # the compressed variant's tag revalidates too
+    assert Predict(client, {"Accept-Encoding": encoding, "If-None-Match": compressed.headers["ETag"]}).status_code == 304
+
+def test_small_responses_are_not_compressed(client):
+    response = Predict(client, {"Accept-Encoding": "gzip"})
+    assert len(response.data) < http_cache.COMPRESS_MIN_BYTES
+    assert "Content-Encoding" not in response.headers
+
+def test_brotli_preferred_when_available(client, monkeypatch):
+    monkeypatch.setattr(http_cache, "COMPRESS_MIN_BYTES", 0)
+    response = Predict(client, {"Accept-Encoding": "gzip, br"})
+    assert response.headers["Content-Encoding"] == http_cache.ENCODINGS[0]
+
+@pytest.fixture
+def challenger(client, tmp_path, monkeypatch):
+    # a challenger serving half of the /predict traffic
+    config = tmp_path / "experiments.json"
+    live = registry.GetRegistry().Live("current")
+    config.write_text(json.dumps({"current": [{"name": "half", "model": live.paths["model"], "share": 0.5, "shadow": False}]}))
+    monkeypatch.setattr(experiments.GetExperiments("current"), "config_file", str(config))
+    return "half"
+
+def test_ab_variants_stay_out_of_shared_caches(client, challenger):
+    variants = {}
+    for client_id in [f"client-{i}" for i in range(20)]:
+        response = Predict(client, {"X-Client-Id": client_id})
+        assert response.cache_control.private and not response.cache_control.public
+        assert "X-Client-Id" in response.headers["Vary"]
+        variants.setdefault(response.headers["X-Model-Version"], []).append(response.headers["ETag"])
+        # revalidation keeps the same headers
+        cached = Predict(client, {"X-Client-Id": client_id, "If-None-Match": response.headers["ETag"]})
+        assert cached.status_code == 304 and cached.cache_control.private
+    assert len(variants) == 2
+    # requests bucketed by their inputs are not shared either
+    assert Predict(client).cache_control.private
+
+def test_predictions_public_without_challengers(client, tmp_path, monkeypatch):
+    monkeypatch.setattr(experiments.GetExperiments("current"), "config_file", str(tmp_path / "missing.json"))
+    response = Predict(client, {"X-Client-Id": "client-1"})
+    assert response.cache_control.public and not response.cache_control.private
+    assert "X-Client-Id" not in response.headers.get("Vary", "")
@@ -0,0 +1,132 @@
+import os
+import pickle
+import shutil
+import pandas as pd
+import pytest
+from benchmarks.fixtures import train_synthetic_model
+from service import registry
+
+@pytest.fixture(scope="module")
+def legacy_dir(tmp_path_factory):
+    # the current model's static/models layout with a small synthetic booster
+    legacy_dir = tmp_path_factory.mktemp("models")
+    for key, filename in registry.LEGACY_ARTIFACTS["current"].items():
+        target = legacy_dir / filename
+        target.parent.mkdir(parents=True, exist_ok=True)
+        if key != "model":
+            shutil.copyfile(os.path.join(registry.LEGACY_DIR, filename), target)
+    columns = list(pd.read_csv(legacy_dir / registry.LEGACY_ARTIFACTS["current"]["columns"], nrows=0).columns)
+    with open(legacy_dir / registry.LEGACY_ARTIFACTS["current"]["model"], "wb") as openfile:
+        pickle.dump(train_synthetic_model(columns, rows=100), openfile)
+    return str(legacy_dir)
+
+@pytest.fixture
+def artifacts(legacy_dir):
+    return registry.LegacyArtifacts("current", legacy_dir)
+
+@pytest.fixture
+def root(tmp_path):
+    return str(tmp_path / "registry")
+
+def Entries(root: str) -> list:
+    return sorted(os.listdir(os.path.join(root, "current")))
+
+def test_publish_writes_hidden_dir_then_renames(artifacts, root, monkeypatch):
+    renames = []
+    rename = os.rename
+    def Recording(source, target):
+        # the version is complete before it becomes visible
+        renames.append((os.path.basename(source), os.path.basename(target), sorted(os.listdir(source))))
+        rename(source, target)
+    monkeypatch.setattr(registry.os, "rename", Recording)
+    manifest = registry.Publish("current", artifacts, root=root)
+
+    version = manifest["version"]
+    assert renames == [("." + version, version, sorted(list(registry.BUNDLE_FILES.values()) + ["manifest.json"]))]
+    assert Entries(root) == sorted([version, "LIVE"])
+    assert registry.Versions("current", root) == [version]
+    assert registry.LiveVersion("current", root) == version
+    assert set(manifest["files"]) == set(registry.BUNDLE_FILES.values())
+
+def test_back_to_back_publishes_get_unique_sorted_versions(artifacts, root):
+    versions = [registry.Publish("current", artifacts, root=root)["version"] for _ in range(3)]
+    assert len(set(versions)) == 3
+    assert registry.Versions("current", root) == versions
+    assert registry.LiveVersion("current", root) == versions[-1]
+
+def test_failed_publish_leaves_nothing_behind(artifacts, root):
+    published = registry.Publish("current", artifacts, root=root)["version"]
+    with pytest.raises(FileNotFoundError):
+        registry.Publish("current", {**artifacts, "scaler": os.path.join(root, "missing.pkl")}, root=root)
+    assert Entries(root) == sorted([published, "LIVE"])
+    assert registry.LiveVersion("current", root) == published
+
+def test_publish_keeps_newest_and_live(artifacts, root):
+    first = registry.Publish("current", artifacts, root=root)["version"]
+    registry.Publish("current", artifacts, root=root, activate=False)
+    newest = [registry.Publish("current", artifacts, root=root, activate=False)["version"]]
+    newest.append(registry.Publish("current", artifacts, root=root, activate=False, keep=2)["version"])
+    # the live version survives even when it is among the oldest
+    assert registry.Versions("current", root) == [first] + newest
+    assert registry.LiveVersion("current", root) == first
+
+def test_activate_and_roll_back(artifacts, root, legacy_dir):
+    old = registry.Publish("current", artifacts, root=root)["version"]
+    new = registry.Publish("current", artifacts, root=root)["version"]
+    models = registry.ModelRegistry(root=root, legacy_dir=legacy_dir)
+    assert models.Live("current").version == new
+
+    assert models.Activate("current", old)
+    assert models.Live("current").version == old
+    assert registry.LiveVersion("current", root) == old
+    # activating the live version again is a no-op
+    assert not models.Activate("current", old)
+    assert models.Activate("current", new)
+    assert models.Live("current").version == new
+
+    with pytest.raises(ValueError):
+        models.Activate("current", "19990101T000000000000")
+    assert registry.LiveVersion("current", root) == new
+
+def test_retired_bundle_reclaimed_after_last_release(artifacts, root, legacy_dir):
+    old = registry.Publish("current", artifacts, root=root)["version"]
+    new = registry.Publish("current", artifacts, root=root, activate=False)["version"]
+    models = registry.ModelRegistry(root=root, legacy_dir=legacy_dir)
+
+    with models.Use("current") as first:
+        with models.Use("current") as second:
+            assert first is second and first.references == 2
+            models.Activate("current", new)
+            # swapped for new requests, still whole for the ones holding it
+            assert models.Live("current").version == new
+            assert first.retired and first.model is not None
+        assert first.references == 1 and first.model is not None
+    assert first.references == 0
+    assert first.model is None and first.scaler is None
+    assert first.version == old
+
+    # a bundle nobody holds is reclaimed as soon as it is retired
+    idle = models.Live("current")
+    models.Activate("current", old)
+    assert idle.retired and idle.model is None
+
+def test_legacy_version_follows_file_stats(legacy_dir, root):
+    models = registry.ModelRegistry(root=root, legacy_dir=legacy_dir)
+    bundle = models.Live("current")
+    assert bundle.version.startswith("legacy-")
+    assert not models.Refresh("current")
+
+    scaler = registry.LegacyArtifacts("current", legacy_dir)["scaler"]
+    stat = os.stat(scaler)
+    os.utime(scaler, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    assert models.Refresh("current")
+    assert models.Live("current").version.startswith("legacy-")
+    assert models.Live("current").version != bundle.version
+    assert bundle.retired
+
+def test_published_version_takes_over_from_legacy(artifacts, legacy_dir, root):
+    models = registry.ModelRegistry(root=root, legacy_dir=legacy_dir)
+    assert models.Live("current").version.startswith("legacy-")
+    version = registry.Publish("current", artifacts, root=root)["version"]
+    assert models.Refresh("current")
+    assert models.Live("current").version == version
@@ -0,0 +1,52 @@
+import pytest
+from service.streets import NormalizeStreetName, StreetResolver
+
+STREETS = [
+    "ANG MO KIO AVE 3",
+    "ANG MO KIO AVE 10",
+    "BT BATOK ST 52",
+    "C'WEALTH AVE WEST",
+    "CLEMENTI AVE 1",
+    "TAMPINES ST 11",
+    "TAMPINES ST 12",
+    "TAMPINES ST 91",
+    "UPP BOON KENG RD",
+]
+
+@pytest.fixture
+def resolver():
+    return StreetResolver(STREETS)
+
+def test_normalize_expands_abbreviations():
+    assert NormalizeStreetName("Bukit Batok Street 52") == "BT BATOK ST 52"
+    assert NormalizeStreetName("c'wealth ave wst") == NormalizeStreetName("C'WEALTH AVE WEST")
+    assert NormalizeStreetName("Upper Boon Keng Road") == "UPP BOON KENG RD"
+
+def test_resolve_exact_and_normalized(resolver):
+    assert resolver.Resolve("CLEMENTI AVE 1") == ("CLEMENTI AVE 1", "exact", 1.0)
+    assert resolver.Resolve("bukit batok street 52") == ("BT BATOK ST 52", "normalized", 1.0)
+    assert resolver.Resolve("Commonwealth Avenue West")[0] == "C'WEALTH AVE WEST"
+
+def test_resolve_typo(resolver):
+    name, method, score = resolver.Resolve("CLEMENTY AVE 1")
+    assert (name, method) == ("CLEMENTI AVE 1", "fuzzy")
+    assert resolver.fuzzy_threshold <= score < 1.0
+
+def test_fuzzy_never_changes_street_number(resolver):
+    name, method, score = resolver.Resolve("TAMPINES ST 99")
+    assert (name, method) == (None, "unresolved")
+    assert score > 0
+
+def test_fuzzy_refuses_ties(resolver):
+    assert resolver.Resolve("TAMPINES ST")[1] == "unresolved"
+
+def test_resolve_empty(resolver):
+    assert resolver.Resolve("  ") == (None, "empty", 0.0)
+
+def test_complete_prefix(resolver):
+    assert resolver.Complete("ang mo kio av") == ["ANG MO KIO AVE 10", "ANG MO KIO AVE 3"]
+    assert resolver.Complete("tampines st 1") == ["TAMPINES ST 11", "TAMPINES ST 12"]
+    # a later word completes too, after whole-name matches
+    assert resolver.Complete("BATOK") == ["BT BATOK ST 52"]
+    assert resolver.Complete("", limit=2) == sorted(STREETS)[:2]
+    assert "CLEMENTI AVE 1" in resolver